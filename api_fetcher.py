@@ -1,3 +1,11 @@
+import csv
+import json
+import os
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional
+
 import requests
 import typer
 import pandas as pd
@@ -7,11 +15,174 @@ from structlog import get_logger
 app = typer.Typer()
 logger = get_logger()
 
+API_ENDPOINT = "https://api.getloupe.co/v2/products/retailer_offers"
+RETRYABLE_STATUS_CODES = [429, 500, 502, 503, 504]
+MAX_BACKOFF_SECONDS = 60
+
+
+def fetch_page(
+    session: requests.Session,
+    api_endpoint: str,
+    api_key: str,
+    page: int,
+    retries: int,
+) -> Dict:
+    """
+    Fetches a page, retrying with an exponential backoff (and some jitter, so that the workers do not retry all at
+    once) on network errors, rate limiting and server errors.
+    """
+    for attempt in range(retries + 1):
+        try:
+            response = session.get(
+                api_endpoint,
+                headers={"x-api-key": api_key},
+                params={"page": page},
+                timeout=120,
+            )
+            if response.status_code not in RETRYABLE_STATUS_CODES:
+                response.raise_for_status()
+                return response.json()
+
+            retry_after = response.headers.get("retry-after")
+            error = f"HTTP {response.status_code}"
+        except (requests.ConnectionError, requests.Timeout) as e:
+            retry_after = None
+            error = str(e)
+
+        if attempt == retries:
+            raise RuntimeError(
+                f"Failed to fetch page {page} after {retries + 1} attempts: {error}"
+            )
+
+        backoff = (
+            float(retry_after)
+            if retry_after and retry_after.isdigit()
+            else min(2**attempt, MAX_BACKOFF_SECONDS) + random.random()
+        )
+        logger.warning(
+            f"Failed to fetch page {page} ({error}), retrying in {backoff:.1f}s"
+        )
+        time.sleep(backoff)
+
+
+class Checkpoint:
+    """
+    Keeps track of the pages that have been written to the output, so that an interrupted run can be resumed.
+
+    It is saved next to the output file after every page. For CSV files it also holds the size of the file after
+    the last page that has been completely written, so that a page that was being written when the run stopped can
+    be dropped before resuming.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.pages_count: Optional[int] = None
+        self.columns: Optional[List[str]] = None
+        self.completed_pages = set()
+        self.output_size = 0
+        self.rows_count = 0
+
+        if os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            self.pages_count = data["pages_count"]
+            self.columns = data["columns"]
+            self.completed_pages = set(data["completed_pages"])
+            self.output_size = data["output_size"]
+            self.rows_count = data["rows_count"]
+
+    def save(self):
+        # Written to a temporary file first, so that a crash never leaves a truncated checkpoint behind
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, "w") as f:
+            json.dump(
+                {
+                    "pages_count": self.pages_count,
+                    "columns": self.columns,
+                    "completed_pages": sorted(self.completed_pages),
+                    "output_size": self.output_size,
+                    "rows_count": self.rows_count,
+                },
+                f,
+            )
+        os.replace(temporary_path, self.path)
+
+    def delete(self):
+        os.remove(self.path)
+
+
+class CsvPageWriter:
+    """
+    Appends the rows of every page to a single CSV file, in the order in which the pages are received.
+    """
+
+    def __init__(self, file_name: str, checkpoint: Checkpoint):
+        self.checkpoint = checkpoint
+        mode = "r+" if os.path.exists(file_name) else "w"
+        self.file = open(file_name, mode, newline="")
+        # Drop whatever was written after the last completed page
+        self.file.seek(checkpoint.output_size)
+        self.file.truncate()
+        self.writer = None
+
+    def write(self, page: int, rows: List[Dict]):
+        if self.checkpoint.columns is None:
+            self.checkpoint.columns = list(rows[0].keys()) if rows else []
+        if self.writer is None:
+            self.writer = csv.DictWriter(
+                self.file, fieldnames=self.checkpoint.columns, extrasaction="ignore"
+            )
+            if self.checkpoint.output_size == 0:
+                self.writer.writeheader()
+
+        self.writer.writerows(rows)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.checkpoint.output_size = self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetPageWriter:
+    """
+    Writes every page to its own file in the output directory, which can be read as a single dataset, e.g. with
+    `pandas.read_parquet(directory)`. pandas writes them with `pyarrow`, installed with the other packages.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, page: int, rows: List[Dict]):
+        path = os.path.join(self.directory, f"page-{page:06d}.parquet")
+        temporary_path = f"{path}.tmp"
+        pd.DataFrame(rows).to_parquet(temporary_path, index=False)
+        os.replace(temporary_path, path)
+
+    def close(self):
+        pass
+
 
 @app.command()
-def fetch(api_key: str, file_name: str):
+def fetch(
+    api_key: str,
+    file_name: str,
+    workers: int = typer.Option(8, help="The number of pages fetched in parallel"),
+    retries: int = typer.Option(5, help="The number of retries for each page"),
+    output_format: str = typer.Option(
+        "csv",
+        help="csv to write a single file, parquet to write a directory with a file per page",
+    ),
+    api_endpoint: str = typer.Option(API_ENDPOINT),
+):
     """
-    Loops through the pages from the API and exports all the data to a CSV file
+    Fetches all the pages from the API and writes their rows to `file_name`.
+
+    The pages are fetched in parallel and written as soon as they are received, in whatever order they arrive, so the
+    memory usage does not depend on the number of pages. Progress is saved to `<file_name>.checkpoint.json`: running
+    the same command again after an interruption only fetches the missing pages.
+
     Response format:
     {
         "rows": [...],
@@ -26,40 +197,83 @@ def fetch(api_key: str, file_name: str):
     * pages_count: the total number of pages
     * count: the total number of items
 
+    If you need all the offers at once, the `/v2.2/products/retailer_offers/export` endpoint streams them in a single
+    response, which is faster than going through the pages.
+
     :param api_key:
     :param file_name:
+    :param workers:
+    :param retries:
+    :param output_format:
+    :param api_endpoint:
     :return:
     """
+    if output_format not in ["csv", "parquet"]:
+        raise typer.BadParameter("The output format must be csv or parquet")
 
-    api_endpoint = "https://api.getloupe.co/v2/products/retailer_offers"
-
-    # Fetch the first page and extract data and pagination info
-    response = requests.get(api_endpoint, headers={"x-api-key": api_key})
-    data = response.json()
+    checkpoint = Checkpoint(f"{file_name}.checkpoint.json")
+    if checkpoint.completed_pages:
+        logger.info(
+            f"Resuming, {len(checkpoint.completed_pages)} pages already fetched"
+        )
+        if not os.path.exists(file_name):
+            raise typer.BadParameter(f"{file_name} is missing, cannot resume")
+    elif os.path.exists(file_name):
+        raise typer.BadParameter(f"{file_name} already exists")
 
-    full_rows = data["rows"]
-    page = data["page"]
-    pages_count = data["pages_count"]
-    count = data["count"]
-    logger.info(
-        f"Fetched page {page} of {pages_count}, received {len(data['rows'])} rows"
+    writer = (
+        CsvPageWriter(file_name, checkpoint)
+        if output_format == "csv"
+        else ParquetPageWriter(file_name)
     )
+    session = requests.Session()
+    # Let every worker keep its connection open
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=workers)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
 
-    for page in tqdm(range(1, pages_count)):
-        response = requests.get(
-            api_endpoint, headers={"x-api-key": api_key}, params={"page": page}
-        )
-        data = response.json()
-        full_rows.extend(data["rows"])
-        logger.info(
-            f"Fetched page {data['page']} of {pages_count}, received {len(data['rows'])} rows"
-        )
+    def write_page(data: Dict):
+        writer.write(data["page"], data["rows"])
+        checkpoint.completed_pages.add(data["page"])
+        checkpoint.rows_count += len(data["rows"])
+        checkpoint.save()
+
+    try:
+        if checkpoint.pages_count is None:
+            # The first page tells how many pages there are
+            data = fetch_page(session, api_endpoint, api_key, 0, retries)
+            checkpoint.pages_count = data["pages_count"]
+            write_page(data)
+
+        pending_pages = [
+            page
+            for page in range(checkpoint.pages_count)
+            if page not in checkpoint.completed_pages
+        ]
+        with ThreadPoolExecutor(max_workers=workers) as executor, tqdm(
+            total=checkpoint.pages_count, initial=len(checkpoint.completed_pages)
+        ) as progress:
+            in_flight: Dict[Future, int] = {}
+            while pending_pages or in_flight:
+                # Only keep a few pages ahead of the writer, so that the received pages do not pile up in memory
+                while pending_pages and len(in_flight) < 2 * workers:
+                    page = pending_pages.pop(0)
+                    future = executor.submit(
+                        fetch_page, session, api_endpoint, api_key, page, retries
+                    )
+                    in_flight[future] = page
 
-    # Export the data to a CSV file
-    df = pd.DataFrame(full_rows)
-    df.to_csv(file_name, index=False)
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    in_flight.pop(future)
+                    data = future.result()
+                    write_page(data)
+                    progress.update(1)
+    finally:
+        writer.close()
 
-    print("Total count according to the returned data", len(full_rows))
+    checkpoint.delete()
+    print("Total count according to the returned data", checkpoint.rows_count)
 
 
 if __name__ == "__main__":
@@ -1,4 +1,5 @@
 from functools import lru_cache
+from typing import Dict, Literal, Optional
 
 from pydantic import BaseSettings, Field
 
@@ -11,6 +12,87 @@ class Settings(BaseSettings):
     db_name: str = Field()
     db_host: str = Field()
 
+    # Connection pool, applied to both the sync and the async engine (so the worst case is twice these values)
+    db_pool_size: int = Field(default=5)
+    db_max_overflow: int = Field(default=10)
+    db_pool_timeout: int = Field(
+        default=30, description="Seconds to wait for a connection before giving up"
+    )
+    db_pool_recycle: int = Field(
+        default=1800, description="Seconds after which a connection is replaced"
+    )
+    db_pool_pre_ping: bool = Field(default=True)
+    db_statement_timeout_ms: int = Field(
+        default=60_000,
+        description="Server side limit for a single statement, 0 disables it",
+    )
+
+    # Cache of the analytics responses, see app/service/cache.py
+    response_cache_backend: Literal["memory", "redis"] = Field(
+        default="memory",
+        description="`redis` shares the cache between instances and needs the `redis` package",
+    )
+    response_cache_redis_url: Optional[str] = Field(default=None)
+    response_cache_ttl_seconds: int = Field(default=3600)
+    response_cache_live_ttl_seconds: int = Field(
+        default=300,
+        description="For the responses also read from tables, which change without any view being refreshed",
+    )
+    response_cache_max_entries: int = Field(
+        default=2048, description="Only used by the in-memory backend"
+    )
+    matview_refresh_poll_interval_seconds: int = Field(
+        default=60,
+        description="How often to check whether the materialized views were refreshed, 0 disables it",
+    )
+
+    # Client used for the outgoing requests, see app/service/http_client.py
+    http_client_http2: bool = Field(default=True)
+    http_client_max_connections: int = Field(default=20)
+    http_client_max_keepalive_connections: int = Field(default=20)
+    http_client_keepalive_expiry_seconds: float = Field(default=60)
+    http_client_timeout_seconds: float = Field(default=5)
+    http_client_connect_timeout_seconds: float = Field(default=2)
+
+    # Canonical log line of the requests, see app/main.py
+    request_log_mode: Literal["compact", "full"] = Field(
+        default="compact",
+        description="`full` also logs the headers and the parsed body, `compact` only a fingerprint of the filters",
+    )
+    request_log_sample_rate: float = Field(
+        default=1.0,
+        description="The share of the successful requests that are logged, the failed ones are always logged",
+    )
+    request_log_sample_rates: Dict[str, float] = Field(
+        default={},
+        description='Overrides the sample rate per route, e.g. {"/products/retailers": 0.1}',
+    )
+
+    metrics_token: Optional[str] = Field(
+        default=None,
+        description="Required as a bearer token to scrape /metrics, which is only public without it on a local instance",
+    )
+
+    # Sampling profiler, used when a developer sends the `X-Profile` header, see app/main.py
+    profiling_interval_seconds: float = Field(default=0.001)
+
+    # Index of the existing screenshots, see app/service/screenshot.py
+    screenshot_manifest_refresh_interval_seconds: int = Field(
+        default=900,
+        description="How often to list the screenshots bucket, 0 disables it and checks every screenshot with HEAD",
+    )
+    screenshot_lookup_concurrency: int = Field(
+        default=50,
+        description="The maximum number of HEAD requests in flight for a single call",
+    )
+    screenshot_index_max_entries: int = Field(default=100_000)
+    screenshot_index_ttl_seconds: int = Field(
+        default=86400, description="How long to remember that a screenshot exists"
+    )
+    screenshot_index_missing_ttl_seconds: int = Field(
+        default=3600, description="How long to remember that a screenshot is missing"
+    )
+
     firebase_api_key: str = Field()
     magic_api_secret_key: str = Field()
     postmark_api_token: str = Field()
@@ -18,6 +100,10 @@ class Settings(BaseSettings):
 
     fernet_secret_key: str = Field()
     api_keys_secret_salt: str = Field()
+    api_keys_usage_flush_interval_seconds: int = Field(
+        default=30,
+        description="How often to save when the API keys were last used",
+    )
 
     class Config:
         env_file = ".env"
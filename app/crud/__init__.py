@@ -10,3 +10,4 @@ from app.crud.stock import *
 from app.crud.features import *
 from app.crud.overview import *
 from app.crud.security import *
+from app.crud.matviews import *
@@ -1,6 +1,13 @@
+from typing import Dict, List, Tuple
+
 from sqlalchemy.orm import Session
 
 from app.crud import get_result_entities_from_statement_with_paged_filters
+from app.crud.utils import (
+    estimate_statement_rows_count,
+    select_with_total_count,
+    split_total_count,
+)
 from app.models import MockBrandProductGridItem
 from app.schemas.filters import PagedGlobalFilter, DataPageFilter
 
@@ -75,12 +82,31 @@ def _create_query_for_brand_products_datapool(global_filter: DataPageFilter) ->
     """
 
 
-def get_brand_products_data_grid(
-    db: Session, brand_id: str, global_filter: PagedGlobalFilter
-):
+def _create_brand_products_datapool_params(
+    brand_id: str, global_filter: DataPageFilter
+) -> Dict:
+    return {
+        "brand_id": brand_id,
+        "countries": tuple(global_filter.countries),
+        "retailers": tuple(global_filter.retailers),
+        "categories": tuple(global_filter.categories),
+        "groups": tuple(global_filter.groups),
+        **{
+            f"fv_{index}": i.get_safe_postgres_value()
+            for index, i in enumerate(global_filter.data_grid_filter.items)
+            if i.is_well_defined()
+        },
+    }
+
+
+def _create_paged_brand_products_query(
+    global_filter: PagedGlobalFilter, with_total_count: bool
+) -> str:
     statement = _create_query_for_brand_products_datapool(global_filter)
+    if with_total_count:
+        statement = select_with_total_count(statement)
 
-    paged_statement = f"""
+    return f"""
         {statement}
         {
             "ORDER BY " + global_filter.sorting.column + " " + global_filter.sorting.direction
@@ -89,27 +115,56 @@ def get_brand_products_data_grid(
         LIMIT :limit OFFSET :offset
     """
 
+
+def get_brand_products_data_grid(
+    db: Session, brand_id: str, global_filter: PagedGlobalFilter
+):
     return _get_full_product_list(
         db,
         brand_id,
-        paged_statement,
+        _create_paged_brand_products_query(global_filter, with_total_count=False),
         global_filter,
     )
 
 
-def export_full_brand_products_result(
+def get_brand_products_data_grid_with_total_count(
     db: Session, brand_id: str, global_filter: PagedGlobalFilter
-):
-    statement = _create_query_for_brand_products_datapool(global_filter)
-    return _get_full_product_list(
+) -> Tuple[List[MockBrandProductGridItem], int]:
+    """
+    Same as `get_brand_products_data_grid`, but also returns the total number of products matching the filter,
+    computed in the same query as the page (or estimated, if requested by the filter).
+    """
+    if global_filter.estimate_total_count:
+        return get_brand_products_data_grid(
+            db, brand_id, global_filter
+        ), estimate_brand_products_count(db, brand_id, global_filter)
+
+    rows = get_result_entities_from_statement_with_paged_filters(
         db,
+        MockBrandProductGridItem,
         brand_id,
-        statement=statement,
-        global_filter=global_filter,
-        ignore_pagination=True,
+        global_filter,
+        _create_paged_brand_products_query(global_filter, with_total_count=True),
+        with_total_count=True,
+    )
+
+    return split_total_count(
+        rows, lambda: count_brand_products(db, brand_id, global_filter)
     )
 
 
+def get_brand_products_export_statement(
+    brand_id: str, global_filter: DataPageFilter
+) -> Tuple[str, Dict]:
+    """
+    :return: The statement selecting every product matching the filter, to be streamed from a server side cursor
+        (see `app.service.export.stream_statement_rows`), and its parameters
+    """
+    return _create_query_for_brand_products_datapool(
+        global_filter
+    ), _create_brand_products_datapool_params(brand_id, global_filter)
+
+
 def count_brand_products(
     db: Session, brand_id: str, global_filter: DataPageFilter
 ) -> int:
@@ -120,3 +175,12 @@ def count_brand_products(
     )
 
     return result[0][0]
+
+
+def estimate_brand_products_count(
+    db: Session, brand_id: str, global_filter: DataPageFilter
+) -> int:
+    statement = _create_query_for_brand_products_datapool(global_filter)
+    params = _create_brand_products_datapool_params(brand_id, global_filter)
+
+    return estimate_statement_rows_count(db, statement, params)
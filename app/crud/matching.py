@@ -164,7 +164,28 @@ def get_matched_retailer_products_by_brand_product_id(
 
     matched_images = convert_rows_to_dicts(matched_images)
 
+    # The counts of the images can't be selected by the textual statement, they are loaded at once for all the products
+    images_counts = {
+        row.id: row
+        for row in db.query(
+            RetailerProduct.id,
+            RetailerProduct.retailer_images_count,
+            RetailerProduct.environmental_images_count,
+            RetailerProduct.transparent_images_count,
+        ).filter(RetailerProduct.id.in_([p.id for p in result]))
+    }
+
     for retailer_product in result:
+        for images_count in [
+            "retailer_images_count",
+            "environmental_images_count",
+            "transparent_images_count",
+        ]:
+            set_committed_value(
+                retailer_product,
+                images_count,
+                getattr(images_counts[retailer_product.id], images_count),
+            )
         for image in retailer_product.processed_images:
             set_committed_value(
                 image,
@@ -0,0 +1,31 @@
+from typing import List, Dict
+
+from sqlalchemy.orm import Session
+
+from app.crud.utils import convert_rows_to_dicts, text_with_expanding_params
+
+
+def get_materialized_views_state(db: Session, matviews: List[str]) -> List[Dict]:
+    """
+    Reads what Postgres knows about the given materialized views, without touching their data.
+
+    A plain `REFRESH MATERIALIZED VIEW` swaps the storage of the view, so its `relfilenode` changes, while a
+    `REFRESH ... CONCURRENTLY` keeps the storage but shows up in the row change counters.
+
+    :param db:
+    :param matviews: The names of the materialized views
+    :return: One row per existing view, with its name, storage id and number of modified rows
+    """
+    statement = """
+        SELECT c.relname AS name,
+            c.relfilenode AS storage_id,
+            COALESCE(s.n_tup_ins + s.n_tup_upd + s.n_tup_del, 0) AS modified_rows
+        FROM pg_class c
+            LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+        WHERE c.relkind = 'm'
+            AND c.relname IN :matviews;
+    """
+    params = {"matviews": tuple(matviews)}
+
+    rows = db.execute(text_with_expanding_params(statement, params), params).fetchall()
+    return convert_rows_to_dicts(rows)
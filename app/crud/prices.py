@@ -1,9 +1,15 @@
 from typing import List, Tuple
 
-from sqlalchemy import text
+from sqlalchemy import text, column, Integer
 from sqlalchemy.orm import Session, selectinload
 
 from app.crud import get_results_from_statement_with_filters
+from app.crud.utils import (
+    TOTAL_COUNT_COLUMN,
+    estimate_statement_rows_count,
+    select_with_total_count,
+    split_total_count,
+)
 from app.models import (
     RetailerProductHistory,
     RetailerProduct,
@@ -179,12 +185,17 @@ def _create_price_table_data_query(
     return query, params
 
 
-def get_price_table_data(
-    db: Session, global_filter: PagedPriceValuesFilter, brand_id: str
+def _get_paged_price_table_data(
+    db: Session,
+    global_filter: PagedPriceValuesFilter,
+    brand_id: str,
+    with_total_count: bool,
 ):
     price_data_query, price_data_params = _create_price_table_data_query(
         global_filter, brand_id
     )
+    if with_total_count:
+        price_data_query = select_with_total_count(price_data_query)
 
     query = f"""
         SELECT * 
@@ -199,8 +210,9 @@ def get_price_table_data(
         LIMIT :limit;
     """
 
+    columns = [column(TOTAL_COUNT_COLUMN, Integer)] if with_total_count else []
     results = (
-        db.query(MockBrandProductWithMarketPrices)
+        db.query(MockBrandProductWithMarketPrices, *columns)
         .from_statement(statement=text(query))
         .params(
             offset=global_filter.get_products_offset(),
@@ -214,6 +226,34 @@ def get_price_table_data(
     return results
 
 
+def get_price_table_data(
+    db: Session, global_filter: PagedPriceValuesFilter, brand_id: str
+):
+    return _get_paged_price_table_data(
+        db, global_filter, brand_id, with_total_count=False
+    )
+
+
+def get_price_table_data_with_total_count(
+    db: Session, global_filter: PagedPriceValuesFilter, brand_id: str
+) -> Tuple[List[MockBrandProductWithMarketPrices], int]:
+    """
+    Same as `get_price_table_data`, but also returns the total number of products matching the filter, computed in
+    the same query as the page (or estimated, if requested by the filter).
+    """
+    if global_filter.estimate_total_count:
+        return get_price_table_data(
+            db, global_filter, brand_id
+        ), estimate_price_table_data_count(db, global_filter, brand_id)
+
+    rows = _get_paged_price_table_data(
+        db, global_filter, brand_id, with_total_count=True
+    )
+    return split_total_count(
+        rows, lambda: count_price_table_data(db, global_filter, brand_id)
+    )
+
+
 def count_price_table_data(
     db: Session, global_filter: PagedPriceValuesFilter, brand_id: str
 ):
@@ -234,6 +274,15 @@ def count_price_table_data(
     ).scalar()
 
 
+def estimate_price_table_data_count(
+    db: Session, global_filter: PagedPriceValuesFilter, brand_id: str
+) -> int:
+    price_data_query, price_data_params = _create_price_table_data_query(
+        global_filter, brand_id
+    )
+    return estimate_statement_rows_count(db, price_data_query, price_data_params)
+
+
 def get_historical_msrp_deviation_per_retailer(
     db: Session, global_filter: GlobalFilter, brand_id: str
 ):
@@ -1,18 +1,28 @@
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
 from app.crud.utils import (
     convert_rows_to_dicts,
+    estimate_statement_rows_count,
     get_results_from_statement_with_filters,
     get_result_entities_from_statement_with_paged_filters,
+    select_with_total_count,
+    split_total_count,
+    text_with_expanding_params,
 )
 from app.models import (
     RetailerProduct,
 )
 from app.models.retailer import MockRetailerProductGridItem
-from app.schemas.filters import PagedGlobalFilter, GlobalFilter, DataPageFilter
+from app.schemas.filters import (
+    PagedRetailerOffersFilter,
+    GlobalFilter,
+    DataPageFilter,
+    DataGridSorting,
+    KeysetCursor,
+)
 
 
 def _create_query_for_retailer_offers_datapool(
@@ -76,7 +86,11 @@ def _create_query_for_retailer_offers_datapool(
 
 
 def _get_full_product_list(
-    db: Session, brand_id: str, statement: str, global_filter: PagedGlobalFilter
+    db: Session,
+    brand_id: str,
+    statement: str,
+    global_filter: PagedRetailerOffersFilter,
+    extra_params: Optional[Dict] = None,
 ):
     return get_result_entities_from_statement_with_paged_filters(
         db,
@@ -84,11 +98,56 @@ def _get_full_product_list(
         brand_id,
         global_filter,
         statement,
+        extra_params=extra_params,
+    )
+
+
+def get_retailer_offers_sorting(
+    global_filter: PagedRetailerOffersFilter,
+) -> DataGridSorting:
+    cursor = global_filter.get_keyset_cursor()
+    if global_filter.sorting:
+        return global_filter.sorting
+    elif cursor:
+        return cursor.get_sorting()
+
+    return DataGridSorting(column="name", direction="asc")
+
+
+def _create_keyset_condition(cursor: KeysetCursor) -> Tuple[str, Dict]:
+    """
+    Selects the rows coming after the cursor when sorting by the cursor column and then by id.
+
+    Postgres puts NULL values last when sorting in ascending order and first when sorting in descending order.
+    """
+    params = {"cursor_value": cursor.value, "cursor_id": cursor.id}
+    column = cursor.column
+    if column == "id":
+        comparison = ">" if cursor.direction == "asc" else "<"
+        return f"id {comparison} :cursor_id", params
+
+    if cursor.direction == "asc":
+        if cursor.value is None:
+            return f"({column} IS NULL AND id > :cursor_id)", params
+        return (
+            f"""(
+                {column} > :cursor_value 
+                OR ({column} = :cursor_value AND id > :cursor_id) 
+                OR {column} IS NULL
+            )""",
+            params,
+        )
+
+    if cursor.value is None:
+        return f"({column} IS NOT NULL OR id < :cursor_id)", params
+    return (
+        f"({column} < :cursor_value OR ({column} = :cursor_value AND id < :cursor_id))",
+        params,
     )
 
 
 def get_retailer_offers(
-    db: Session, brand_id: str, global_filter: PagedGlobalFilter
+    db: Session, brand_id: str, global_filter: PagedRetailerOffersFilter
 ) -> List[MockRetailerProductGridItem]:
     """
     Returns the list of products from each retailer corresponding to the client currently using the application.
@@ -114,20 +173,85 @@ def get_retailer_offers(
     :param global_filter:
     :return:
     """
-    query, params = _create_query_for_retailer_offers_datapool(brand_id, global_filter)
+    statement, keyset_params = _create_paged_retailer_offers_query(
+        brand_id, global_filter, with_total_count=False
+    )
+
+    return _get_full_product_list(
+        db, brand_id, statement, global_filter, extra_params=keyset_params
+    )
+
+
+def get_retailer_offers_with_total_count(
+    db: Session, brand_id: str, global_filter: PagedRetailerOffersFilter
+) -> Tuple[List[MockRetailerProductGridItem], int]:
+    """
+    Same as `get_retailer_offers`, but also returns the total number of offers matching the filter, computed in the
+    same query as the page (or estimated, see `PagedRetailerOffersFilter.is_total_count_estimated`).
+    """
+    if global_filter.is_total_count_estimated():
+        return get_retailer_offers(
+            db, brand_id, global_filter
+        ), estimate_retailer_offers_count(db, brand_id, global_filter)
+
+    statement, keyset_params = _create_paged_retailer_offers_query(
+        brand_id, global_filter, with_total_count=True
+    )
+    rows = get_result_entities_from_statement_with_paged_filters(
+        db,
+        MockRetailerProductGridItem,
+        brand_id,
+        global_filter,
+        statement,
+        extra_params=keyset_params,
+        with_total_count=True,
+    )
+
+    return split_total_count(
+        rows, lambda: count_retailer_offers(db, brand_id, global_filter)
+    )
+
+
+def _create_paged_retailer_offers_query(
+    brand_id: str, global_filter: PagedRetailerOffersFilter, with_total_count: bool
+) -> Tuple[str, Dict]:
+    query, _ = _create_query_for_retailer_offers_datapool(brand_id, global_filter)
+    if with_total_count:
+        # Counted before the keyset condition, which only selects the rows of the current page
+        query = select_with_total_count(query)
+
+    sorting = get_retailer_offers_sorting(global_filter)
+    cursor = global_filter.get_keyset_cursor()
+    keyset_condition, keyset_params = (
+        _create_keyset_condition(cursor) if cursor else (None, {})
+    )
     statement = f"""
         SELECT * FROM (
             {query}
         ) products_datapool
-        {
-            "ORDER BY " + global_filter.sorting.column + " " + global_filter.sorting.direction 
-            if global_filter.sorting else "ORDER BY name ASC"
-        }
-        OFFSET :offset
+        {"WHERE " + keyset_condition if keyset_condition else ""}
+        ORDER BY {sorting.column} {sorting.direction}
+            {", id " + sorting.direction if sorting.column != "id" else ""}
+        {"OFFSET :offset" if not cursor else ""}
         LIMIT :limit
     """
 
-    return _get_full_product_list(db, brand_id, statement, global_filter)
+    return statement, keyset_params
+
+
+def get_next_retailer_offers_cursor(
+    products: List[MockRetailerProductGridItem],
+    global_filter: PagedRetailerOffersFilter,
+) -> Optional[str]:
+    """
+    :return: The cursor of the page following the given one, None if this was the last page
+    """
+    if len(products) < global_filter.page_size:
+        return None
+
+    return KeysetCursor.after_row(
+        products[-1], get_retailer_offers_sorting(global_filter)
+    ).encode()
 
 
 def _count_retailer_offers_datapool(
@@ -144,19 +268,26 @@ def _count_retailer_offers_datapool(
     """
 
     return db.execute(
-        text(statement),
+        text_with_expanding_params(statement, params),
         params=params,
     ).scalar()
 
 
 def count_retailer_offers(
-    db: Session, brand_id: str, global_filter: PagedGlobalFilter
+    db: Session, brand_id: str, global_filter: PagedRetailerOffersFilter
 ) -> int:
     return _count_retailer_offers_datapool(
         db, brand_id, global_filter, count_target="*"
     )
 
 
+def estimate_retailer_offers_count(
+    db: Session, brand_id: str, global_filter: DataPageFilter
+) -> int:
+    query, params = _create_query_for_retailer_offers_datapool(brand_id, global_filter)
+    return estimate_statement_rows_count(db, query, params)
+
+
 def get_unique_brand_product_ids(
     db: Session, brand_id: str, global_filter: DataPageFilter
 ) -> List[str]:
@@ -314,18 +445,16 @@ def get_historical_visibility_average(
     )
 
 
-def export_full_retailer_offers_result(
-    db: Session, brand_id: str, global_filter: PagedGlobalFilter
-):
-    statement, params = _create_query_for_retailer_offers_datapool(
-        brand_id, global_filter
-    )
-    return _get_full_product_list(
-        db,
-        brand_id,
-        statement=statement,
-        global_filter=global_filter,
-    )
+def get_retailer_offers_export_statement(
+    brand_id: str, global_filter: DataPageFilter
+) -> Tuple[str, Dict]:
+    """
+    The export goes through every offer matching the filter, so it is not loaded through the ORM but streamed from a
+    server side cursor (see `app.service.export.stream_statement_rows`).
+
+    :return: The statement selecting the offers, ordered by id, and its parameters
+    """
+    return _create_query_for_retailer_offers_datapool(brand_id, global_filter)
 
 
 def count_available_products_by_retailers(
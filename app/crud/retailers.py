@@ -1,17 +1,12 @@
 from typing import List, Dict, Optional
 
 from sqlalchemy import text
-from sqlalchemy.orm import Session, selectinload
-
-from app.crud.utils import convert_rows_to_dicts
-from app.models import (
-    retailer,
-    RetailerProduct,
-    ProductMatching,
-    BrandProduct,
-)
+from sqlalchemy.orm import Session
+
+from app.crud.utils import convert_rows_to_dicts, text_with_expanding_params
+from app.models import retailer
 from app.models.mappings import RetailerBrandAssociation
-from app.models.retailer import RetailerImage, CountryToLanguage
+from app.models.retailer import CountryToLanguage
 from app.schemas.filters import GlobalFilter
 from app.schemas.general import FilterRetailer
 
@@ -99,14 +94,15 @@ def get_categories_split(
         {brand_category_filter}
         ORDER BY is_current_customer DESC NULLS LAST
     """
+    params = {
+        "brand_id": brand_id,
+        "retailer_id": global_filter.retailers[0],
+        "brand_categories": tuple(global_filter.categories),
+        "groups": tuple(global_filter.groups),
+    }
     rows = db.execute(
-        text(statement),
-        params={
-            "brand_id": brand_id,
-            "retailer_id": global_filter.retailers[0],
-            "brand_categories": tuple(global_filter.categories),
-            "groups": tuple(global_filter.groups),
-        },
+        text_with_expanding_params(statement, params),
+        params=params,
     ).fetchall()
 
     result = convert_rows_to_dicts(rows)
@@ -132,16 +128,18 @@ def get_deep_retailer_offers_for_brand_product(
     global_filter: GlobalFilter,
     brand_product_id: str,
     brand_id: str,
-) -> List[ProductMatching]:
+) -> List[Dict]:
     """
     Get retailer products for a brand product
 
-    Returns only products matched on deep indexed retailers
+    Returns only products matched on deep indexed retailers. Every match comes with the whole retailer product as shown
+    on the product page (its retailer, category, images and their predictions and matches, other matched brand
+    products), aggregated to JSON by a single statement instead of loading each relationship of the entities.
     :param db:
     :param global_filter:
     :param brand_product_id:
     :param brand_id:
-    :return:
+    :return: The matches, with the shape of `BrandToDeepRetailerProductMatchingScaffold`
     """
     filter_on_product_group_statement = """
             AND matched_brand_product_id IN (
@@ -152,53 +150,146 @@ def get_deep_retailer_offers_for_brand_product(
         """
 
     statement = f"""
-        select DISTINCT pm.*
-        from product_matching pm 
-            JOIN (
-                SELECT id, matched_brand_product_id
-                FROM retailer_product_including_unavailable_matview
-                WHERE matched_brand_product_id = :brand_product_id
-                    AND available_at_retailer = true
-                    AND brand_id = :brand_id
-                    AND retailer_images_count > 0
-                    {"AND brand_category_id IN :categories" if global_filter.categories else ""}
-                    {"AND retailer_id IN :retailers" if global_filter.retailers else ""}
-                    {"AND country IN :countries" if global_filter.countries else ""}
-                    {filter_on_product_group_statement if global_filter.groups else ""}
-            ) rp on pm.retailer_product_id = rp.id 
-                AND rp.matched_brand_product_id = pm.brand_product_id
+        WITH matches AS (
+            select DISTINCT pm.*
+            from product_matching pm
+                JOIN (
+                    SELECT id, matched_brand_product_id
+                    FROM retailer_product_including_unavailable_matview
+                    WHERE matched_brand_product_id = :brand_product_id
+                        AND available_at_retailer = true
+                        AND brand_id = :brand_id
+                        AND retailer_images_count > 0
+                        {"AND brand_category_id IN :categories" if global_filter.categories else ""}
+                        {"AND retailer_id IN :retailers" if global_filter.retailers else ""}
+                        {"AND country IN :countries" if global_filter.countries else ""}
+                        {filter_on_product_group_statement if global_filter.groups else ""}
+                ) rp on pm.retailer_product_id = rp.id
+                    AND rp.matched_brand_product_id = pm.brand_product_id
+        )
+        SELECT m.image_score, m.title_score, m.description_score, m.specs_score, m.text_score,
+            COALESCE(image_matches.image_matches, '[]'::jsonb) AS image_matches,
+            jsonb_build_object(
+                'id', rp.id,
+                'url', rp.url,
+                'name', rp.name,
+                'description', rp.description,
+                'gtin', rp.gtin,
+                'retailer', jsonb_build_object(
+                    'id', r.id,
+                    'name', r.name,
+                    'country', r.country,
+                    'retailer_specific_language', r.retailer_specific_language,
+                    'country_to_language', ctl.country_to_language
+                ),
+                'country', r.country,
+                'price_standard', CASE WHEN rp.price <> 0 THEN rp.price / 100.0 END,
+                'currency', rp.currency,
+                'review_average', rp.review_average,
+                'number_of_reviews', COALESCE(rp.reviews -> 'reviewCount', '0'::jsonb),
+                'popularity_index', rp.popularity_index,
+                'retailer_images_count', COALESCE(images.retailer_images_count, 0),
+                'environmental_images_count', COALESCE(images.environmental_images_count, 0),
+                'transparent_images_count', COALESCE(images.transparent_images_count, 0),
+                'category', category.category,
+                'processed_images', COALESCE(images.processed_images, '[]'::jsonb),
+                'specifications', rp.specifications,
+                'matched_brand_products', COALESCE(brand_matches.matched_brand_products, '[]'::jsonb)
+            ) AS retailer_product
+        FROM matches m
+            JOIN retailer_product rp ON rp.id = m.retailer_product_id
+            JOIN retailer r ON r.id = rp.retailer_id
+            LEFT JOIN LATERAL (
+                SELECT jsonb_build_object('country', country, 'language', language) AS country_to_language
+                FROM country_to_language
+                WHERE country = r.country
+                LIMIT 1
+            ) ctl ON TRUE
+            LEFT JOIN LATERAL (
+                SELECT jsonb_build_object(
+                    'id', rc.id,
+                    'full_name', COALESCE((
+                        SELECT string_agg(value::json ->> 'name', ' > ')
+                        FROM json_array_elements_text(rc.category_tree)
+                    ), ''),
+                    'url', rc.url
+                ) AS category
+                FROM retailer_category rc
+                WHERE rc.id = rp.popularity_category_id
+            ) category ON TRUE
+            LEFT JOIN LATERAL (
+                SELECT jsonb_agg(jsonb_build_object(
+                        'id', ri.id,
+                        'url', ri.url,
+                        'image_hash', ri.image_hash,
+                        'type_predictions', COALESCE(predictions.type_predictions, '[]'::jsonb),
+                        'matched_brand_images', COALESCE(brand_images.matched_brand_images, '[]'::jsonb)
+                    )) AS processed_images,
+                    COUNT(DISTINCT ri.image_hash) AS retailer_images_count,
+                    COUNT(*) FILTER (WHERE predictions.prediction = 'environmental') AS environmental_images_count,
+                    COUNT(*) FILTER (WHERE predictions.prediction = 'transparent') AS transparent_images_count
+                FROM retailer_image ri
+                    LEFT JOIN LATERAL (
+                        SELECT jsonb_agg(jsonb_build_object(
+                                'prediction', prediction,
+                                'confidence', confidence,
+                                'model', model,
+                                'version', version
+                            ) ORDER BY confidence DESC NULLS LAST) AS type_predictions,
+                            -- The type of the image is the most confident prediction
+                            (array_agg(prediction ORDER BY confidence DESC NULLS LAST))[1] AS prediction
+                        FROM retailer_image_types
+                        WHERE image_id = ri.id
+                    ) predictions ON TRUE
+                    LEFT JOIN LATERAL (
+                        SELECT jsonb_agg(jsonb_build_object(
+                            'retailer_image_id', retailer_image_id,
+                            'brand_image_id', brand_image_id,
+                            'model_certainty', model_certainty
+                        )) AS matched_brand_images
+                        FROM image_matching
+                        WHERE retailer_image_id = ri.id
+                    ) brand_images ON TRUE
+                WHERE ri.retailer_product_id = rp.id
+                    AND ri.image_hash IS NOT NULL
+            ) images ON TRUE
+            LEFT JOIN LATERAL (
+                SELECT jsonb_agg(jsonb_build_object(
+                    'brand_product', jsonb_build_object(
+                        'id', bp.id,
+                        'category', CASE WHEN bp.category_id IS NOT NULL
+                            THEN jsonb_build_object('id', bp.category_id)
+                        END,
+                        'sku', bp.sku
+                    ),
+                    'certainty', opm.certainty
+                )) AS matched_brand_products
+                FROM product_matching opm
+                    JOIN brand_product bp ON bp.id = opm.brand_product_id
+                WHERE opm.retailer_product_id = rp.id
+            ) brand_matches ON TRUE
+            LEFT JOIN LATERAL (
+                SELECT jsonb_agg(jsonb_build_object(
+                    'retailer_image_id', retailer_image_id,
+                    'brand_image_id', brand_image_id,
+                    'model_certainty', model_certainty
+                )) AS image_matches
+                FROM image_matching
+                WHERE product_matching_id = m.id
+            ) image_matches ON TRUE
     """
 
-    return (
-        db.query(ProductMatching)
-        .from_statement(text(statement))
-        .params(
-            brand_product_id=brand_product_id,
-            categories=tuple(global_filter.categories),
-            retailers=tuple(global_filter.retailers),
-            countries=tuple(global_filter.countries),
-            groups=tuple(global_filter.groups),
-            brand_id=brand_id,
-        )
-        .options(
-            selectinload(ProductMatching.retailer_product).selectinload(
-                RetailerProduct.category
-            ),
-            selectinload(ProductMatching.retailer_product).selectinload(
-                RetailerProduct.images
-            ),
-            selectinload(ProductMatching.retailer_product).selectinload(
-                RetailerProduct.retailer
-            ),
-            selectinload(ProductMatching.retailer_product)
-            .selectinload(RetailerProduct.images)
-            .selectinload(RetailerImage.type_predictions),
-            selectinload(ProductMatching.retailer_product)
-            .selectinload(RetailerProduct.matched_brand_products)
-            .selectinload(ProductMatching.brand_product)
-            .selectinload(BrandProduct.images),
-        )
-        .all()
+    params = {
+        "brand_product_id": brand_product_id,
+        "categories": tuple(global_filter.categories),
+        "retailers": tuple(global_filter.retailers),
+        "countries": tuple(global_filter.countries),
+        "groups": tuple(global_filter.groups),
+        "brand_id": brand_id,
+    }
+
+    return convert_rows_to_dicts(
+        db.execute(text_with_expanding_params(statement, params), params).fetchall()
     )
 
 
@@ -228,16 +319,15 @@ def get_all_retailer_offers_for_brand_product(
             {"AND country IN :countries" if global_filter.countries else ""}
     """
 
+    params = {
+        "brand_product_id": brand_product_id,
+        "retailers": tuple(global_filter.retailers),
+        "countries": tuple(global_filter.countries),
+        "brand_id": brand_id,
+    }
+
     return convert_rows_to_dicts(
-        db.execute(
-            statement,
-            {
-                "brand_product_id": brand_product_id,
-                "retailers": tuple(global_filter.retailers),
-                "countries": tuple(global_filter.countries),
-                "brand_id": brand_id,
-            },
-        ).fetchall()
+        db.execute(text_with_expanding_params(statement, params), params).fetchall()
     )
 
 
@@ -245,9 +335,7 @@ def get_individual_category_performance_details(db: Session, categories: List[st
     if not categories:
         return []
 
-    rows = db.execute(
-        text(
-            """
+    statement = """
         select rc.id, r.category_page_size as page_size, MAX(rp.popularity_index) as products_count,
             (
                 select string_agg(value::json ->> 'name', ' > ') from json_array_elements_text(category_tree)
@@ -258,8 +346,9 @@ def get_individual_category_performance_details(db: Session, categories: List[st
         where rc.id in :categories
         group by rc.id, page_size, full_name
     """
-        ),
-        params={"categories": tuple(categories)},
+    params = {"categories": tuple(categories)}
+    rows = db.execute(
+        text_with_expanding_params(statement, params), params=params
     ).fetchall()
 
     result = convert_rows_to_dicts(rows)
@@ -334,16 +423,14 @@ def get_top_n_performance(db: Session, brand_id: str, global_filter: GlobalFilte
         ORDER BY product_count DESC;
     """
 
+    params = {
+        "brand_id": brand_id,
+        "categories": tuple(global_filter.categories),
+        "retailer_id": global_filter.retailers[0],
+        "groups": tuple(global_filter.groups),
+    }
     result = convert_rows_to_dicts(
-        db.execute(
-            statement,
-            {
-                "brand_id": brand_id,
-                "categories": tuple(global_filter.categories),
-                "retailer_id": global_filter.retailers[0],
-                "groups": tuple(global_filter.groups),
-            },
-        ).fetchall()
+        db.execute(text_with_expanding_params(statement, params), params).fetchall()
     )
 
     # HARD CODE to remove Louis Polsen categories from the result.
@@ -408,17 +495,15 @@ def get_historical_top_n_performance(
                     AND date_trunc('week', top_product_count.time) = date_trunc('week', rcts.time)
                     LIMIT 1) A;
     """
+    params = {
+        "start_date": global_filter.start_date,
+        "retailer_category_id": retailer_category_id,
+        "brand_id": brand_id,
+        "categories": tuple(global_filter.categories),
+        "groups": tuple(global_filter.groups),
+    }
     result = convert_rows_to_dicts(
-        db.execute(
-            statement,
-            {
-                "start_date": global_filter.start_date,
-                "retailer_category_id": retailer_category_id,
-                "brand_id": brand_id,
-                "categories": tuple(global_filter.categories),
-                "groups": tuple(global_filter.groups),
-            },
-        ).fetchall()
+        db.execute(text_with_expanding_params(statement, params), params).fetchall()
     )
 
     return result
@@ -1,6 +1,7 @@
-from hashlib import pbkdf2_hmac
+import hmac
+from hashlib import pbkdf2_hmac, sha256
+from typing import Iterable
 
-from cachetools import cached, TTLCache
 from cryptography.fernet import Fernet
 from sqlalchemy import func
 from sqlalchemy.orm import Session
@@ -10,6 +11,7 @@ from app import crud
 from app.config.settings import get_settings
 from app.models import ApiKey
 from app.schemas.auth import TokenData
+from app.service.cache import LookupCache
 
 logger = get_logger()
 
@@ -34,6 +36,17 @@ def hash_api_key(api_key: str) -> bytes:
     )
 
 
+def get_api_key_digest(api_key: str) -> bytes:
+    """
+    Cheap alternative to `hash_api_key`, only used to identify the keys that have already been verified. Keyed with
+    the secret salt, so that the keys cannot be recovered from the digests kept in memory.
+    """
+    settings = get_settings()
+    return hmac.new(
+        settings.api_keys_secret_salt.encode(), api_key.encode(), sha256
+    ).digest()
+
+
 def encrypt_api_key(api_key: str) -> bytes:
     settings = get_settings()
     encryption_key = settings.fernet_secret_key
@@ -84,6 +97,8 @@ def delete_api_key(db: Session, key_id: str, user: TokenData):
         .delete()
     )
     db.commit()
+    # The digests of the keys are not known, but keys are rarely deleted
+    verified_api_keys.clear()
     return deleted_count
 
 
@@ -99,24 +114,43 @@ def get_readable_api_key(db: Session, key_id: str, user: TokenData):
     return decrypt_api_key(api_key_obj.encrypted_key)
 
 
-@cached(cache=TTLCache(maxsize=128, ttl=600))
+# The keys verified recently, by digest (see `get_api_key_digest`), so that they are not hashed again on every
+# request. Unknown keys are not cached, a key created in the meantime would be rejected otherwise.
+verified_api_keys = LookupCache("api_keys", max_entries=1024, ttl_seconds=600)
+
+
 def check_api_key(db: Session, api_key_header: str):
     """
     Check if the api key is valid.
 
-    The result of this function is cached for 10 minutes to avoid unnecessary queries to the database.
+    The valid keys are cached for 10 minutes, so that they are only hashed and looked up in the database once in a
+    while. A key deleted through another instance keeps working on this one until its entry expires.
+
+    Does not track the use of the key, see `app.service.api_keys.api_key_usage_recorder`.
 
     :param db:
     :param api_key_header:
-    :return:
+    :return: The api key, detached from the session, or None if it is not valid
     """
+    digest = get_api_key_digest(api_key_header)
+    found, api_key_entry = verified_api_keys.get(digest)
+    if found:
+        return api_key_entry
+
     hashed_key = hash_api_key(api_key_header)
     api_key_entry = db.query(ApiKey).filter_by(hashed_key=hashed_key).first()
     if not api_key_entry:
         return None
-    # Good practice to keep track of the keys that are being used
-    logger.info(f"API key {api_key_entry.id} used")
-    api_key_entry.last_used_at = func.current_timestamp()
-    db.commit()
 
+    logger.info(f"API key {api_key_entry.id} verified")
+    # The entry outlives the session it was loaded in
+    db.expunge(api_key_entry)
+    verified_api_keys.set(digest, api_key_entry)
     return api_key_entry
+
+
+def update_api_keys_last_used_at(db: Session, key_ids: Iterable[str]):
+    db.query(ApiKey).filter(ApiKey.id.in_(list(key_ids))).update(
+        {"last_used_at": func.current_timestamp()}, synchronize_session=False
+    )
+    db.commit()
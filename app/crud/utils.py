@@ -1,18 +1,29 @@
-import io
+import json
 from datetime import datetime, timedelta
 from functools import reduce
-from typing import List, Dict, Optional, TypeVar, Callable, Type, Literal, Union
-from cachetools import cached, TTLCache
-
-import pandas
+from typing import (
+    List,
+    Dict,
+    Optional,
+    TypeVar,
+    Callable,
+    Type,
+    Literal,
+    Union,
+    Tuple,
+    Hashable,
+)
+import numpy as np
+import pandas as pd
 from pydantic import BaseModel
-from sqlalchemy import text
+from sqlalchemy import text, bindparam, column, Integer
 from sqlalchemy.engine import Row
 from sqlalchemy.orm import Session
-from starlette.responses import Response
+from sqlalchemy.sql.elements import TextClause
 
 from app.schemas.filters import GlobalFilter, PagedGlobalFilter, DataPageFilter
 from app.schemas.prices import RetailerHistoricalItem
+from app.service.cache import LookupCache, cached_lookup
 
 
 def convert_rows_to_dicts(rows: List[Row]) -> List[Dict]:
@@ -20,6 +31,79 @@ def convert_rows_to_dicts(rows: List[Row]) -> List[Dict]:
     return [dict(r._mapping) for r in rows]
 
 
+def text_with_expanding_params(statement: str, params: Dict) -> TextClause:
+    """
+    Build a `text()` clause in which every tuple parameter is bound as an expanding `IN` list.
+
+    psycopg2 renders python tuples as `(a, b, c)` on its own, which is what the `IN :retailers` pattern used across
+    the crud layer relies on. asyncpg does not, so we let SQLAlchemy expand the lists itself, which works with both
+    drivers.
+
+    :param statement:
+    :param params: the parameters the statement will be executed with
+    :return:
+    """
+    clause = text(statement)
+    return clause.bindparams(
+        *[
+            bindparam(key, expanding=True)
+            for key, value in params.items()
+            if isinstance(value, tuple) and key in clause._bindparams
+        ]
+    )
+
+
+TOTAL_COUNT_COLUMN = "total_count"
+
+
+def select_with_total_count(statement: str) -> str:
+    """
+    Adds the `TOTAL_COUNT_COLUMN` to the results of the statement: the number of rows it returns, counted before any
+    pagination applied on top of it. This gets the size of the datapool in the same scan as the page, instead of
+    running the whole query a second time wrapped in a `SELECT COUNT(*)`.
+
+    :param statement: The unpaged datapool
+    :return:
+    """
+    return f"""
+        SELECT *, COUNT(*) OVER () AS {TOTAL_COUNT_COLUMN}
+        FROM (
+            {statement}
+        ) counted_datapool
+    """
+
+
+def split_total_count(
+    rows: List[Tuple], count_datapool: Callable[[], int]
+) -> Tuple[List, int]:
+    """
+    :param rows: Tuples of an entity and the total count, as returned when using `select_with_total_count`
+    :param count_datapool: Counts the datapool separately, only used when the page is empty (e.g. when requesting a
+        page past the last one) because there is no row to read the total count from
+    :return: The entities and the total count
+    """
+    if not rows:
+        return [], count_datapool()
+
+    return [row[0] for row in rows], rows[0][1]
+
+
+def estimate_statement_rows_count(db: Session, statement: str, params: Dict) -> int:
+    """
+    Returns the number of rows the query planner expects the statement to return. The statement is planned but not
+    executed, so this is cheap regardless of the size of the results, but it can be far off for complex filters.
+    """
+    explain_statement = f"EXPLAIN (FORMAT JSON) {statement}"
+    plan = db.execute(
+        text_with_expanding_params(explain_statement, params), params
+    ).scalar()
+    # psycopg2 decodes the json result, asyncpg does not
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
 def get_results_from_statement_with_filters(
     db: Session,
     brand_id: str,
@@ -29,19 +113,20 @@ def get_results_from_statement_with_filters(
     offset: Optional[int] = None,
     extra_params: Optional[Dict] = None,
 ):
+    params = {
+        "brand_id": brand_id,
+        "start_date": global_filter.start_date,
+        "countries": tuple(global_filter.countries),
+        "retailers": tuple(global_filter.retailers),
+        "categories": tuple(global_filter.categories),
+        "groups": tuple(global_filter.groups),
+        "limit": limit,
+        "offset": offset,
+        **(extra_params or {}),
+    }
     result = db.execute(
-        text(statement),
-        params={
-            "brand_id": brand_id,
-            "start_date": global_filter.start_date,
-            "countries": tuple(global_filter.countries),
-            "retailers": tuple(global_filter.retailers),
-            "categories": tuple(global_filter.categories),
-            "groups": tuple(global_filter.groups),
-            "limit": limit,
-            "offset": offset,
-            **(extra_params or {}),
-        },
+        text_with_expanding_params(statement, params),
+        params=params,
     ).all()
 
     return convert_rows_to_dicts(result)
@@ -54,7 +139,13 @@ def get_result_entities_from_statement_with_paged_filters(
     global_filter: Union[PagedGlobalFilter, DataPageFilter],
     statement: str,
     ignore_pagination: bool = False,
+    extra_params: Optional[Dict] = None,
+    with_total_count: bool = False,
 ):
+    """
+    :param with_total_count: Whether the statement selects the `TOTAL_COUNT_COLUMN`, in which case every result is a
+        tuple of the entity and the total count (see `split_total_count`)
+    """
     params_dict = {
         "brand_id": brand_id,
         "start_date": global_filter.start_date,
@@ -70,6 +161,7 @@ def get_result_entities_from_statement_with_paged_filters(
             for index, i in enumerate(global_filter.data_grid_filter.items)
             if i.is_well_defined()
         },
+        **(extra_params or {}),
     }
 
     if entity == "count":
@@ -79,11 +171,14 @@ def get_result_entities_from_statement_with_paged_filters(
                 {statement}
             ) aux
         """
-        query = db.execute(text(statement), params=params_dict)
+        query = db.execute(
+            text_with_expanding_params(statement, params_dict), params=params_dict
+        )
     else:
+        columns = [column(TOTAL_COUNT_COLUMN, Integer)] if with_total_count else []
         query = (
-            db.query(entity)
-            .from_statement(text(statement))
+            db.query(entity, *columns)
+            .from_statement(text_with_expanding_params(statement, params_dict))
             .params(
                 **params_dict,
             )
@@ -129,7 +224,34 @@ def create_append_to_history_reducer(
     return append_to_history
 
 
+def _forward_fill_indexes(present: np.ndarray) -> np.ndarray:
+    """
+    :param present: Which rows have a value, for each column
+    :return: For each cell, the row of the last value at or before it, -1 if there is none
+    """
+    rows = np.arange(len(present)).reshape((-1,) + (1,) * (present.ndim - 1))
+    return np.maximum.accumulate(np.where(present, rows, -1), axis=0)
+
+
 def extract_minimal_values(retailers: List[Dict[str, any]]):
+    """
+    Same as `extract_minimal_values_from_history`, for the lines of the chart in the `points` layout.
+
+    :param retailers: The lines of the chart, with their points (`x` the date, `y` the value) sorted by date
+    :return: The points of the area, empty if no retailer has a value
+    """
+    return extract_minimal_values_from_history(
+        [index for index, r in enumerate(retailers) for _ in r["data"]],
+        [point["x"] for r in retailers for point in r["data"]],
+        [point["y"] for r in retailers for point in r["data"]],
+    )
+
+
+def extract_minimal_values_from_history(
+    retailer_keys: List[Hashable],
+    times: List[datetime.date],
+    values: List[Optional[float]],
+):
     """
     Extract the minimal values for the area shown on the individual product price chart
 
@@ -140,74 +262,90 @@ def extract_minimal_values(retailers: List[Dict[str, any]]):
     This is meant to work similarly to nivo. A missing date means that the lines continues without any point at that
     date, but an existing date with a null value signifies an interruption of the line.
 
-    :param retailers:
-    :return:
-    """
-    indexes_for_retailers = [0] * len(retailers)
-    minimal_values = []
+    The points are placed on a grid of all the dates by all the retailers, forward filled to get the value of every
+    retailer at every date (NaN when interrupted or not started yet), and the minimum is taken for each date. Only the
+    indexes of the points in the grid are computed in Python.
 
-    next_max_date = min([r["data"][0]["x"] for r in retailers])
-    while not all(
-        [i == len(r["data"]) - 1 for i, r in zip(indexes_for_retailers, retailers)]
-    ):
-        next_value_by_retailer = [
-            r["data"][indexes_for_retailers[i]]["y"]
-            for i, r in enumerate(retailers)
-            if (
-                indexes_for_retailers[i] < len(r["data"])
-                and r["data"][indexes_for_retailers[i]]["x"] <= next_max_date
-                and r["data"][indexes_for_retailers[i]]["y"] is not None
-            )
-        ]
+    Only the steps are kept: a point is added when the minimal value changes. The last date only closes the area, with
+    the last minimal value, unless there is no value before it. When all the retailers are interrupted at a date, the
+    area continues with the last minimal value.
 
-        # If no value is found for any of the retailers it means we have a gap in the data
-        # for all the retailers at that date. To keep the continuity of the area under the curve
-        # with minimal prices, we duplicate the last datapoint and continue iterating
-        min_value = (
-            min(next_value_by_retailer)
-            if next_value_by_retailer
-            else minimal_values[-1]["y"]
-        )
+    The arguments are the points of the lines, like for `create_history_columns`, sorted by date for each retailer.
+    When a retailer has several points at the same date, the last one is used.
 
-        # Update min if different than the previous, we are only interested in steps
-        if (
-            not minimal_values
-            or minimal_values[len(minimal_values) - 1]["y"] != min_value
-        ):
-            minimal_values.append(
-                {
-                    "x": next_max_date,
-                    "y": min_value,
-                }
-            )
+    :param retailer_keys: The retailer of each point
+    :param times: The date of each point
+    :param values: The value of each point
+    :return: The points of the area, empty if no retailer has a value
+    """
+    dates = sorted(set(times))
+    if not dates:
+        return []
+
+    date_indexes = {d: i for i, d in enumerate(dates)}
+    retailer_indexes = {k: i for i, k in enumerate(dict.fromkeys(retailer_keys))}
+    rows = [date_indexes[t] for t in times]
+    columns = [retailer_indexes[k] for k in retailer_keys]
+    grid_values = np.full((len(dates), len(retailer_indexes)), np.nan)
+    has_point = np.zeros((len(dates), len(retailer_indexes)), dtype=bool)
+    # None becomes NaN, an interruption of the line
+    grid_values[rows, columns] = np.array(values, dtype=float)
+    has_point[rows, columns] = True
+
+    last_points = _forward_fill_indexes(has_point)
+    current_values = np.where(
+        last_points >= 0,
+        np.take_along_axis(grid_values, np.maximum(last_points, 0), axis=0),
+        np.nan,
+    )
+    # NaN when all the retailers are interrupted, fmin ignores NaN without warning
+    min_values = np.fmin.reduce(current_values, axis=1)
+
+    # If no value is found for any of the retailers it means we have a gap in the data
+    # for all the retailers at that date. To keep the continuity of the area under the curve
+    # with minimal prices, we keep the last value
+    last_min_values = _forward_fill_indexes(~np.isnan(min_values))
+    min_values = np.where(
+        last_min_values >= 0, min_values[np.maximum(last_min_values, 0)], np.nan
+    )
 
-        next_max_date = min(
-            [
-                r["data"][indexes_for_retailers[i] + 1]["x"]
-                for i, r in enumerate(retailers)
-                if indexes_for_retailers[i] + 1 < len(r["data"])
-            ]
-        )
+    steps_count = len(dates) - 1
+    if steps_count == 0 or np.isnan(min_values[:steps_count]).all():
+        steps_count = len(dates)
 
-        # Increase indexes for retailers that do not go over next max date
-        for i, r in enumerate(retailers):
-            if (
-                indexes_for_retailers[i] + 1 < len(r["data"])
-                and r["data"][indexes_for_retailers[i] + 1]["x"] == next_max_date
-            ):
-                indexes_for_retailers[i] += 1
+    # We are only interested in steps: the first value and the changes
+    previous_min_values = np.concatenate([[np.nan], min_values[: steps_count - 1]])
+    step_rows = np.flatnonzero(
+        ~np.isnan(min_values[:steps_count])
+        & (min_values[:steps_count] != previous_min_values)
+    )
+    minimal_values = [
+        {"x": dates[row], "y": value}
+        for row, value in zip(step_rows.tolist(), min_values[step_rows].tolist())
+    ]
 
     # Add last date with the last known value
-    minimal_values.append(
-        {
-            "x": next_max_date,
-            "y": minimal_values[len(minimal_values) - 1]["y"],
-        }
-    )
+    if minimal_values and minimal_values[-1]["x"] != dates[-1]:
+        minimal_values.append({"x": dates[-1], "y": minimal_values[-1]["y"]})
 
     return minimal_values
 
 
+def get_history_value_range(history, value_label: str) -> Tuple[any, any]:
+    max_value = (
+        max([i[value_label] for i in history if i[value_label] is not None])
+        if history
+        else 0
+    )
+    min_value = (
+        min([i[value_label] for i in history if i[value_label] is not None])
+        if history
+        else 0
+    )
+
+    return max_value, min_value
+
+
 def process_historical_value_per_retailer(
     history, value_label: str = "score", force_two_points: bool = True
 ) -> dict:
@@ -244,18 +382,76 @@ def process_historical_value_per_retailer(
                     },
                 )
 
-    max_value = (
-        max([i[value_label] for i in history if i[value_label] is not None])
-        if history
-        else 0
+    max_value, min_value = get_history_value_range(history, value_label)
+
+    return {"retailers": retailers, "max_value": max_value, "min_value": min_value}
+
+
+def create_history_columns(
+    retailer_keys: List[str],
+    times: List[datetime.date],
+    values: List[Optional[float]],
+    force_two_points: bool = True,
+) -> dict:
+    """
+    Groups the history of the retailers in columns: the dates of all the retailers once, and the values of each
+    retailer at these dates. The equivalent of `create_append_to_history_reducer` for the `columns` layout.
+
+    :param retailer_keys: The retailer of each point, the retailers are returned in the order they appear in
+    :param times: The date of each point
+    :param values: The value of each point
+    :param force_two_points: if a retailer only has one data point, we add a second one with the same value but a week
+    before to make sure the line is visible
+    :return: `x` the sorted dates, `retailers` the `id` and the values `y` (`None` where missing) of each retailer
+    """
+    if not retailer_keys:
+        return {"x": [], "retailers": []}
+
+    frame = pd.DataFrame({"retailer": retailer_keys, "x": times, "y": values})
+    retailers_order = frame["retailer"].unique()
+    if force_two_points:
+        points_count = frame.groupby("retailer", sort=False)["x"].transform("size")
+        single_points = frame[points_count == 1]
+        frame = pd.concat(
+            [single_points.assign(x=single_points["x"] - timedelta(days=7)), frame]
+        )
+
+    table = (
+        frame.drop_duplicates(["retailer", "x"], keep="last")
+        .pivot(index="x", columns="retailer", values="y")
+        .sort_index()
+        .reindex(columns=retailers_order)
     )
-    min_value = (
-        min([i[value_label] for i in history if i[value_label] is not None])
-        if history
-        else 0
+    # NaN is not valid JSON
+    table = table.astype(object).where(table.notna(), None)
+
+    return {
+        # Pandas turns the datetimes of some crud histories into timestamps, the layout is in dates
+        "x": [x.date() if isinstance(x, datetime) else x for x in table.index],
+        "retailers": [
+            {"id": retailer, "y": table[retailer].tolist()}
+            for retailer in table.columns
+        ],
+    }
+
+
+def process_historical_value_per_retailer_in_columns(
+    history, value_label: str = "score", force_two_points: bool = True
+) -> dict:
+    """
+    Same as `process_historical_value_per_retailer`, with the history of the retailers in columns, see
+    `create_history_columns`.
+    """
+    columns = create_history_columns(
+        [i["retailer"] for i in history],
+        [i["time"] for i in history],
+        [i[value_label] for i in history],
+        force_two_points,
     )
 
-    return {"retailers": retailers, "max_value": max_value, "min_value": min_value}
+    max_value, min_value = get_history_value_range(history, value_label)
+
+    return {**columns, "max_value": max_value, "min_value": min_value}
 
 
 def duplicate_unique_points(grouped_history: dict) -> dict:
@@ -268,18 +464,11 @@ def duplicate_unique_points(grouped_history: dict) -> dict:
     return grouped_history
 
 
-def export_dataframe_to_xlsx(df: pandas.DataFrame):
-    buffer = io.BytesIO()
-    df.to_excel(buffer, index=False, engine="xlsxwriter")
-
-    return Response(buffer.getvalue())
-
-
-def export_rows_to_xlsx(products: List[BaseModel]):
-    products_df = pandas.DataFrame([p.dict() for p in products])
-    return export_dataframe_to_xlsx(products_df)
-
-@cached(cache=TTLCache(maxsize=512, ttl=3600)) # Cache for 1 hour
+# The rates are updated once a day, cache them for 1 hour
+@cached_lookup(
+    LookupCache("currency_exchange_rates", max_entries=64, ttl_seconds=3600),
+    key=lambda db, user_currency: user_currency,
+)
 def get_currency_exchange_rates(
         db: Session,
         user_currency: str,
@@ -1,23 +1,123 @@
+import threading
+import time
+from typing import Dict
+
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool, Pool
 
 from app.config.settings import get_settings
 
 settings = get_settings()
 
-SQLALCHEMY_DATABASE_URL = (
-    f"postgresql://{settings.db_user}:{settings.db_pass}@{settings.db_host}/{settings.db_name}"
-    if not settings.db_host.startswith("/")
-    else f"postgresql://{settings.db_user}:{settings.db_pass}@/{settings.db_name}?host={settings.db_host}"
-)  # unix socket
+
+def _build_database_url(driver: str) -> str:
+    if settings.db_host.startswith("/"):
+        # unix socket
+        return f"{driver}://{settings.db_user}:{settings.db_pass}@/{settings.db_name}?host={settings.db_host}"
+
+    return f"{driver}://{settings.db_user}:{settings.db_pass}@{settings.db_host}/{settings.db_name}"
+
+
+SQLALCHEMY_DATABASE_URL = _build_database_url("postgresql")
+ASYNC_SQLALCHEMY_DATABASE_URL = _build_database_url("postgresql+asyncpg")
+
+
+class PoolWaitStats:
+    """
+    Keeps track of how long callers had to wait to get a connection out of the pool.
+
+    SQLAlchemy only reports the current state of the pool, which does not tell us whether requests were queueing
+    before they got a connection.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts_count = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def record(self, wait_seconds: float):
+        with self._lock:
+            self.checkouts_count += 1
+            self.total_wait_seconds += wait_seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+
+    def as_dict(self) -> Dict:
+        with self._lock:
+            return {
+                "checkouts_count": self.checkouts_count,
+                "total_wait_seconds": self.total_wait_seconds,
+                "average_wait_seconds": (
+                    self.total_wait_seconds / self.checkouts_count
+                    if self.checkouts_count
+                    else 0.0
+                ),
+                "max_wait_seconds": self.max_wait_seconds,
+            }
+
+
+class _WaitTimeTrackingPoolMixin:
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = PoolWaitStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.wait_stats.record(time.perf_counter() - start)
+
+
+class WaitTimeTrackingQueuePool(_WaitTimeTrackingPoolMixin, QueuePool):
+    pass
+
+
+class WaitTimeTrackingAsyncQueuePool(_WaitTimeTrackingPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+_pool_options = dict(
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout,
+    pool_recycle=settings.db_pool_recycle,
+    pool_pre_ping=settings.db_pool_pre_ping,
+)
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
     echo=True if settings.panprices_environment == "local" else False,
+    poolclass=WaitTimeTrackingQueuePool,
+    connect_args={
+        "options": f"-c statement_timeout={settings.db_statement_timeout_ms}"
+    },
+    **_pool_options,
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_engine(
+    ASYNC_SQLALCHEMY_DATABASE_URL,
+    echo=True if settings.panprices_environment == "local" else False,
+    poolclass=WaitTimeTrackingAsyncQueuePool,
+    connect_args={
+        "server_settings": {"statement_timeout": str(settings.db_statement_timeout_ms)}
+    },
+    **_pool_options,
+)
+# Objects returned by the crud layer are serialized after the session is done with them, so we do not want them to
+# be expired (and lazily reloaded outside the event loop's greenlet) on commit.
+AsyncSessionLocal = sessionmaker(
+    autocommit=False,
+    autoflush=False,
+    expire_on_commit=False,
+    bind=async_engine,
+    class_=AsyncSession,
+)
+
 
 Base = declarative_base()
 
@@ -28,3 +128,33 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    """
+    Async counterpart of `get_db`, to be used by `async def` endpoints.
+
+    The crud layer is written against the synchronous `Session` API, so endpoints call it through
+    `AsyncSession.run_sync`: the crud function receives a regular `Session` whose I/O is performed by the asyncpg
+    driver, which means the event loop keeps serving other requests while Postgres is working.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def get_pool_status(pool: Pool) -> Dict:
+    return {
+        "size": pool.size(),
+        "max_overflow": settings.db_max_overflow,
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        **pool.wait_stats.as_dict(),
+    }
+
+
+def get_pools_status() -> Dict[str, Dict]:
+    return {
+        "sync_pool": get_pool_status(engine.pool),
+        "async_pool": get_pool_status(async_engine.sync_engine.pool),
+    }
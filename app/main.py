@@ -1,11 +1,16 @@
-import json
+import asyncio
 import os
+import time
+from contextlib import asynccontextmanager
 
 import uvicorn
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import HTMLResponse, JSONResponse
 from starlette.middleware.cors import CORSMiddleware
 import structlog
 
+from app import crud
+from app.config.settings import get_settings
 from app.logging import config_structlog
 
 
@@ -22,10 +27,81 @@ from app.routers import (
     stock,
     price,
     external_v2,
+    diagnostics,
+    metrics,
 )
 
+from app.security import decode_jwt
+from app.service.api_keys import api_key_usage_recorder
+from app.service.http_client import close_http_client, open_http_client
+from app.service.matviews import matview_refresh_tracker
+from app.service.metrics import observe_request, requests_in_flight, time_crud_functions
+from app.service.profiling import (
+    import_pyinstrument,
+    start_request_timings,
+    time_endpoints,
+)
+from app.service.request_logging import (
+    get_full_request_fields,
+    get_request_fingerprint,
+    get_route_path,
+    get_unknown_sample_rate_routes,
+    should_log_request,
+)
+from app.service.screenshot import screenshot_index
+
 config_structlog()
 logger = structlog.get_logger()
+settings = get_settings()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    unknown_sample_rate_routes = get_unknown_sample_rate_routes(
+        getattr(route, "path", None) for route in app.routes
+    )
+    if unknown_sample_rate_routes:
+        logger.warn(
+            "Sample rates configured for routes that do not exist",
+            routes=unknown_sample_rate_routes,
+        )
+
+    await open_http_client()
+    background_tasks = []
+    if settings.matview_refresh_poll_interval_seconds > 0:
+        background_tasks.append(
+            asyncio.create_task(
+                matview_refresh_tracker.poll_forever(
+                    settings.matview_refresh_poll_interval_seconds
+                )
+            )
+        )
+    if settings.screenshot_manifest_refresh_interval_seconds > 0:
+        background_tasks.append(
+            asyncio.create_task(
+                screenshot_index.refresh_manifest_forever(
+                    settings.screenshot_manifest_refresh_interval_seconds
+                )
+            )
+        )
+    background_tasks.append(
+        asyncio.create_task(
+            api_key_usage_recorder.flush_forever(
+                settings.api_keys_usage_flush_interval_seconds
+            )
+        )
+    )
+
+    yield
+
+    for task in background_tasks:
+        task.cancel()
+    try:
+        await api_key_usage_recorder.flush()
+    except Exception as e:
+        logger.error("Failed to update the last use of the API keys", error=e)
+    await close_http_client()
+
 
 app = FastAPI(
     title="Panprices - Digital Shelf Analytics Solution API",
@@ -35,6 +111,7 @@ app = FastAPI(
         returns valuable overview insights as well as the ability to analyze particular products and observe how they
         are doing. 
     """,
+    lifespan=lifespan,
 )
 
 origins = [
@@ -50,34 +127,89 @@ app.add_middleware(
 )
 
 
+def __is_developer(request: Request) -> bool:
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    token_data = decode_jwt(token) if scheme.lower() == "bearer" else None
+    return token_data is not None and "developer" in token_data.roles
+
+
+async def __profile_request(request: Request, call_next) -> Response:
+    """
+    Runs the request under a sampling profiler and responds with the profile instead of the actual response.
+
+    Only the event loop thread is sampled: the time spent by the synchronous endpoints shows up as waiting for their
+    thread.
+    """
+    try:
+        pyinstrument = import_pyinstrument()
+    except RuntimeError as e:
+        return JSONResponse(status_code=501, content={"detail": str(e)})
+
+    profiler = pyinstrument.Profiler(
+        interval=settings.profiling_interval_seconds, async_mode="enabled"
+    )
+    profiler.start()
+    response = await call_next(request)
+    # Streamed responses are only produced while their body is read
+    async for _ in response.body_iterator:
+        pass
+    profiler.stop()
+
+    return HTMLResponse(profiler.output_html())
+
+
 @app.middleware("http")
 async def canonical_line_logger(request: Request, call_next):
     # Inspiration from Stripe: https://stripe.com/blog/canonical-log-lines
+    timings = start_request_timings()
+
+    if request.headers.get("x-profile") and __is_developer(request):
+        return await __profile_request(request, call_next)
 
     # !Important: always catch exceptions since a request should never fail
     # because of logging.
     try:
-        if request.method in ("POST", "PUT"):
-            request_body_json = await request.json()
-        else:
-            request_body_json = None
-    except json.JSONDecodeError:
-        # No need to care if the request body format is incorrect:
-        request_body_json = None
+        # Read before the endpoint consumes the body
+        request_fields = (
+            await get_full_request_fields(request)
+            if settings.request_log_mode == "full"
+            else {"http_request_fingerprint": await get_request_fingerprint(request)}
+        )
     except Exception as e:
         logger.error("Logging error", error=e)
+        request_fields = {}
+
+    status_code = 500
+    requests_in_flight.inc()
     try:
-        logger.info(
-            "Request received",
-            http_method=request.method,
-            http_path=request.url.path,
-            http_request_headers=request.headers,
-            http_request_body=request_body_json,
-        )
-    except Exception as e:
-        logger.error(f"Canonical line logging failed!", error=e)
-    response = await call_next(request)
-    return response
+        response = await call_next(request)
+        status_code = response.status_code
+        # The body of streamed responses is still being produced, only the time to the first byte is known
+        timings.response_started_at = time.perf_counter()
+        response.headers["Server-Timing"] = timings.as_server_timing()
+        return response
+    finally:
+        requests_in_flight.dec()
+        try:
+            route_path = get_route_path(request)
+            observe_request(
+                request.method,
+                route_path,
+                status_code,
+                timings.get_phases()["total"],
+            )
+            if should_log_request(route_path, status_code):
+                logger.info(
+                    "Request handled",
+                    http_method=request.method,
+                    http_path=request.url.path,
+                    http_route=route_path,
+                    http_status=status_code,
+                    **request_fields,
+                    **timings.as_log_fields(),
+                )
+        except Exception as e:
+            logger.error(f"Canonical line logging failed!", error=e)
 
 
 app.include_router(auth.router)
@@ -92,6 +224,10 @@ app.include_router(groups.router)
 app.include_router(stock.router)
 app.include_router(price.router)
 app.include_router(external_v2.router)
+app.include_router(diagnostics.router)
+app.include_router(metrics.router)
+time_endpoints(app.routes)
+time_crud_functions(crud)
 
 
 if __name__ == "__main__":
@@ -1,6 +1,6 @@
 from typing import List
 
-from sqlalchemy import Column, String, ForeignKey, Boolean, Float, Integer
+from sqlalchemy import Column, String, ForeignKey, Boolean, Float, Integer, and_
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship
@@ -11,6 +11,8 @@ from app.models.mappings import (
 )
 from app.models.matching import ProductMatching
 from app.models.mixins import (
+    ImageType,
+    image_type_count_property,
     GenericCategoryMixin,
     UpdatableMixin,
     GenericProductMixin,
@@ -144,6 +146,20 @@ class BrandProduct(Base, UUIDPrimaryKeyMixin, GenericProductMixin, UpdatableMixi
         return [i for i in self.images if i.image_hash is not None and not i.temp_wrong]
 
 
+# Like `processed_images`, the product is needed to correlate the counts of its images
+_processed_brand_images = and_(
+    BrandImage.brand_product_id == BrandProduct.id,
+    BrandImage.image_hash.isnot(None),
+    BrandImage.temp_wrong.isnot(True),
+)
+BrandProduct.environmental_images_count = image_type_count_property(
+    BrandImage, BrandImageType, _processed_brand_images, ImageType.environmental
+)
+BrandProduct.transparent_images_count = image_type_count_property(
+    BrandImage, BrandImageType, _processed_brand_images, ImageType.transparent
+)
+
+
 class MockBrandProductGridItem(Base, UUIDPrimaryKeyMixin):
     __tablename__ = "__mocked_brand_product_grid_item__"
 
@@ -3,9 +3,13 @@ import uuid
 from datetime import timedelta
 from typing import List
 
-from sqlalchemy import String, Column, DateTime, Enum, Integer, Float, func
+from sqlalchemy import String, Column, DateTime, Enum, Integer, Float, func, select
 from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import column_property
+
+# The group of the deferred properties counting the images of a product
+IMAGES_COUNTS = "images_counts"
 
 
 class UpdatableMixin:
@@ -46,41 +50,42 @@ class GenericProductMixin:
     gtin = Column(String)
     images: List[ImageMixin] = Column()
 
+    # Counted in SQL, see `image_type_count_property`
+    environmental_images_count: int
+    transparent_images_count: int
+
     @hybrid_property
     def processed_images(self):
         return [i for i in self.images if i.image_hash is not None]
 
-    @hybrid_property
-    def environmental_images_count(self):
-        return len(
-            [
-                i
-                for i in self.processed_images
-                if len(i.type_predictions) > 0
-                and (
-                    sorted(
-                        i.type_predictions, key=lambda x: x.confidence, reverse=True
-                    )[0].prediction
-                    == ImageType.environmental
-                )
-            ]
-        )
 
-    @hybrid_property
-    def transparent_images_count(self):
-        return len(
-            [
-                i
-                for i in self.processed_images
-                if len(i.type_predictions) > 0
-                and (
-                    sorted(
-                        i.type_predictions, key=lambda x: x.confidence, reverse=True
-                    )[0].prediction
-                    == ImageType.transparent
-                )
-            ]
-        )
+def image_type_count_property(
+    image_entity, image_type_entity, processed_images_clause, image_type: ImageType
+):
+    """
+    The number of processed images of a product whose most confident type prediction is `image_type`, counted by the
+    database instead of loading every image of the product and its predictions.
+
+    The property is deferred, the queries that need the counts load them with `undefer_group(IMAGES_COUNTS)`.
+
+    :param processed_images_clause: Selects the processed images of the product, correlated with the product entity
+    """
+    top_prediction = (
+        select(image_type_entity.prediction)
+        .where(image_type_entity.image_id == image_entity.id)
+        .order_by(image_type_entity.confidence.desc().nullslast())
+        .limit(1)
+        .scalar_subquery()
+    )
+
+    return column_property(
+        select(func.count())
+        .select_from(image_entity)
+        .where(processed_images_clause, top_prediction == image_type)
+        .scalar_subquery(),
+        deferred=True,
+        group=IMAGES_COUNTS,
+    )
 
 
 class GenericCategoryMixin:
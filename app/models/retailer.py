@@ -12,13 +12,20 @@ from sqlalchemy import (
     Float,
     Boolean,
     DateTime,
+    and_,
+    distinct,
+    func,
+    select,
 )
 from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.ext.hybrid import hybrid_property
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import column_property, relationship
 
 from app.database import Base
 from app.models.mixins import (
+    IMAGES_COUNTS,
+    ImageType,
+    image_type_count_property,
     GenericProductMixin,
     UpdatableMixin,
     GenericCategoryMixin,
@@ -245,13 +252,8 @@ class RetailerProduct(Base, UUIDPrimaryKeyMixin, GenericProductMixin, UpdatableM
     )
     historical_data = relationship("RetailerProductHistory", back_populates="product")
 
-    @hybrid_property
-    def retailer_images_count(self):
-        return (
-            len(set([i.image_hash for i in self.images if i.image_hash is not None]))
-            if self.images
-            else 0
-        )
+    # Counted in SQL, see below
+    retailer_images_count: int
 
     @hybrid_property
     def in_stock(self) -> bool:
@@ -268,3 +270,29 @@ class RetailerProduct(Base, UUIDPrimaryKeyMixin, GenericProductMixin, UpdatableM
     @hybrid_property
     def price_standard(self):
         return self.price / 100 if self.price else None
+
+
+# The product is needed to correlate the counts of its images, so they are only added once the entity is defined
+RetailerProduct.retailer_images_count = column_property(
+    select(func.count(distinct(RetailerImage.image_hash)))
+    .where(RetailerImage.retailer_product_id == RetailerProduct.id)
+    .scalar_subquery(),
+    deferred=True,
+    group=IMAGES_COUNTS,
+)
+_processed_retailer_images = and_(
+    RetailerImage.retailer_product_id == RetailerProduct.id,
+    RetailerImage.image_hash.isnot(None),
+)
+RetailerProduct.environmental_images_count = image_type_count_property(
+    RetailerImage,
+    RetailerImageType,
+    _processed_retailer_images,
+    ImageType.environmental,
+)
+RetailerProduct.transparent_images_count = image_type_count_property(
+    RetailerImage,
+    RetailerImageType,
+    _processed_retailer_images,
+    ImageType.transparent,
+)
@@ -10,12 +10,14 @@ from app.schemas.availability import HistoricalVisibility
 from app.schemas.filters import GlobalFilter
 from app.schemas.scores import AvailableProductsPerRetailer
 from app.security import get_logged_in_user_data
+from app.service.cache import cached_response
 from app.tags import TAG_AVAILABILITY, TAG_OVERVIEW
 
 router = APIRouter(prefix="/availability")
 
 
 @router.post("/visible", tags=[TAG_AVAILABILITY], response_model=HistoricalVisibility)
+@cached_response("availability/visible", live=True)
 def get_visible_history(
     global_filter: GlobalFilter,
     user: TokenData = Depends(get_logged_in_user_data),
@@ -32,6 +34,7 @@ def get_visible_history(
 @router.post(
     "/visible/average", tags=[TAG_AVAILABILITY], response_model=HistoricalVisibility
 )
+@cached_response("availability/visible/average", live=True)
 def get_visible_history_average(
     global_filter: GlobalFilter,
     user: TokenData = Depends(get_logged_in_user_data),
@@ -50,6 +53,10 @@ def get_visible_history_average(
     tags=[TAG_OVERVIEW],
     response_model=AvailableProductsPerRetailer,
 )
+@cached_response(
+    "availability/per_retailer",
+    depends_on=["full_product_status_by_retailer_matview"],
+)
 def get_overview_availability_data(
     global_filter: GlobalFilter,
     user: TokenData = Depends(get_logged_in_user_data),
@@ -1,20 +1,21 @@
 from functools import reduce
 from typing import List
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from starlette import status
 
 from app import crud
 from app.crud.utils import (
     create_append_to_history_reducer,
+    create_history_columns,
     extract_minimal_values,
-    export_rows_to_xlsx,
+    extract_minimal_values_from_history,
     process_historical_value_per_retailer,
     duplicate_unique_points,
 )
-from app.database import get_db
-from app.models import ProductMatching
+from app.database import get_db, get_async_db
 from app.schemas.auth import TokenData
 from app.schemas.filters import (
     PagedGlobalFilter,
@@ -22,7 +23,13 @@ from app.schemas.filters import (
     DataPageFilter,
     PriceValuesFilter,
 )
-from app.schemas.prices import HistoricalPerRetailerResponse, MSRPValueItem
+from app.schemas.prices import (
+    HistoricalPerRetailerResponse,
+    HistoricalPerRetailerColumnsResponse,
+    HistoricalPerRetailerInLayoutResponse,
+    HistoryLayout,
+    MSRPValueItem,
+)
 from app.schemas.product import (
     BrandProductScaffold,
     BrandProductDeepMatchesScaffold,
@@ -30,35 +37,51 @@ from app.schemas.product import (
     MockBrandProductGridItem,
     BrandToDeepRetailerProductMatchingScaffold,
     MatchedRetailerProductScaffold,
-    AnyMatchingOfferScaffold,
     BrandProductAllOffersScaffold,
 )
 from app.security import get_logged_in_user_data
 from app.service.currency import add_user_currency_to_retailer_offers
+from app.service.export import (
+    ExportFormat,
+    create_export_response,
+    stream_statement_rows,
+)
 from app.service.screenshot import add_screenshots_to_retailer_offers
+from app.service.serialization import (
+    TrustedJSONResponse,
+    to_trusted_dict,
+    to_trusted_rows,
+)
 from app.tags import TAG_DATA
 
 router = APIRouter(prefix="/products/brand")
 
 
+def __get_deep_retailer_product_matches(
+    db: Session,
+    global_filter: GlobalFilter,
+    brand_product_id: str,
+    brand_id: str,
+) -> List[BrandToDeepRetailerProductMatchingScaffold]:
+    matches = crud.get_deep_retailer_offers_for_brand_product(
+        db, global_filter, brand_product_id, brand_id
+    )
+    return [BrandToDeepRetailerProductMatchingScaffold.parse_obj(m) for m in matches]
+
+
 async def __preprocess_retailer_product_deep_matches(
-    matches: List[ProductMatching],
+    matches: List[BrandToDeepRetailerProductMatchingScaffold],
 ) -> List[BrandToDeepRetailerProductMatchingScaffold]:
     retailer_products = [m.retailer_product for m in matches]
 
     retailer_products_processed = await add_screenshots_to_retailer_offers(
         retailer_products, MatchedRetailerProductScaffold
     )
-    matches_processed = [
-        BrandToDeepRetailerProductMatchingScaffold.from_orm(m) for m in matches
-    ]
 
-    for (match, retailer_product) in zip(
-        matches_processed, retailer_products_processed
-    ):
+    for (match, retailer_product) in zip(matches, retailer_products_processed):
         match.retailer_product = retailer_product
 
-    return matches_processed
+    return matches
 
 
 @router.post("", tags=[TAG_DATA], response_model=BrandProductsPage)
@@ -67,14 +90,19 @@ def get_brand_products(
     user: TokenData = Depends(get_logged_in_user_data),
     db: Session = Depends(get_db),
 ):
-    products = crud.get_brand_products_data_grid(db, user.client, page_global_filter)
+    products, total_count = crud.get_brand_products_data_grid_with_total_count(
+        db, user.client, page_global_filter
+    )
 
-    return {
-        "rows": products,
-        "count": len(products),
-        "offset": page_global_filter.get_products_offset(),
-        "total_count": crud.count_brand_products(db, user.client, page_global_filter),
-    }
+    return TrustedJSONResponse(
+        {
+            "rows": to_trusted_rows(products, MockBrandProductGridItem),
+            "count": len(products),
+            "offset": page_global_filter.get_products_offset(),
+            "total_count": total_count,
+            "total_count_is_estimated": page_global_filter.estimate_total_count,
+        }
+    )
 
 
 @router.post("/count", tags=[TAG_DATA], response_model=int)
@@ -89,14 +117,18 @@ def get_brand_products_count(
 @router.post("/export", tags=[TAG_DATA])
 async def export_products_to_xlsx(
     page_global_filter: PagedGlobalFilter,
+    export_format: ExportFormat = Query(default="xlsx", alias="format"),
     user: TokenData = Depends(get_logged_in_user_data),
-    db: Session = Depends(get_db),
 ):
-    products = crud.export_full_brand_products_result(
-        db, user.client, page_global_filter
+    statement, params = crud.get_brand_products_export_statement(
+        user.client, page_global_filter
+    )
+    return create_export_response(
+        list(MockBrandProductGridItem.__fields__),
+        stream_statement_rows(statement, params),
+        export_format,
+        "brand_products",
     )
-    products = [MockBrandProductGridItem.from_orm(p) for p in products]
-    return export_rows_to_xlsx(products)
 
 
 @router.get("/{brand_product_id}", tags=[TAG_DATA], response_model=BrandProductScaffold)
@@ -128,7 +160,7 @@ async def get_deep_matched_retailer_offers_for_brand_product(
     brand_product_id: str,
     global_filter: GlobalFilter,
     user: TokenData = Depends(get_logged_in_user_data),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Get all the retailer products that match the brand product
@@ -145,8 +177,11 @@ async def get_deep_matched_retailer_offers_for_brand_product(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Must be authenticated"
         )
 
-    matches = crud.get_deep_retailer_offers_for_brand_product(
-        db, global_filter, brand_product_id, user.client
+    matches = await db.run_sync(
+        __get_deep_retailer_product_matches,
+        global_filter,
+        brand_product_id,
+        user.client,
     )
     processed_matches = await __preprocess_retailer_product_deep_matches(matches)
     return {"matches": processed_matches}
@@ -161,23 +196,26 @@ async def get_all_retailer_offers_for_brand_product(
     brand_product_id: str,
     global_filter: PriceValuesFilter,
     user: TokenData = Depends(get_logged_in_user_data),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Must be authenticated"
         )
 
-    matches = crud.get_all_retailer_offers_for_brand_product(
-        db, global_filter, brand_product_id, user.client
-    )
-    processed_matches = add_user_currency_to_retailer_offers(
-        [AnyMatchingOfferScaffold(**d) for d in matches],
-        global_filter.currency,
-        db,
-        output_model_class=AnyMatchingOfferScaffold,
+    matches = await db.run_sync(
+        crud.get_all_retailer_offers_for_brand_product,
+        global_filter,
+        brand_product_id,
+        user.client,
     )
-    return {"matches": processed_matches}
+    if global_filter.currency:
+        matches = await db.run_sync(
+            lambda session: add_user_currency_to_retailer_offers(
+                matches, global_filter.currency, session
+            )
+        )
+    return {"matches": matches}
 
 
 @router.post(
@@ -204,11 +242,12 @@ def get_historical_msrp_deviation_per_retailer_for_product(
 @router.post(
     "/{brand_product_id}/prices",
     tags=[TAG_DATA],
-    response_model=HistoricalPerRetailerResponse,
+    response_model=HistoricalPerRetailerInLayoutResponse,
 )
 def get_historical_prices_for_brand_product(
     brand_product_id: str,
     global_filter: PriceValuesFilter,
+    layout: HistoryLayout = Query(default="points"),
     user: TokenData = Depends(get_logged_in_user_data),
     db: Session = Depends(get_db),
 ):
@@ -221,34 +260,57 @@ def get_historical_prices_for_brand_product(
         db, global_filter, brand_product_id, user.client
     )
 
-    retailers = [
-        v
-        for v in reduce(
-            create_append_to_history_reducer(
-                lambda history_item: f"{history_item.product.retailer.name} - {history_item.product.retailer.country}",
-                lambda history_item: history_item.time_as_date,
-                lambda history_item: history_item.price_standard,
+    response_model = (
+        HistoricalPerRetailerColumnsResponse
+        if layout == "columns"
+        else HistoricalPerRetailerResponse
+    )
+    if not history:
+        return TrustedJSONResponse(
+            to_trusted_dict(
+                {"x": [], "retailers": [], "max_value": 0, "minimal_values": []},
+                response_model,
+            )
+        )
+
+    if layout == "columns":
+        # Straight from the history, without building the points of the other layout
+        retailer_keys = [
+            f"{i.product.retailer.name} - {i.product.retailer.country}" for i in history
+        ]
+        times = [i.time_as_date for i in history]
+        values = [i.price_standard for i in history]
+        content = {
+            **create_history_columns(
+                retailer_keys, times, values, force_two_points=False
             ),
-            history,
-            {},
-        ).values()
-    ]
-    if not retailers:
-        return {"retailers": [], "max_value": 0, "minimal_values": []}
-
-    minimal_values = extract_minimal_values(retailers)
-
-    max_value = (
-        max([i.price_standard for i in history if i.price_standard is not None])
-        if history
-        else 0
+            "minimal_values": extract_minimal_values_from_history(
+                retailer_keys, times, values
+            ),
+        }
+    else:
+        retailers = [
+            v
+            for v in reduce(
+                create_append_to_history_reducer(
+                    lambda history_item: f"{history_item.product.retailer.name} - {history_item.product.retailer.country}",
+                    lambda history_item: history_item.time_as_date,
+                    lambda history_item: history_item.price_standard,
+                ),
+                history,
+                {},
+            ).values()
+        ]
+        content = {
+            "retailers": retailers,
+            "minimal_values": extract_minimal_values(retailers),
+        }
+
+    content["max_value"] = max(
+        [i.price_standard for i in history if i.price_standard is not None]
     )
 
-    return {
-        "retailers": retailers,
-        "max_value": max_value,
-        "minimal_values": minimal_values,
-    }
+    return TrustedJSONResponse(to_trusted_dict(content, response_model))
 
 
 @router.post(
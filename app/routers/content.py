@@ -14,12 +14,16 @@ from app.schemas.prices import HistoricalPerRetailerResponse
 from app.schemas.scores import ContentScorePerRetailer
 from app.schemas.scores import HistoricalScore
 from app.security import get_logged_in_user_data
+from app.service.cache import cached_response
 from app.tags import TAG_CONTENT
 
 router = APIRouter(prefix="/content")
 
 
 @router.post("/score/image", tags=[TAG_CONTENT], response_model=HistoricalScore)
+@cached_response(
+    "content/score/image", depends_on=["retailer_product_per_week_matview"]
+)
 def get_image_score(
     global_filter: GlobalFilter,
     user: TokenData = Depends(get_logged_in_user_data),
@@ -34,6 +38,7 @@ def get_image_score(
 
 
 @router.post("/score/text", tags=[TAG_CONTENT], response_model=HistoricalScore)
+@cached_response("content/score/text", depends_on=["retailer_product_per_week_matview"])
 def get_text_score(
     global_filter: GlobalFilter,
     user: TokenData = Depends(get_logged_in_user_data),
@@ -48,6 +53,7 @@ def get_text_score(
 
 
 @router.post("/score", tags=[TAG_CONTENT], response_model=HistoricalScore)
+@cached_response("content/score", depends_on=["retailer_product_per_week_matview"])
 def get_content_score(
     global_filter: GlobalFilter,
     user: TokenData = Depends(get_logged_in_user_data),
@@ -66,6 +72,9 @@ def get_content_score(
     tags=[TAG_CONTENT],
     response_model=HistoricalPerRetailerResponse,
 )
+@cached_response(
+    "content/score/image/per_retailer", depends_on=["retailer_product_per_week_matview"]
+)
 def get_image_score_per_retailer(
     global_filter: GlobalFilter,
     user: TokenData = Depends(get_logged_in_user_data),
@@ -82,6 +91,9 @@ def get_image_score_per_retailer(
     tags=[TAG_CONTENT],
     response_model=HistoricalPerRetailerResponse,
 )
+@cached_response(
+    "content/score/text/per_retailer", depends_on=["retailer_product_per_week_matview"]
+)
 def get_text_score_per_retailer(
     global_filter: GlobalFilter,
     user: TokenData = Depends(get_logged_in_user_data),
@@ -98,6 +110,9 @@ def get_text_score_per_retailer(
     tags=[TAG_CONTENT],
     response_model=ContentScorePerRetailer,
 )
+@cached_response(
+    "content/per_retailer", depends_on=["retailer_product_per_week_matview"]
+)
 def get_content_score_per_retailer(
     global_filter: GlobalFilter,
     user: TokenData = Depends(get_logged_in_user_data),
@@ -0,0 +1,86 @@
+from fastapi import APIRouter, Depends, HTTPException
+
+from app.database import get_pools_status
+from app.schemas.auth import TokenData
+from app.schemas.diagnostics import (
+    DatabasePoolsStatus,
+    MatviewsStatus,
+    MatviewsRefreshedNotification,
+    ScreenshotsStatus,
+)
+from app.security import get_logged_in_user_data
+from app.service.matviews import matview_refresh_tracker
+from app.service.screenshot import screenshot_index
+from app.tags import TAG_DIAGNOSTICS
+
+router = APIRouter(prefix="/diagnostics")
+
+
+def __check_developer_role(user: TokenData):
+    if "developer" not in user.roles:
+        raise HTTPException(
+            status_code=403,
+            detail="You do not have permission to access this resource",
+        )
+
+
+@router.get("/pool", tags=[TAG_DIAGNOSTICS], response_model=DatabasePoolsStatus)
+async def get_database_pool_status(
+    user: TokenData = Depends(get_logged_in_user_data),
+):
+    """
+    Runs on the event loop, which the async pool needs when its queue is created.
+    """
+    __check_developer_role(user)
+
+    return get_pools_status()
+
+
+@router.get("/matviews", tags=[TAG_DIAGNOSTICS], response_model=MatviewsStatus)
+def get_matviews_status(
+    user: TokenData = Depends(get_logged_in_user_data),
+):
+    __check_developer_role(user)
+
+    return {
+        "last_polled_at": matview_refresh_tracker.last_polled_at,
+        "matviews": matview_refresh_tracker.status(),
+    }
+
+
+@router.post(
+    "/matviews/refreshed", tags=[TAG_DIAGNOSTICS], response_model=MatviewsStatus
+)
+def notify_matviews_refreshed(
+    notification: MatviewsRefreshedNotification,
+    user: TokenData = Depends(get_logged_in_user_data),
+):
+    """
+    To be called by the job refreshing the materialized views, so that the cached responses are invalidated right
+    away instead of at the next poll.
+    """
+    __check_developer_role(user)
+
+    unknown_matviews = set(notification.matviews) - set(
+        matview_refresh_tracker.matviews
+    )
+    if unknown_matviews:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown materialized views: {', '.join(sorted(unknown_matviews))}",
+        )
+
+    matview_refresh_tracker.mark_refreshed(notification.matviews)
+    return {
+        "last_polled_at": matview_refresh_tracker.last_polled_at,
+        "matviews": matview_refresh_tracker.status(),
+    }
+
+
+@router.get("/screenshots", tags=[TAG_DIAGNOSTICS], response_model=ScreenshotsStatus)
+def get_screenshots_status(
+    user: TokenData = Depends(get_logged_in_user_data),
+):
+    __check_developer_role(user)
+
+    return screenshot_index.stats()
@@ -1,36 +1,52 @@
-from typing import Optional
+from typing import AsyncIterator, Dict, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from requests import Session
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app import crud
-from app.database import get_db
+from app.crud.utils import get_currency_exchange_rates
+from app.database import get_async_db
 from app.schemas.auth import AuthMetadata
-from app.schemas.external_v2 import ExternalRetailerOffersPage, ExternalRetailerOffersPagev21
-from app.schemas.filters import PagedGlobalFilter
+from app.schemas.external_v2 import (
+    ExternalRetailerOffersPage,
+    ExternalRetailerOffersPagev21,
+    ExternalRetailerOffersCursorPage,
+)
+from app.schemas.filters import PagedRetailerOffersFilter
+from app.schemas.product import (
+    MockRetailerProductGridItem,
+    MockRetailerProductGridItemV21,
+)
 from app.security import get_auth_data
 from app.tags import TAG_EXTERNAL, TAG_DATA
-from app.service.currency import add_user_currency_to_retailer_offers
+from app.service.cache import response_cache, is_not_modified, not_modified_response
+from app.service.currency import (
+    add_user_currency_to_retailer_offers,
+    add_user_currency_to_retailer_offer_rows,
+)
+from app.service.export import (
+    BulkExportFormat,
+    create_export_response,
+    stream_statement_rows,
+)
 
 router = APIRouter()
 
+EXTERNAL_PAGE_SIZE = 500
 
-@router.get(
-    "/v2/products/retailer_offers",
-    tags=[TAG_DATA, TAG_EXTERNAL],
-    response_model=ExternalRetailerOffersPage,
-)
-async def get_retailer_offers_no_filters(
-    page: Optional[int] = 0,
-    user: AuthMetadata = Depends(get_auth_data),
-    db: Session = Depends(get_db),
-    user_currency_fromv21: Optional[str] = None,
-):
-    page_size = 500
-    page_global_filter = PagedGlobalFilter(
+
+def __create_external_retailer_offers_filter(**pagination) -> PagedRetailerOffersFilter:
+    return PagedRetailerOffersFilter(
         **{
-            "page_number": page + 1,
-            "page_size": page_size,
+            "page_size": EXTERNAL_PAGE_SIZE,
             "data_grid_filter": {
                 "items": [
                     {"column": "available_at_retailer", "operator": "is", "value": True}
@@ -42,22 +58,86 @@ async def get_retailer_offers_no_filters(
             "retailers": [],
             "categories": [],
             "groups": [],
+            **pagination,
         }
     )
-    products = crud.get_retailer_offers(
+
+
+async def __validate_user_currency(db: AsyncSession, user_currency: Optional[str]):
+    # Get the currencies that we support
+    valid_currencies = await db.run_sync(crud.get_currencies)
+    # Check if user_currency is provided and valid
+    if user_currency and user_currency not in valid_currencies:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid currency: '{user_currency}'. Valid currencies in >=2.1 are: {', '.join(valid_currencies)}"
+        )
+
+
+async def __get_retailer_offers_etag(
+    db: AsyncSession,
+    brand_id: str,
+    namespace: str,
+    pagination: Dict,
+    user_currency: Optional[str],
+) -> Optional[str]:
+    arguments = {**pagination, "user_currency": user_currency}
+    if user_currency:
+        # The converted prices also depend on the exchange rates, which are cached for an hour
+        arguments["exchange_rates"] = await db.run_sync(
+            lambda session: get_currency_exchange_rates(session, user_currency)
+        )
+
+    return response_cache.build_etag(
+        namespace,
+        brand_id,
+        arguments,
+        ["retailer_product_including_unavailable_matview"],
+        # The offers are also read from the product groups, brand products, market prices and retailers tables
+        live=True,
+    )
+
+
+@router.get(
+    "/v2/products/retailer_offers",
+    tags=[TAG_DATA, TAG_EXTERNAL],
+    response_model=ExternalRetailerOffersPage,
+)
+async def get_retailer_offers_no_filters(
+    request: Request,
+    response: Response,
+    page: Optional[int] = 0,
+    user: AuthMetadata = Depends(get_auth_data),
+    db: AsyncSession = Depends(get_async_db),
+    user_currency_fromv21: Optional[str] = None,
+):
+    etag = await __get_retailer_offers_etag(
         db,
         user.client,
+        "v2/products/retailer_offers",
+        {"page": page},
+        user_currency_fromv21,
+    )
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+    if etag is not None:
+        response.headers["ETag"] = etag
+
+    page_global_filter = __create_external_retailer_offers_filter(page_number=page + 1)
+    products, total_count = await db.run_sync(
+        crud.get_retailer_offers_with_total_count,
+        user.client,
         page_global_filter,
     )
     if user_currency_fromv21 :
-        products = add_user_currency_to_retailer_offers(
-            products,
-            user_currency_fromv21,
-            db
+        products = await db.run_sync(
+            lambda session: add_user_currency_to_retailer_offers(
+                products,
+                user_currency_fromv21,
+                session
+            )
         )
-    total_number_of_pages = (
-        crud.count_retailer_offers(db, user.client, page_global_filter) // page_size + 1
-    )
+    total_number_of_pages = total_count // EXTERNAL_PAGE_SIZE + 1
 
     return {
         "rows": products,
@@ -73,18 +153,123 @@ async def get_retailer_offers_no_filters(
     response_model=ExternalRetailerOffersPagev21,
 )
 async def get_retailer_offers_no_filters_v2_1(
+    request: Request,
+    response: Response,
     page: Optional[int] = 0,
     user: AuthMetadata = Depends(get_auth_data),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user_currency: Optional[str] = None,
 ):
-    # Get the currencies that we support
-    valid_currencies = crud.get_currencies(db)
-    # Check if user_currency is provided and valid
-    if user_currency and user_currency not in valid_currencies:
+    await __validate_user_currency(db, user_currency)
+    # Reuse the same logic as v2
+    return await get_retailer_offers_no_filters(
+        request, response, page, user, db, user_currency
+    )
+
+
+@router.get(
+    "/v2.2/products/retailer_offers",
+    tags=[TAG_DATA, TAG_EXTERNAL],
+    response_model=ExternalRetailerOffersCursorPage,
+)
+async def get_retailer_offers_no_filters_v2_2(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    user: AuthMetadata = Depends(get_auth_data),
+    db: AsyncSession = Depends(get_async_db),
+    user_currency: Optional[str] = None,
+):
+    """
+    Same offers as the previous versions, but paginated with a cursor: each page costs the same regardless of how
+    far into the list it is, and offers are neither skipped nor repeated when the data is refreshed while paging.
+    Start without a cursor and keep passing the returned `next_cursor` until it is null.
+    """
+    try:
+        page_global_filter = __create_external_retailer_offers_filter(
+            page_number=1,
+            cursor=cursor,
+            # The id is unique and stable, which makes it the cheapest key to paginate on
+            sorting={"column": "id", "direction": "asc"},
+        )
+    except ValueError:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Invalid currency: '{user_currency}'. Valid currencies in >=2.1 are: {', '.join(valid_currencies)}"
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
         )
-    # Reuse the same logic as v2
-    return await get_retailer_offers_no_filters(page, user, db, user_currency)
+    await __validate_user_currency(db, user_currency)
+
+    etag = await __get_retailer_offers_etag(
+        db,
+        user.client,
+        "v2.2/products/retailer_offers",
+        {"cursor": cursor},
+        user_currency,
+    )
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+    if etag is not None:
+        response.headers["ETag"] = etag
+
+    products = await db.run_sync(
+        crud.get_retailer_offers,
+        user.client,
+        page_global_filter,
+    )
+    next_cursor = crud.get_next_retailer_offers_cursor(products, page_global_filter)
+    if user_currency:
+        products = await db.run_sync(
+            lambda session: add_user_currency_to_retailer_offers(
+                products, user_currency, session
+            )
+        )
+
+    return {
+        "rows": products,
+        "count": len(products),
+        "next_cursor": next_cursor,
+    }
+
+
+@router.get("/v2.2/products/retailer_offers/export", tags=[TAG_DATA, TAG_EXTERNAL])
+async def export_retailer_offers_v2_2(
+    export_format: BulkExportFormat = Query(default="ndjson", alias="format"),
+    gzip: bool = False,
+    user: AuthMetadata = Depends(get_auth_data),
+    db: AsyncSession = Depends(get_async_db),
+    user_currency: Optional[str] = None,
+):
+    """
+    All the offers returned by `/v2.2/products/retailer_offers`, in a single file streamed while it is being read
+    from the database. This is much faster than going through the pages when all the offers are needed.
+
+    The offers are sorted by id. NDJSON files contain one JSON object per line, Parquet files one row group per 1000
+    offers. Use `gzip` to get the file compressed.
+    """
+    await __validate_user_currency(db, user_currency)
+
+    statement, params = crud.get_retailer_offers_export_statement(
+        user.client, __create_external_retailer_offers_filter(page_number=1)
+    )
+    model = MockRetailerProductGridItem
+    currencies = None
+    if user_currency:
+        model = MockRetailerProductGridItemV21
+        currencies = await db.run_sync(get_currency_exchange_rates, user_currency)
+    # Screenshots are not part of the external API
+    columns = [c for c in model.get_export_columns() if c != "screenshot_url"]
+
+    async def convert_prices(batches: AsyncIterator[List[Dict]]):
+        async for rows in batches:
+            yield add_user_currency_to_retailer_offer_rows(
+                rows, user_currency, currencies
+            )
+
+    batches = stream_statement_rows(statement, params)
+    return create_export_response(
+        columns,
+        convert_prices(batches) if currencies is not None else batches,
+        export_format,
+        "retailer_offers",
+        compress=gzip,
+        model=model,
+    )
@@ -13,6 +13,7 @@ from app.schemas.groups import (
     BaseBrandProductGroupScaffold,
 )
 from app.security import get_logged_in_user_data
+from app.service.cache import response_cache
 from app.tags import TAG_GROUPS
 
 router = APIRouter(prefix="/groups")
@@ -46,6 +47,7 @@ def create_group(
 
     # Create the group
     crud.create_brand_product_group(db, group, user)
+    response_cache.invalidate_groups(user.client)
 
     # Return the group
     return {"message": "Group created successfully."}
@@ -61,6 +63,7 @@ def add_products_to_group(
 
     # Add the products to the group
     crud.add_products_to_group(db, group)
+    response_cache.invalidate_groups(user.client)
 
     # Return the group
     return {"message": "Products added to group successfully."}
@@ -73,5 +76,6 @@ def delete_group(
     db: Session = Depends(get_db),
 ):
     crud.delete_brand_products_group(db, group_id, user.client)
+    response_cache.invalidate_groups(user.client)
 
     return {"message": "Group deleted successfully."}
@@ -0,0 +1,34 @@
+import hmac
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from app.config.settings import get_settings
+from app.service.metrics import CONTENT_TYPE, render_metrics
+from app.tags import TAG_DIAGNOSTICS
+
+router = APIRouter()
+
+
+@router.get("/metrics", tags=[TAG_DIAGNOSTICS], response_class=PlainTextResponse)
+async def get_metrics(authorization: Optional[str] = Header(None)):
+    """
+    Metrics of this instance, to be scraped by Prometheus. Every instance has its own metrics: they are meant to be
+    aggregated by Prometheus.
+
+    Runs on the event loop, which the async pool needs when its queue is created.
+    """
+    settings = get_settings()
+    if settings.metrics_token is None:
+        # The metrics expose the routes, the state of the pools and of the caches: only public on a local instance
+        if settings.panprices_environment != "local":
+            raise HTTPException(
+                status_code=403, detail="No metrics token is configured"
+            )
+    elif not hmac.compare_digest(
+        (authorization or "").encode(), f"Bearer {settings.metrics_token}".encode()
+    ):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+
+    return PlainTextResponse(render_metrics(), media_type=CONTENT_TYPE)
@@ -23,6 +23,7 @@ from app.schemas.general import (
     CurrencyResponse,
 )
 from app.security import get_logged_in_user_data
+from app.service.cache import cached_response
 from app.tags import TAG_OVERVIEW, TAG_FILTERING
 
 router = APIRouter(prefix="")
@@ -151,6 +152,11 @@ async def switch_brand(
 
 
 @router.post("/stats", tags=[TAG_OVERVIEW], response_model=OverviewStatsResponse)
+@cached_response(
+    "overview/stats",
+    depends_on=["retailer_product_including_unavailable_matview"],
+    live=True,
+)
 def get_overview_stats(
     filters: GlobalFilter,
     user: TokenData = Depends(get_logged_in_user_data),
@@ -2,10 +2,10 @@ from functools import reduce
 from typing import Dict, List
 
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app import crud
-from app.database import get_db
+from app.database import get_async_db
 from app.schemas.auth import TokenData
 from app.schemas.filters import GlobalFilter
 from app.schemas.performance import (
@@ -18,16 +18,18 @@ from app.schemas.performance import (
     HistoricalBrandShareHomepage,
 )
 from app.security import get_logged_in_user_data
+from app.service.cache import cached_response
 from app.tags import TAG_PERFORMANCE, TAG_DATA
 
 router = APIRouter(prefix="/performance")
 
 
 @router.post("", tags=[TAG_PERFORMANCE], response_model=RetailerPerformance)
+@cached_response("performance", ordered_filters=True, live=True)
 async def get_category_performance(
     global_filter: GlobalFilter,
     user: TokenData = Depends(get_logged_in_user_data),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     if len(global_filter.retailers) == 0:
         return {"categories": []}
@@ -57,7 +59,9 @@ async def get_category_performance(
         result[element["category_name"]]["total_products"] += element["product_count"]
         return result
 
-    category_split = crud.get_categories_split(db, user.client, global_filter)
+    category_split = await db.run_sync(
+        crud.get_categories_split, user.client, global_filter
+    )
 
     result_as_dict = reduce(append_result, category_split, {})
     return {"categories": [{"category_id": k, **v} for k, v in result_as_dict.items()]}
@@ -71,10 +75,10 @@ async def get_category_performance(
 async def get_performance_for_categories(
     categories: List[str],
     user: TokenData = Depends(get_logged_in_user_data),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    categories_performance_details = crud.get_individual_category_performance_details(
-        db, categories
+    categories_performance_details = await db.run_sync(
+        crud.get_individual_category_performance_details, categories
     )
 
     return {
@@ -91,15 +95,23 @@ async def get_performance_for_categories(
     tags=[TAG_PERFORMANCE],
     response_model=RetailerCategoryPerformanceTopN,
 )
+@cached_response(
+    "performance/top_n",
+    depends_on=["rp_brand_fixed_matview"],
+    ordered_filters=True,
+    live=True,
+)
 async def get_category_top_n(
     global_filter: GlobalFilter,
     user: TokenData = Depends(get_logged_in_user_data),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     if len(global_filter.retailers) == 0:
         return {"categories": []}
 
-    top_n_raw = crud.get_top_n_performance(db, user.client, global_filter)
+    top_n_raw = await db.run_sync(
+        crud.get_top_n_performance, user.client, global_filter
+    )
 
     return {
         "categories": [
@@ -136,14 +148,20 @@ async def get_category_top_n(
     tags=[TAG_PERFORMANCE],
     response_model=HistoricalPerformanceTopN,
 )
+@cached_response(
+    "performance/top_n/history", depends_on=["rp_brand_fixed_matview"], live=True
+)
 async def get_historical_category_top_n(
     global_filter: GlobalFilter,
     retailer_category_id: str,
     user: TokenData = Depends(get_logged_in_user_data),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    top_n_raw = crud.get_historical_top_n_performance(
-        db, retailer_category_id, user.client, global_filter
+    top_n_raw = await db.run_sync(
+        crud.get_historical_top_n_performance,
+        retailer_category_id,
+        user.client,
+        global_filter,
     )
 
     history = [
@@ -179,15 +197,18 @@ async def get_historical_category_top_n(
     tags=[TAG_PERFORMANCE],
     response_model=RetailerCategoryPerformanceBrandShareHomepage,
 )
+@cached_response("performance/homepage", ordered_filters=True, live=True)
 async def get_brand_share_homepage(
     global_filter: GlobalFilter,
     user: TokenData = Depends(get_logged_in_user_data),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     if len(global_filter.retailers) == 0:
         return {"urls": []}
 
-    homepage_urls = crud.get_retailer_homepage_urls(db, user.client, global_filter)
+    homepage_urls = await db.run_sync(
+        crud.get_retailer_homepage_urls, user.client, global_filter
+    )
 
     return {"urls": homepage_urls}
 
@@ -197,14 +218,17 @@ async def get_brand_share_homepage(
     tags=[TAG_PERFORMANCE],
     response_model=HistoricalBrandShareHomepage,
 )
+@cached_response("performance/homepage/history", ordered_filters=True, live=True)
 async def get_historical_brand_share_homepage(
     global_filter: GlobalFilter,
     user: TokenData = Depends(get_logged_in_user_data),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     if len(global_filter.retailers) == 0:
         return {"data": []}
 
-    result = crud.get_historical_homepage_visibility(db, user.client, global_filter)
+    result = await db.run_sync(
+        crud.get_historical_homepage_visibility, user.client, global_filter
+    )
 
     return {"data": result}
@@ -1,9 +1,10 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from requests import Session
 
 from app import crud
 from app.crud.utils import (
     process_historical_value_per_retailer,
+    process_historical_value_per_retailer_in_columns,
     duplicate_unique_points,
 )
 from app.database import get_db
@@ -12,11 +13,16 @@ from app.schemas.filters import GlobalFilter, PagedPriceValuesFilter, PriceValue
 from app.schemas.prices import (
     PriceTableData,
     HistoricalPerRetailerResponse,
+    HistoricalPerRetailerColumnsResponse,
+    HistoricalPerRetailerInLayoutResponse,
+    HistoryLayout,
     PriceChangeResponse,
     RetailerPricingOverviewResponse,
     ComparisonProductsResponse,
 )
 from app.security import get_logged_in_user_data
+from app.service.cache import cached_response
+from app.service.serialization import to_trusted_dict
 from app.tags import TAG_DATA, TAG_PRICE
 
 router = APIRouter(prefix="/price")
@@ -28,77 +34,121 @@ def get_price_table_data(
     user: TokenData = Depends(get_logged_in_user_data),
     db: Session = Depends(get_db),
 ):
-    result = crud.get_price_table_data(db, global_filter, user.client)
+    result, total_count = crud.get_price_table_data_with_total_count(
+        db, global_filter, user.client
+    )
 
     return {
         "rows": result,
         "count": len(result),
         "offset": global_filter.get_products_offset(),
-        "total_count": crud.count_price_table_data(db, global_filter, user.client),
+        "total_count": total_count,
+        "total_count_is_estimated": global_filter.estimate_total_count,
     }
 
 
 @router.post(
     "/msrp",
     tags=[TAG_PRICE],
-    response_model=HistoricalPerRetailerResponse,
+    response_model=HistoricalPerRetailerInLayoutResponse,
 )
+@cached_response("price/msrp", depends_on=["msrp_deviation_matview"], trusted=True)
 def get_historical_msrp_deviation_per_retailer(
     global_filter: GlobalFilter,
+    layout: HistoryLayout = Query(default="points"),
     user: TokenData = Depends(get_logged_in_user_data),
     db: Session = Depends(get_db),
 ):
     history = crud.get_historical_msrp_deviation_per_retailer(
         db, global_filter, user.client
     )
+    if layout == "columns":
+        return to_trusted_dict(
+            process_historical_value_per_retailer_in_columns(
+                history, "average_price_deviation"
+            ),
+            HistoricalPerRetailerColumnsResponse,
+        )
+
     grouped_history = process_historical_value_per_retailer(
         history, "average_price_deviation", False
     )
 
-    return duplicate_unique_points(grouped_history)
+    return to_trusted_dict(
+        duplicate_unique_points(grouped_history), HistoricalPerRetailerResponse
+    )
 
 
 @router.post(
     "/wholesale",
     tags=[TAG_PRICE],
-    response_model=HistoricalPerRetailerResponse,
+    response_model=HistoricalPerRetailerInLayoutResponse,
+)
+@cached_response(
+    "price/wholesale", depends_on=["wholesale_deviation_matview"], trusted=True
 )
 def get_historical_wholesale_deviation_per_retailer(
     global_filter: GlobalFilter,
+    layout: HistoryLayout = Query(default="points"),
     user: TokenData = Depends(get_logged_in_user_data),
     db: Session = Depends(get_db),
 ):
     history = crud.get_historical_wholesale_deviation_per_retailer(
         db, global_filter, user.client
     )
+    if layout == "columns":
+        return to_trusted_dict(
+            process_historical_value_per_retailer_in_columns(
+                history, "average_price_deviation"
+            ),
+            HistoricalPerRetailerColumnsResponse,
+        )
 
     grouped_history = process_historical_value_per_retailer(
         history, "average_price_deviation", False
     )
-    return duplicate_unique_points(grouped_history)
+    return to_trusted_dict(
+        duplicate_unique_points(grouped_history), HistoricalPerRetailerResponse
+    )
 
 
 @router.post(
     "/average_price_deviation",
     tags=[TAG_PRICE],
-    response_model=HistoricalPerRetailerResponse,
+    response_model=HistoricalPerRetailerInLayoutResponse,
+)
+@cached_response(
+    "price/average_price_deviation",
+    depends_on=["average_price_deviation_matview"],
+    trusted=True,
 )
 def get_historical_average_price_deviation_per_retailer(
     global_filter: GlobalFilter,
+    layout: HistoryLayout = Query(default="points"),
     user: TokenData = Depends(get_logged_in_user_data),
     db: Session = Depends(get_db),
 ):
     history = crud.get_historical_average_price_deviation_per_retailer(
         db, global_filter, user.client
     )
+    if layout == "columns":
+        return to_trusted_dict(
+            process_historical_value_per_retailer_in_columns(
+                history, "average_price_deviation"
+            ),
+            HistoricalPerRetailerColumnsResponse,
+        )
 
     grouped_history = process_historical_value_per_retailer(
         history, "average_price_deviation", False
     )
-    return duplicate_unique_points(grouped_history)
+    return to_trusted_dict(
+        duplicate_unique_points(grouped_history), HistoricalPerRetailerResponse
+    )
 
 
 @router.post("/changes", tags=[TAG_PRICE], response_model=PriceChangeResponse)
+@cached_response("price/changes", depends_on=["price_changes_matview"])
 def get_price_changes(
     global_filter: GlobalFilter,
     sign: int,
@@ -117,6 +167,11 @@ def get_price_changes(
     tags=[TAG_PRICE],
     response_model=RetailerPricingOverviewResponse,
 )
+@cached_response(
+    "price/retailer_overview",
+    depends_on=["retailer_pricing_overview_matview"],
+    live=True,
+)
 def get_retailer_pricing_overview(
     global_filter: GlobalFilter,
     user: TokenData = Depends(get_logged_in_user_data),
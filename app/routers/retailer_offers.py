@@ -1,18 +1,17 @@
-from typing import Optional
+from typing import AsyncIterator, Dict, List, Optional
 
-import pandas
-
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
 from structlog import get_logger
 
 from app import crud
-from app.crud.utils import export_dataframe_to_xlsx, export_rows_to_xlsx
-from app.database import get_db
+from app.crud.utils import get_currency_exchange_rates
+from app.database import get_async_db
 from app.schemas.auth import TokenData, AuthMetadata
 from app.schemas.filters import (
     PagedGlobalFilter,
     PagedPriceValuesFilter,
+    PagedRetailerOffersFilter,
     PriceValuesFilter,
 )
 from app.schemas.product import (
@@ -21,8 +20,17 @@ from app.schemas.product import (
     MockRetailerProductGridItem,
 )
 from app.security import get_logged_in_user_data, get_auth_data
-from app.service.currency import add_user_currency_to_retailer_offers
-from app.service.screenshot import add_screenshots_to_retailer_offers
+from app.service.currency import (
+    add_user_currency_to_retailer_offers,
+    add_user_currency_to_retailer_offer_rows,
+)
+from app.service.export import (
+    ExportFormat,
+    create_export_response,
+    stream_statement_rows,
+)
+from app.service.screenshot import retrieve_screenshot_urls
+from app.service.serialization import TrustedJSONResponse, to_trusted_rows
 from app.tags import TAG_DATA, TAG_EXTERNAL
 
 router = APIRouter(prefix="/products/retailers")
@@ -31,49 +39,75 @@ logger = get_logger()
 
 @router.post("", tags=[TAG_DATA], response_model=RetailerOffersPage)
 async def get_retailer_offers(
-    page_global_filter: PagedPriceValuesFilter,
+    page_global_filter: PagedRetailerOffersFilter,
     user: TokenData = Depends(get_logged_in_user_data),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    products = crud.get_retailer_offers(db, user.client, page_global_filter)
-    products_with_screenshots = await add_screenshots_to_retailer_offers(
-        products, output_model_class=MockRetailerProductGridItem
+    products, total_count = await db.run_sync(
+        crud.get_retailer_offers_with_total_count, user.client, page_global_filter
     )
-    if page_global_filter.currency :
-        products_with_screenshots = add_user_currency_to_retailer_offers(
-            products,
-            page_global_filter.currency,
-            db
+    # The rows come from the database, they are not validated again by the response model
+    rows = to_trusted_rows(products, MockRetailerProductGridItemV21)
+    screenshot_urls = await retrieve_screenshot_urls(
+        [p.url for p in products], [p.fetched_at for p in products]
+    )
+    for row, screenshot_url in zip(rows, screenshot_urls):
+        row["screenshot_url"] = screenshot_url
+    if page_global_filter.currency:
+        rows = await db.run_sync(
+            lambda session: add_user_currency_to_retailer_offers(
+                rows, page_global_filter.currency, session
+            )
         )
-    return {
-        "rows": products_with_screenshots,
-        "count": len(products),
-        "offset": page_global_filter.get_products_offset(),
-        "total_count": crud.count_retailer_offers(db, user.client, page_global_filter),
-    }
+    return TrustedJSONResponse(
+        {
+            "rows": rows,
+            "count": len(products),
+            "offset": page_global_filter.get_products_offset(),
+            "total_count": total_count,
+            "total_count_is_estimated": page_global_filter.is_total_count_estimated(),
+            "next_cursor": crud.get_next_retailer_offers_cursor(
+                products, page_global_filter
+            ),
+        }
+    )
 
 
 @router.post("/export", tags=[TAG_DATA])
 async def export_products_to_xlsx(
     global_filter: PagedPriceValuesFilter,
+    export_format: ExportFormat = Query(default="xlsx", alias="format"),
     user: TokenData = Depends(get_logged_in_user_data),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    products = crud.export_full_retailer_offers_result(
-        db,
-        user.client,
-        global_filter,
+    statement, params = crud.get_retailer_offers_export_statement(
+        user.client, global_filter
     )
-    products_with_screenshots = await add_screenshots_to_retailer_offers(
-        products, output_model_class=MockRetailerProductGridItem
-    )
-    if global_filter.currency :
-        products_with_screenshots = add_user_currency_to_retailer_offers(
-            products,
-            global_filter.currency,
-            db
+    columns = MockRetailerProductGridItem.get_export_columns()
+    currencies = None
+    if global_filter.currency:
+        columns = MockRetailerProductGridItemV21.get_export_columns()
+        currencies = await db.run_sync(
+            get_currency_exchange_rates, global_filter.currency
         )
-    products_df = pandas.DataFrame(
-        [p.dict_exclude_deprecated_fields() for p in products_with_screenshots]
+
+    async def prepare_rows(batches: AsyncIterator[List[Dict]]):
+        async for rows in batches:
+            screenshot_urls = await retrieve_screenshot_urls(
+                [r["url"] for r in rows], [r.get("fetched_at") for r in rows]
+            )
+            for row, screenshot_url in zip(rows, screenshot_urls):
+                row["screenshot_url"] = screenshot_url
+
+            if currencies is not None:
+                rows = add_user_currency_to_retailer_offer_rows(
+                    rows, global_filter.currency, currencies
+                )
+            yield rows
+
+    return create_export_response(
+        columns,
+        prepare_rows(stream_statement_rows(statement, params)),
+        export_format,
+        "retailer_offers",
     )
-    return export_dataframe_to_xlsx(products_df)
@@ -9,12 +9,14 @@ from app.schemas.auth import TokenData
 from app.schemas.filters import GlobalFilter
 from app.schemas.scores import HistoricalScore
 from app.security import get_logged_in_user_data
+from app.service.cache import cached_response
 from app.tags import TAG_OVERVIEW
 
 router = APIRouter(prefix="/stock")
 
 
 @router.post("", tags=[TAG_OVERVIEW], response_model=HistoricalScore)
+@cached_response("stock", live=True)
 def get_historical_in_stock(
     global_filter: GlobalFilter,
     user: TokenData = Depends(get_logged_in_user_data),
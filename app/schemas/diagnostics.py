@@ -0,0 +1,92 @@
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+
+class PoolStatus(BaseModel):
+    size: int = Field(description="The number of connections the pool keeps open")
+    max_overflow: int = Field(
+        description="How many connections can be opened on top of the pool size"
+    )
+    checked_in: int = Field(description="Idle connections available in the pool")
+    checked_out: int = Field(description="Connections currently in use")
+    overflow: int = Field(
+        description="Connections currently opened on top of the pool size. Negative while the pool is not full"
+    )
+    checkouts_count: int = Field(
+        description="How many times a connection was requested from the pool"
+    )
+    total_wait_seconds: float = Field(
+        description="Total time spent waiting for a connection"
+    )
+    average_wait_seconds: float = Field(
+        description="Average time spent waiting for a connection"
+    )
+    max_wait_seconds: float = Field(
+        description="Longest time spent waiting for a connection"
+    )
+
+
+class DatabasePoolsStatus(BaseModel):
+    """
+    The state of the connection pools of the current instance. Values are per process, not aggregated over all the
+    running instances.
+    """
+
+    sync_pool: PoolStatus = Field(description="The pool used by the sync endpoints")
+    async_pool: PoolStatus = Field(description="The pool used by the async endpoints")
+
+
+class MatviewStatus(BaseModel):
+    name: str
+    generation: int = Field(
+        description="Incremented every time the view is refreshed. Shared by all the instances using the same cache"
+    )
+    last_refreshed_at: Optional[datetime] = Field(
+        description="When this instance last noticed a refresh of the view"
+    )
+
+
+class MatviewsStatus(BaseModel):
+    last_polled_at: Optional[datetime] = Field(
+        description="When this instance last checked the state of the views"
+    )
+    matviews: List[MatviewStatus]
+
+
+class MatviewsRefreshedNotification(BaseModel):
+    matviews: List[str] = Field(
+        description="The materialized views that have just been refreshed",
+        example=["msrp_deviation_matview"],
+    )
+
+
+class LatencyStatus(BaseModel):
+    count: int
+    total_seconds: float
+    average_seconds: float
+    max_seconds: float
+
+
+class ScreenshotsStatus(BaseModel):
+    """
+    The state of the screenshot index of the current instance, see app/service/screenshot.py
+    """
+
+    manifest_size: Optional[int] = Field(
+        description="The number of screenshots in the bucket manifest, null if it has not been listed yet"
+    )
+    manifest_listed_at: Optional[datetime]
+    cached_entries: int = Field(
+        description="The number of screenshots checked with HEAD requests that are still cached"
+    )
+    manifest_lookups: int = Field(
+        description="How many screenshots were resolved from the manifest"
+    )
+    cache_hits: int
+    misses: int = Field(description="How many screenshots had to be checked with HEAD")
+    lookup_latency: LatencyStatus = Field(
+        description="Time to resolve the screenshots of a list of products"
+    )
+    head_request_latency: LatencyStatus
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 
 from pydantic import BaseModel, Field
 
@@ -33,3 +33,17 @@ class ExternalRetailerOffersPagev21(ExternalPagedResponse):
     rows: List[MockRetailerProductGridItemV21] = Field(
         description="The list of retailer offers",
     )
+
+
+class ExternalRetailerOffersCursorPage(BaseModel):
+    """
+    Holds the data for a page of products as showed on the retailer offers table, paginated with a cursor.
+    """
+
+    count: int
+    next_cursor: Optional[str] = Field(
+        description="Pass it as `cursor` to get the next page, null if this is the last page",
+    )
+    rows: List[MockRetailerProductGridItemV21] = Field(
+        description="The list of retailer offers",
+    )
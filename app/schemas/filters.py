@@ -1,10 +1,17 @@
+import base64
+import enum
+import json
+import re
 from datetime import datetime
-from typing import List, Optional, Literal, Union
+from typing import Any, List, Optional, Literal, Union
 
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, validator, root_validator
 
 from app.config.constants import DATE_FORMAT
 
+# Values of the equality operators that are dates rather than e.g. the value of a select column
+DATE_VALUE_REGEX = re.compile(r"^\d{4}-\d{2}-\d{2}")
+
 
 class GlobalFilter(BaseModel):
     """
@@ -100,9 +107,32 @@ class DataGridFilterItem(BaseModel):
             return tuple(self.value) if self.value else ()
         elif self.operator in ["contains", "startsWith", "endsWith"]:
             return self.value.lower() if self.value else ""
+        elif isinstance(self.value, str):
+            # The data grid sends every value as a string. psycopg2 inlines them as literals and lets Postgres cast
+            # them to the column type, but asyncpg sends typed parameters, so we need to provide the right type.
+            return self._parse_typed_value(self.value)
 
         return self.value if self.value else ""
 
+    def _parse_typed_value(self, value: str):
+        if self.operator == "is" and value.lower() in ["true", "false"]:
+            return value.lower() == "true"
+        elif self.operator in ["after", "before", "onOrAfter", "onOrBefore"] or (
+            self.operator in ["is", "not"] and DATE_VALUE_REGEX.match(value)
+        ):
+            try:
+                return datetime.fromisoformat(value)
+            except ValueError:
+                return value
+        elif self.operator in [">", "<", "<=", ">=", "=", "!="]:
+            for number_type in (int, float):
+                try:
+                    return number_type(value)
+                except ValueError:
+                    pass
+
+        return value
+
     @staticmethod
     def get_no_value_operators() -> List[str]:
         return ["isEmpty", "isNotEmpty"]
@@ -116,9 +146,74 @@ class DataGridFilters(BaseModel):
     operator: Literal["or", "and"]
 
 
+# Sorting columns end up in the SQL statements, so they must be plain identifiers
+SORTING_COLUMN_REGEX = "^[a-z_][a-z0-9_]*$"
+
+
 class DataGridSorting(BaseModel):
-    column: str
+    column: str = Field(regex=SORTING_COLUMN_REGEX)
+    direction: Literal["asc", "desc"]
+
+
+class KeysetCursor(BaseModel):
+    """
+    Points to the last row of a page, in a list sorted by a column and then by id.
+
+    The next page is made of the rows that come after this one in the same order, which, unlike an offset, does not
+    require scanning the previous pages and is not affected by rows being added or removed in the meantime. Clients
+    get it as an opaque string.
+    """
+
+    column: str = Field(regex=SORTING_COLUMN_REGEX)
     direction: Literal["asc", "desc"]
+    value: Any
+    id: str
+
+    @classmethod
+    def after_row(cls, row: Any, sorting: DataGridSorting) -> "KeysetCursor":
+        value = getattr(row, sorting.column)
+        return cls(
+            column=sorting.column,
+            direction=sorting.direction,
+            # Enums are stored by name in the database
+            value=value.name if isinstance(value, enum.Enum) else value,
+            id=str(row.id),
+        )
+
+    def get_sorting(self) -> DataGridSorting:
+        return DataGridSorting(column=self.column, direction=self.direction)
+
+    def encode(self) -> str:
+        # JSON has no datetime type, so the type of the value is kept next to it
+        if isinstance(self.value, datetime):
+            value = {"datetime": self.value.isoformat()}
+        else:
+            value = {"json": self.value}
+
+        payload = json.dumps(
+            {"c": self.column, "d": self.direction, "v": value, "id": self.id},
+            separators=(",", ":"),
+            default=str,
+        )
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    @classmethod
+    def decode(cls, cursor: str) -> "KeysetCursor":
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            value = payload["v"]
+            return cls(
+                column=payload["c"],
+                direction=payload["d"],
+                value=(
+                    datetime.fromisoformat(value["datetime"])
+                    if "datetime" in value
+                    else value["json"]
+                ),
+                id=payload["id"],
+            )
+        except Exception as e:
+            raise ValueError("Invalid cursor") from e
 
 
 class DataPageFilter(GlobalFilter):
@@ -145,6 +240,13 @@ class PaginationMixin(BaseModel):
 
 class PagedGlobalFilter(DataPageFilter, PaginationMixin):
     sorting: Optional[DataGridSorting]
+    estimate_total_count: bool = Field(
+        default=False,
+        description="""
+            Return the number of results estimated by the database instead of counting them. Much faster on large
+            result sets, but can be far off.
+        """,
+    )
 
 
 class PricingChangesFilter(GlobalFilter, PaginationMixin):
@@ -157,3 +259,41 @@ class PriceValuesFilter(GlobalFilter):
 
 class PagedPriceValuesFilter(PriceValuesFilter, PagedGlobalFilter):
     pass
+
+
+class PagedRetailerOffersFilter(PagedPriceValuesFilter):
+    """
+    The retailer offers grid is the only one paged by keyset, the other grids are paged by offset.
+    """
+
+    cursor: Optional[str] = Field(
+        default=None,
+        description="""
+            The `next_cursor` returned with the previous page. When provided, the page starts right after the last
+            row of the previous page and `page_number` is ignored. The total count is then only estimated.
+        """,
+    )
+
+    @validator("cursor")
+    def validate_cursor(cls, value):
+        if value is not None:
+            KeysetCursor.decode(value)
+        return value
+
+    @root_validator(skip_on_failure=True)
+    def validate_cursor_sorting(cls, values):
+        cursor, sorting = values.get("cursor"), values.get("sorting")
+        if cursor is not None and sorting is not None:
+            if KeysetCursor.decode(cursor).get_sorting() != sorting:
+                raise ValueError("The cursor was created for a different sorting")
+        return values
+
+    def get_keyset_cursor(self) -> Optional[KeysetCursor]:
+        return KeysetCursor.decode(self.cursor) if self.cursor is not None else None
+
+    def is_total_count_estimated(self) -> bool:
+        """
+        The pages requested with a cursor only get an estimated total count. Counting exactly would read the whole
+        datapool instead of the page only, and the exact count was already returned with the first page.
+        """
+        return self.estimate_total_count or self.cursor is not None
@@ -1,6 +1,6 @@
 import datetime
 import typing
-from typing import List, Optional
+from typing import List, Literal, Optional, Union
 from uuid import UUID
 
 from pydantic import BaseModel, Field
@@ -29,6 +29,35 @@ class HistoricalPerRetailerResponse(BaseModel):
     )
 
 
+# How the history of the charts is sent: one list of points per retailer, or one list of dates shared by the retailers
+# and one list of values per retailer, which is much smaller and faster to serialize for long histories
+HistoryLayout = Literal["points", "columns"]
+
+
+class RetailerHistoricalColumn(BaseModel):
+    id: str
+    y: List[Optional[float]] = Field(
+        description="The values at the dates of `x`. `None` if the retailer has no value at a date, whether the line is "
+        "interrupted or there is no point at this date"
+    )
+
+
+class HistoricalPerRetailerColumnsResponse(BaseModel):
+    x: List[datetime.date] = Field(description="The dates of all the retailers, sorted")
+    retailers: List[RetailerHistoricalColumn]
+    max_value: Optional[float]
+    min_value: Optional[float]
+    minimal_values: Optional[List[RetailerHistoricalItem]] = Field(
+        description="An array with all the lowest price points"
+    )
+
+
+# The columns first: an empty response in columns would also be valid in points, without `x`
+HistoricalPerRetailerInLayoutResponse = Union[
+    HistoricalPerRetailerColumnsResponse, HistoricalPerRetailerResponse
+]
+
+
 class RetailerProductPriceInMarket(BaseModel):
     product_name: str
     retailer_name: str
@@ -43,6 +43,15 @@ class RetailerToBrandProductMatchScaffold(BaseModel):
         use_enum_values = True
 
 
+DEPRECATED_RETAILER_PRODUCT_FIELDS = {
+    "price_standard",
+    "original_price_standard",
+    "client_images_count",
+    "msrp_standard",
+    "wholesale_price_standard",
+}
+
+
 class MockRetailerProductGridItem(BaseModel):
     id: Union[str, uuid.UUID]
     url: Optional[str] = Field(
@@ -225,15 +234,14 @@ class MockRetailerProductGridItem(BaseModel):
     def dict_exclude_deprecated_fields(self):
         """This is created to exclude deprecated fields in the export excel files,
         but kept for the API to remain compatible."""
-        return self.dict(
-            exclude={
-                "price_standard",
-                "original_price_standard",
-                "client_images_count",
-                "msrp_standard",
-                "wholesale_price_standard",
-            }
-        )
+        return self.dict(exclude=DEPRECATED_RETAILER_PRODUCT_FIELDS)
+
+    @classmethod
+    def get_export_columns(cls) -> List[str]:
+        """The columns of the export files, in the same order as the fields."""
+        return [
+            f for f in cls.__fields__ if f not in DEPRECATED_RETAILER_PRODUCT_FIELDS
+        ]
 
 
 class MockRetailerProductGridItemV21(MockRetailerProductGridItem):
@@ -349,6 +357,10 @@ class PagedResponse(BaseModel):
     total_count: int = Field(
         description="The total number of available offers", example=8121
     )
+    total_count_is_estimated: bool = Field(
+        default=False,
+        description="Whether the total count is an estimation, see `estimate_total_count` in the filter",
+    )
 
 
 class RetailerOffersPage(PagedResponse):
@@ -359,6 +371,9 @@ class RetailerOffersPage(PagedResponse):
     rows: List[MockRetailerProductGridItemV21] = Field(
         description="The list of retailer offers",
     )
+    next_cursor: Optional[str] = Field(
+        description="Pass it as `cursor` to get the next page, null if this is the last page"
+    )
 
 
 class BrandProductsPage(PagedResponse):
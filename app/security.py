@@ -14,6 +14,7 @@ from app import crud
 from app.config.settings import get_settings
 from app.database import get_db
 from app.schemas.auth import TokenData, AuthMetadata
+from app.service.api_keys import api_key_usage_recorder
 
 logger = get_logger()
 
@@ -24,18 +25,21 @@ JWT_SECRET_KEY = get_settings().jwt_secret
 JWT_ALGORITHM = "HS256"
 
 
+def decode_jwt(token: str) -> Optional[TokenData]:
+    try:
+        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
+        return TokenData(**payload["data"])
+    except (JWTError, ValidationError) as err:
+        return None
+
+
 def __get_jwt_data(
     credential: HTTPAuthorizationCredentials = Depends(HTTPBearer(auto_error=False)),
 ) -> Optional[TokenData]:
     if credential is None:
         return None
 
-    try:
-        token = credential.credentials
-        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
-        return TokenData(**payload["data"])
-    except (JWTError, ValidationError) as err:
-        return None
+    return decode_jwt(credential.credentials)
 
 
 def __get_api_key_data(
@@ -51,6 +55,8 @@ def __get_api_key_data(
     if api_key_entry is None:
         return None
 
+    # Good practice to keep track of the keys that are being used
+    api_key_usage_recorder.record(api_key_entry.id)
     return AuthMetadata(client=api_key_entry.client_id)
 
 
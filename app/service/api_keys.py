@@ -0,0 +1,59 @@
+import asyncio
+import threading
+from typing import Set
+
+from structlog import get_logger
+
+from app import crud
+from app.database import AsyncSessionLocal
+
+logger = get_logger(__name__)
+
+
+class ApiKeyUsageRecorder:
+    """
+    Keeps track of the API keys used since the last flush, so that their `last_used_at` is updated in a single query
+    every few seconds instead of with a commit on every request.
+
+    `last_used_at` is set to the time of the flush, so it can be late by up to the flush interval. The keys used since
+    the last flush are lost if the instance is killed before it shuts down properly.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._used_key_ids: Set[str] = set()
+
+    def record(self, api_key_id: str):
+        with self._lock:
+            self._used_key_ids.add(api_key_id)
+
+    def _pop_used_key_ids(self) -> Set[str]:
+        with self._lock:
+            used_key_ids = self._used_key_ids
+            self._used_key_ids = set()
+            return used_key_ids
+
+    async def flush(self):
+        used_key_ids = self._pop_used_key_ids()
+        if not used_key_ids:
+            return
+
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.run_sync(crud.update_api_keys_last_used_at, used_key_ids)
+        except Exception:
+            # Try again with the next flush
+            with self._lock:
+                self._used_key_ids |= used_key_ids
+            raise
+
+    async def flush_forever(self, interval_seconds: int):
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("Failed to update the last use of the API keys", error=e)
+
+
+api_key_usage_recorder = ApiKeyUsageRecorder()
@@ -0,0 +1,645 @@
+import asyncio
+import functools
+import hashlib
+import inspect
+import json
+import threading
+import time
+from datetime import date, datetime
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from cachetools import TLRUCache, TTLCache
+from fastapi import Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from structlog import get_logger
+
+from app.config.settings import get_settings
+from app.service.serialization import dumps
+
+logger = get_logger(__name__)
+
+# Endpoint arguments that are not part of the query: the brand is taken from the user, the session is irrelevant
+_NON_KEY_ARGUMENTS = ["user", "db"]
+
+
+class CacheBackend:
+    """
+    Storage used by the `ResponseCache`. Values are JSON strings so that every backend behaves the same way and
+    callers can never mutate a cached response.
+    """
+
+    # Whether the calls wait on the network, in which case the async endpoints make them from the threadpool
+    blocking = False
+
+    def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError()
+
+    def get_many(self, keys: List[str]) -> List[Optional[str]]:
+        return [self.get(key) for key in keys]
+
+    def set(self, key: str, value: str, ttl_seconds: int):
+        raise NotImplementedError()
+
+    def incr(self, key: str) -> int:
+        """
+        Atomically increment a counter that never expires and return its new value.
+        """
+        raise NotImplementedError()
+
+    def clear(self):
+        raise NotImplementedError()
+
+
+class InMemoryCacheBackend(CacheBackend):
+    """
+    Bounded LRU cache with a per-entry TTL, local to the current process.
+    """
+
+    def __init__(self, max_entries: int):
+        self._lock = threading.Lock()
+        self._entries = TLRUCache(
+            maxsize=max_entries, ttu=lambda _key, value, now: now + value[1]
+        )
+        self._counters: Dict[str, int] = {}
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                return entry[0]
+
+            counter = self._counters.get(key)
+            return str(counter) if counter is not None else None
+
+    def set(self, key: str, value: str, ttl_seconds: int):
+        with self._lock:
+            self._entries[key] = (value, ttl_seconds)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._counters.clear()
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Cache shared between all the instances of the API. Works with any server speaking the Redis protocol.
+    """
+
+    blocking = True
+
+    def __init__(self, url: str):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError(
+                "The redis cache backend requires the `redis` package to be installed"
+            ) from e
+
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._client.get(key)
+        return value.decode() if value is not None else None
+
+    def get_many(self, keys: List[str]) -> List[Optional[str]]:
+        if not keys:
+            return []
+
+        return [v.decode() if v is not None else None for v in self._client.mget(keys)]
+
+    def set(self, key: str, value: str, ttl_seconds: int):
+        self._client.set(key, value, ex=ttl_seconds)
+
+    def incr(self, key: str) -> int:
+        return self._client.incr(key)
+
+    def clear(self):
+        self._client.flushdb()
+
+
+class LookupCache:
+    """
+    Bounded cache with a TTL for the results of small reference lookups (exchange rates, API keys), local to the
+    current process.
+
+    Unlike `cachetools.cached`, which keys on every argument (including the session, which is new for every request),
+    the entries are keyed only on what identifies the result, see `cached_lookup`.
+    """
+
+    def __init__(self, name: str, max_entries: int, ttl_seconds: int):
+        self.name = name
+        self._lock = threading.Lock()
+        self._entries = TTLCache(maxsize=max_entries, ttl=ttl_seconds)
+        self.hits = 0
+        self.misses = 0
+        lookup_caches.append(self)
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """
+        :return: Whether the key was found, and the cached value
+        """
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                return True, self._entries[key]
+
+            self.misses += 1
+            return False, None
+
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            self._entries[key] = value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+# Every lookup cache of the process, for monitoring
+lookup_caches: List[LookupCache] = []
+
+
+def cached_lookup(
+    cache: LookupCache, key: Callable[..., Hashable], cache_none: bool = True
+) -> Callable:
+    """
+    Caches the results of a function in the given cache.
+
+    The lock is not held while the function runs, so concurrent misses on the same key might all call it. That is
+    fine for idempotent lookups and prevents a slow query from blocking the other keys.
+
+    :param key: Called with the arguments of the function, returns the key of the result
+    :param cache_none: Whether to cache None results (e.g. unknown API keys, which might be created later)
+    """
+
+    def decorator(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            cache_key = key(*args, **kwargs)
+            found, value = cache.get(cache_key)
+            if found:
+                return value
+
+            value = function(*args, **kwargs)
+            if value is not None or cache_none:
+                cache.set(cache_key, value)
+            return value
+
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
+
+
+def _canonicalize(value: Any, sort_lists: bool) -> Any:
+    if isinstance(value, BaseModel):
+        return _canonicalize(value.dict(), sort_lists)
+    elif isinstance(value, dict):
+        return {str(k): _canonicalize(v, sort_lists) for k, v in value.items()}
+    elif isinstance(value, (list, tuple, set)):
+        items = [_canonicalize(v, sort_lists) for v in value]
+        # The order of the selected countries, retailers, etc. does not matter, but the order of nested
+        # structures (e.g. data grid filter items) might, so only lists of plain values are sorted.
+        if (sort_lists or isinstance(value, set)) and all(
+            isinstance(v, (str, int, float)) for v in items
+        ):
+            return sorted(items, key=lambda v: (type(v).__name__, v))
+        return items
+    elif isinstance(value, (datetime, date)):
+        return value.isoformat()
+
+    return value
+
+
+def _filters_on_groups(arguments: Dict[str, Any]) -> bool:
+    """
+    :return: Whether any of the filters of the request selects product groups
+    """
+    return any(getattr(value, "groups", None) for value in arguments.values())
+
+
+def canonical_request_fingerprint(
+    arguments: Dict[str, Any], sort_lists: bool = True
+) -> str:
+    """
+    Computes a stable digest of the arguments of a request, such that two requests for the same data produce the
+    same fingerprint regardless of the order in which the filter values were sent.
+
+    :param arguments: The endpoint arguments (filters, path and query parameters) by name
+    :param sort_lists: False when the order of the values matters, e.g. for the endpoints reading only the first of
+        the selected retailers
+    :return: A hex digest
+    """
+    canonical = json.dumps(
+        _canonicalize(arguments, sort_lists),
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class ResponseCache:
+    """
+    Caches the serialized responses of the analytics endpoints, per brand and per filter.
+
+    Every entry declares the materialized views it is computed from. Instead of looking for the entries to delete
+    when one of these views is refreshed, each view has a generation counter that is part of the cache key:
+    invalidating a view bumps its counter and the stale entries simply stop being addressable until they expire.
+    This works the same way for the in-process and for the shared backend.
+
+    The cache also computes the ETags of the responses. These are derived from the state of the views as observed in
+    Postgres rather than from the generations, so that every instance computes the same ETag for the same data. Like
+    the cached entries, they also change when the TTL runs out, since the responses might read tables as well.
+
+    The responses filtered on product groups also depend on the groups of the brand, which have their own generation
+    counter, bumped whenever one of these groups is edited.
+    """
+
+    def __init__(
+        self,
+        backend: CacheBackend,
+        ttl_seconds: int,
+        live_ttl_seconds: Optional[int] = None,
+    ):
+        """
+        :param ttl_seconds: How long the responses computed only from materialized views are kept
+        :param live_ttl_seconds: How long the responses also read from tables are kept, since nothing invalidates
+            them when these tables change. Defaults to `ttl_seconds`.
+        """
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.live_ttl_seconds = (
+            live_ttl_seconds if live_ttl_seconds is not None else ttl_seconds
+        )
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._matview_states: Dict[str, str] = {}
+
+    @staticmethod
+    def _generation_key(matview: str) -> str:
+        return f"generation:{matview}"
+
+    def get_generation(self, matview: str) -> int:
+        return self.get_generations([matview])[matview]
+
+    def get_generations(self, matviews: Iterable[str]) -> Dict[str, int]:
+        """
+        :return: The generation of each view, fetched at once from the backend
+        """
+        matviews = list(matviews)
+        values = self.backend.get_many([self._generation_key(m) for m in matviews])
+        return {
+            matview: int(value) if value is not None else 0
+            for matview, value in zip(matviews, values)
+        }
+
+    def invalidate(self, matviews: Iterable[str]) -> Dict[str, int]:
+        """
+        Drops all the cached responses computed from any of the given materialized views.
+
+        :param matviews: The names of the materialized views that have been refreshed
+        :return: The new generation of each view
+        """
+        generations = {
+            matview: self.backend.incr(self._generation_key(matview))
+            for matview in matviews
+        }
+        logger.info("Response cache invalidated", generations=generations)
+        return generations
+
+    @staticmethod
+    def _groups_generation_key(brand_id: str) -> str:
+        return f"generation:groups:{brand_id}"
+
+    def get_groups_generation(self, brand_id: str) -> int:
+        value = self.backend.get(self._groups_generation_key(brand_id))
+        return int(value) if value is not None else 0
+
+    def invalidate_groups(self, brand_id: str) -> int:
+        """
+        Drops all the cached responses of the brand filtered on product groups.
+
+        :param brand_id: The brand whose groups have been created, edited or deleted
+        :return: The new generation of the groups of the brand
+        """
+        generation = self.backend.incr(self._groups_generation_key(brand_id))
+        logger.info(
+            "Response cache invalidated for groups",
+            brand_id=brand_id,
+            generation=generation,
+        )
+        return generation
+
+    def _get_groups_state(self, brand_id: str, arguments: Dict[str, Any]) -> str:
+        """
+        :return: The generation of the groups of the brand if the request filters on groups, an empty string otherwise
+        """
+        if not _filters_on_groups(arguments):
+            return ""
+        return f"groups={self.get_groups_generation(brand_id)}"
+
+    def record_matview_state(self, matview: str, state: Optional[str]):
+        """
+        :param matview:
+        :param state: Identifies the current content of the view, None if it is not known (e.g. because the view
+            has just been refreshed and the new state has not been observed yet)
+        """
+        with self._lock:
+            if state is None:
+                self._matview_states.pop(matview, None)
+            else:
+                self._matview_states[matview] = state
+
+    def build_etag(
+        self,
+        namespace: str,
+        brand_id: str,
+        arguments: Dict[str, Any],
+        depends_on: Sequence[str],
+        sort_lists: bool = True,
+        live: bool = False,
+    ) -> Optional[str]:
+        """
+        :param sort_lists: See `canonical_request_fingerprint`
+        :param live: Whether the response also reads tables, see `cached_response`
+        :return: A strong ETag, or None if the state of the views the response is computed from is not known
+        """
+        with self._lock:
+            states = [self._matview_states.get(matview) for matview in depends_on]
+
+        if not states or None in states:
+            return None
+
+        # The same on every instance, so the ETags stay comparable between them
+        ttl_bucket = int(time.time() // self.get_ttl_seconds(live))
+        groups_state = self._get_groups_state(brand_id, arguments)
+        fingerprint = canonical_request_fingerprint(arguments, sort_lists)
+        etag_source = (
+            f"{namespace}:{brand_id}:{','.join(states)}:{groups_state}:"
+            f"{ttl_bucket}:{fingerprint}"
+        )
+        return f'"{hashlib.sha256(etag_source.encode()).hexdigest()[:32]}"'
+
+    def build_key(
+        self,
+        namespace: str,
+        brand_id: str,
+        arguments: Dict[str, Any],
+        depends_on: Sequence[str] = (),
+        sort_lists: bool = True,
+    ) -> str:
+        """
+        :param sort_lists: See `canonical_request_fingerprint`
+        """
+        generations = ",".join(
+            f"{matview}={generation}"
+            for matview, generation in self.get_generations(depends_on).items()
+        )
+        groups_state = self._get_groups_state(brand_id, arguments)
+        fingerprint = canonical_request_fingerprint(arguments, sort_lists)
+        return (
+            f"response:{namespace}:{brand_id}:{generations}:{groups_state}:"
+            f"{fingerprint}"
+        )
+
+    def get_serialized(self, key: str) -> Optional[str]:
+        """
+        :return: The response as JSON, as it is stored
+        """
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        return value
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.get_serialized(key)
+        return json.loads(value) if value is not None else None
+
+    def get_ttl_seconds(self, live: bool) -> int:
+        """
+        :param live: Whether the response also reads tables, see `cached_response`
+        """
+        return self.live_ttl_seconds if live else self.ttl_seconds
+
+    def set(self, key: str, response: Any, live: bool = False) -> Any:
+        """
+        Stores the response and returns it in its serialized form, so that a cache miss produces exactly what a
+        later cache hit will.
+
+        :param live: Whether the response also reads tables, see `cached_response`
+        """
+        encoded_response = jsonable_encoder(response)
+        self.backend.set(key, json.dumps(encoded_response), self.get_ttl_seconds(live))
+        return encoded_response
+
+    def set_serialized(self, key: str, response: Any, live: bool = False) -> bytes:
+        """
+        Same as `set`, for responses that are not validated: they are serialized directly, see `TrustedJSONResponse`.
+
+        :return: The response as JSON
+        """
+        serialized = dumps(response)
+        self.backend.set(key, serialized.decode(), self.get_ttl_seconds(live))
+        return serialized
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+def _create_response_cache() -> ResponseCache:
+    settings = get_settings()
+    if settings.response_cache_backend == "redis":
+        backend = RedisCacheBackend(settings.response_cache_redis_url)
+    else:
+        backend = InMemoryCacheBackend(settings.response_cache_max_entries)
+
+    return ResponseCache(
+        backend,
+        settings.response_cache_ttl_seconds,
+        settings.response_cache_live_ttl_seconds,
+    )
+
+
+response_cache = _create_response_cache()
+
+
+def is_not_modified(request: Request, etag: Optional[str]) -> bool:
+    """
+    Whether the `If-None-Match` header of the request matches the given ETag, in which case a 304 can be returned.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if etag is None or if_none_match is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+
+    # If-None-Match uses the weak comparison
+    return etag in [
+        candidate.strip().replace("W/", "", 1) for candidate in if_none_match.split(",")
+    ]
+
+
+def not_modified_response(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
+
+
+def _serialized_response(serialized: bytes, etag: Optional[str]) -> Response:
+    # The headers set on the response passed to the endpoint are lost when it returns its own response
+    headers = {"ETag": etag} if etag is not None else None
+    return Response(serialized, media_type="application/json", headers=headers)
+
+
+def _with_request_and_response(endpoint: Callable, wrapper: Callable):
+    """
+    Adds the request and the response to the parameters FastAPI passes to the wrapper, without exposing them to the
+    endpoint itself.
+    """
+    signature = inspect.signature(endpoint)
+    wrapper.__signature__ = signature.replace(
+        parameters=[
+            *signature.parameters.values(),
+            inspect.Parameter(
+                "__request", inspect.Parameter.KEYWORD_ONLY, annotation=Request
+            ),
+            inspect.Parameter(
+                "__response", inspect.Parameter.KEYWORD_ONLY, annotation=Response
+            ),
+        ]
+    )
+    return wrapper
+
+
+def cached_response(
+    namespace: str,
+    depends_on: Sequence[str] = (),
+    trusted: bool = False,
+    ordered_filters: bool = False,
+    live: bool = False,
+) -> Callable:
+    """
+    Caches the response of an endpoint that only depends on the brand of the user and on its arguments.
+
+    When the state of the `depends_on` views is known, the response also gets an ETag and requests sending a matching
+    `If-None-Match` header get a 304 without the endpoint being called. The dashboard fetches its data through POST
+    requests that do not modify anything, so these are handled like GET requests here.
+
+    Must be applied below the router decorator. The parameters of the endpoint are kept, so the dependencies and the
+    OpenAPI schema are not affected.
+
+    :param namespace: Identifies the endpoint in the cache keys
+    :param depends_on: The materialized views the response is computed from, see `ResponseCache.invalidate`
+    :param trusted: Whether the responses of the endpoint already have the shape of its response model. They are then
+        sent as they are stored in the cache, without being parsed and validated, see `TrustedJSONResponse`.
+    :param ordered_filters: Whether the response depends on the order of the filter values, e.g. when only the first
+        selected retailer is read. The requests sending the same values in another order then get their own entries.
+    :param live: Whether the response also reads tables (e.g. `brand_product` or the time series), which change
+        without any of the `depends_on` views being refreshed. The responses are then only kept for
+        `response_cache_live_ttl_seconds`.
+    """
+
+    def decorator(endpoint: Callable) -> Callable:
+        def prepare(kwargs: Dict[str, Any]):
+            request = kwargs.pop("__request")
+            response = kwargs.pop("__response")
+            brand_id = kwargs["user"].client
+            arguments = {k: v for k, v in kwargs.items() if k not in _NON_KEY_ARGUMENTS}
+
+            sort_lists = not ordered_filters
+            etag = response_cache.build_etag(
+                namespace, brand_id, arguments, depends_on, sort_lists, live
+            )
+            if etag is not None:
+                response.headers["ETag"] = etag
+            key = response_cache.build_key(
+                namespace, brand_id, arguments, depends_on, sort_lists
+            )
+            return request, etag, key
+
+        def get_cached(key: str, etag: Optional[str]):
+            if not trusted:
+                return response_cache.get(key)
+
+            serialized = response_cache.get_serialized(key)
+            if serialized is None:
+                return None
+            return _serialized_response(serialized.encode(), etag)
+
+        def set_cached(key: str, etag: Optional[str], response: Any):
+            if not trusted:
+                return response_cache.set(key, response, live)
+
+            return _serialized_response(
+                response_cache.set_serialized(key, response, live), etag
+            )
+
+        if asyncio.iscoroutinefunction(endpoint):
+
+            async def call_backend(function: Callable, *args):
+                # A shared backend waits on the network, which must not block the event loop
+                if response_cache.backend.blocking:
+                    return await run_in_threadpool(function, *args)
+                return function(*args)
+
+            @functools.wraps(endpoint)
+            async def async_wrapper(**kwargs):
+                request, etag, key = await call_backend(prepare, kwargs)
+                if is_not_modified(request, etag):
+                    return not_modified_response(etag)
+
+                cached = await call_backend(get_cached, key, etag)
+                if cached is not None:
+                    return cached
+
+                response = await endpoint(**kwargs)
+                return await call_backend(set_cached, key, etag, response)
+
+            return _with_request_and_response(endpoint, async_wrapper)
+
+        @functools.wraps(endpoint)
+        def wrapper(**kwargs):
+            request, etag, key = prepare(kwargs)
+            if is_not_modified(request, etag):
+                return not_modified_response(etag)
+
+            cached = get_cached(key, etag)
+            if cached is not None:
+                return cached
+
+            return set_cached(key, etag, endpoint(**kwargs))
+
+        return _with_request_and_response(endpoint, wrapper)
+
+    return decorator
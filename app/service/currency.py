@@ -1,54 +1,82 @@
-from typing import List, TypeVar, Type
+from typing import Any, Dict, List, Optional, Sequence
 
-from pydantic import BaseModel
+import numpy as np
+from sqlalchemy.orm import Session
 
-from app.models.retailer import MockRetailerProductGridItem
-from app.schemas.product import MockRetailerProductGridItemV21
 from app.crud.utils import get_currency_exchange_rates
-from sqlalchemy.orm import Session
 
 
-TRetailerProductSchemaOrModel = TypeVar("TRetailerProductSchemaOrModel")
-TRetailerProductReturnSchema = TypeVar("TRetailerProductReturnSchema", bound=BaseModel)
+def convert_to_user_currency(
+    prices: Sequence[Optional[float]],
+    currencies: Sequence[Optional[str]],
+    exchange_rates: Dict[str, float],
+) -> np.ndarray:
+    """
+    Converts all the prices at once.
 
+    :param exchange_rates: As returned by `get_currency_exchange_rates`
+    :return: The converted prices, rounded to 1 decimal. NaN when there is no price or when its currency is not
+        supported.
+    """
+    prices = np.array(prices, dtype=float)
+    rates = np.array([exchange_rates.get(c) for c in currencies], dtype=float)
+    # Unlike `round`, `np.round` scales the prices before rounding them, so the half-way prices that are not exact in
+    # binary might end up rounded the other way, e.g. 0.4 instead of 0.3 for 0.35. A 0.1 difference on such prices is
+    # not worth converting them one by one.
+    return np.round(prices / rates, 1)
 
-def add_user_currency_to_retailer_offers(
-    products: List[TRetailerProductSchemaOrModel],
+
+def _get_fields(product: Any) -> Dict:
+    if isinstance(product, dict):
+        return product
+
+    # Works for both pydantic models and the entities loaded by the crud layer
+    return {k: v for k, v in vars(product).items() if k != "_sa_instance_state"}
+
+
+def add_user_currency_to_retailer_offer_rows(
+    rows: List[Dict],
     user_currency: str,
-    db: Session,
-    output_model_class: Type[
-        TRetailerProductReturnSchema
-    ] = MockRetailerProductGridItemV21,
-) -> List[TRetailerProductReturnSchema]:
-    # Get the currency conversion rates for the user's currency from PSQL.
-    currencies = get_currency_exchange_rates(db, user_currency)
-    updated_products = []
-    for product in products:
-        # Skip product if the retailer_price is None
-        if product.retailer_price is None:
-            continue
-
-        # Grab the conversion rate for the product's currency
-        product_currency = product.currency
-        if product_currency not in currencies:
-            continue  # Skip if the product's currency is not supported
-        conversion_rate = currencies[product_currency]
-
-        # Convert prices and limit to 1 decimal point
-        converted_retailer_price = round(product.retailer_price / conversion_rate, 1)
-
-        # Convert the product to a dictionary, then update it with new fields
-        product_dict = product.__dict__.copy()
-        product_dict.update(
-            {
-                "retailer_price_in_user_currency": converted_retailer_price,
-                "user_currency": user_currency,
-            }
+    exchange_rates: Dict[str, float],
+) -> List[Dict]:
+    """
+    Adds the price in the user currency to each row. The rows that have no price or a currency that is not supported
+    are dropped.
+
+    :param exchange_rates: As returned by `get_currency_exchange_rates`
+    """
+    converted_prices = convert_to_user_currency(
+        [r["retailer_price"] for r in rows],
+        [r["currency"] for r in rows],
+        exchange_rates,
+    )
+    is_converted = ~np.isnan(converted_prices)
+
+    return [
+        {
+            **row,
+            "retailer_price_in_user_currency": price,
+            "user_currency": user_currency,
+        }
+        for row, price, converted in zip(
+            rows, converted_prices.tolist(), is_converted.tolist()
         )
+        if converted
+    ]
+
 
-        # Create a new instance with updated fields
-        updated_product = output_model_class(**product_dict)
-        updated_products.append(updated_product)
+def add_user_currency_to_retailer_offers(
+    products: List[Any],
+    user_currency: str,
+    db: Session,
+) -> List[Dict]:
+    """
+    Same as `add_user_currency_to_retailer_offer_rows`, for the products returned by the crud layer (or already
+    serialized).
 
-    # Return the new list of products with added fields
-    return updated_products
+    The products are returned as dicts: they are validated only once, by the response model of the endpoint.
+    """
+    exchange_rates = get_currency_exchange_rates(db, user_currency)
+    return add_user_currency_to_retailer_offer_rows(
+        [_get_fields(p) for p in products], user_currency, exchange_rates
+    )
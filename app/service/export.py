@@ -0,0 +1,308 @@
+import csv
+import enum
+import io
+import json
+import os
+import tempfile
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional, Type, Union
+
+import pyarrow
+import pyarrow.parquet
+import xlsxwriter
+from pydantic import BaseModel
+from pydantic.fields import ModelField
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import StreamingResponse
+from xlsxwriter.worksheet import Worksheet
+
+from app.crud.utils import text_with_expanding_params
+from app.database import AsyncSessionLocal
+
+ExportFormat = Literal["xlsx", "csv"]
+# Formats meant to be processed by programs rather than opened in a spreadsheet
+BulkExportFormat = Literal["ndjson", "csv", "parquet"]
+
+EXPORT_BATCH_SIZE = 1000
+_FILE_CHUNK_SIZE = 64 * 1024
+
+_MEDIA_TYPES = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+async def stream_statement_rows(
+    statement: str, params: Dict, batch_size: int = EXPORT_BATCH_SIZE
+) -> AsyncIterator[List[Dict]]:
+    """
+    Runs the statement on a server side cursor and yields its rows in batches, so that only one batch is held in
+    memory at a time, however large the result is.
+
+    The rows are streamed after the endpoint has returned, when the session of the request is already closed, so a
+    dedicated session is used.
+    """
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(
+            text_with_expanding_params(statement, params),
+            params,
+            execution_options={"yield_per": batch_size},
+        )
+        async for rows in result.mappings().partitions(batch_size):
+            yield [dict(row) for row in rows]
+
+
+def _to_cell_value(value: Any) -> Any:
+    if value is None or isinstance(value, (str, bool, int, float, date)):
+        return value
+    elif isinstance(value, Decimal):
+        return float(value)
+    elif isinstance(value, enum.Enum):
+        return value.value
+    elif isinstance(value, (dict, list)):
+        return json.dumps(value, default=str)
+
+    # UUIDs and anything else the driver returns
+    return str(value)
+
+
+async def _stream_csv(
+    columns: List[str], batches: AsyncIterator[List[Dict]]
+) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue().encode()
+
+    async for rows in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(
+            [[_to_cell_value(row.get(c)) for c in columns] for row in rows]
+        )
+        yield buffer.getvalue().encode()
+
+
+def _write_xlsx_rows(
+    worksheet: Worksheet,
+    date_formats: Dict,
+    columns: List[str],
+    rows: List[Dict],
+    first_row_index: int,
+):
+    for row_index, row in enumerate(rows, start=first_row_index):
+        for column_index, column in enumerate(columns):
+            value = _to_cell_value(row.get(column))
+            if isinstance(value, date):
+                worksheet.write_datetime(
+                    row_index,
+                    column_index,
+                    value,
+                    date_formats[datetime if isinstance(value, datetime) else date],
+                )
+            else:
+                worksheet.write(row_index, column_index, value)
+
+
+async def _stream_xlsx(
+    columns: List[str], batches: AsyncIterator[List[Dict]]
+) -> AsyncIterator[bytes]:
+    """
+    Writes the workbook row by row to a temporary file, then streams the file.
+
+    A xlsx file is a zip archive that can only be produced once all the rows are known, but in `constant_memory`
+    mode the writer flushes every row to disk as soon as the next one starts, so the memory usage does not depend on
+    the number of rows.
+    """
+    file_descriptor, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(file_descriptor)
+    try:
+        workbook = xlsxwriter.Workbook(
+            path,
+            {
+                "constant_memory": True,
+                "remove_timezone": True,
+                "nan_inf_to_errors": True,
+            },
+        )
+        worksheet = workbook.add_worksheet()
+        # Same header and date formats as the exports previously produced through pandas
+        header_format = workbook.add_format(
+            {"bold": True, "border": 1, "align": "center", "valign": "top"}
+        )
+        date_formats = {
+            datetime: workbook.add_format({"num_format": "yyyy-mm-dd hh:mm:ss"}),
+            date: workbook.add_format({"num_format": "yyyy-mm-dd"}),
+        }
+        worksheet.write_row(0, 0, columns, header_format)
+
+        rows_count = 0
+        async for rows in batches:
+            await run_in_threadpool(
+                _write_xlsx_rows,
+                worksheet,
+                date_formats,
+                columns,
+                rows,
+                rows_count + 1,
+            )
+            rows_count += len(rows)
+        await run_in_threadpool(workbook.close)
+
+        with open(path, "rb") as file:
+            while chunk := await run_in_threadpool(file.read, _FILE_CHUNK_SIZE):
+                yield chunk
+    finally:
+        os.remove(path)
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, date):
+        return value.isoformat()
+
+    return _to_cell_value(value)
+
+
+async def _stream_ndjson(
+    columns: List[str], batches: AsyncIterator[List[Dict]]
+) -> AsyncIterator[bytes]:
+    async for rows in batches:
+        yield "".join(
+            json.dumps({c: row.get(c) for c in columns}, default=_json_default) + "\n"
+            for row in rows
+        ).encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """
+    Write-only file that keeps what is written to it until it is drained, so that the output of a writer expecting a
+    file can be streamed as it is produced.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _get_arrow_type(field: Optional[ModelField]) -> pyarrow.DataType:
+    field_type = field.type_ if field is not None else str
+    if field_type is bool:
+        return pyarrow.bool_()
+    elif field_type is int:
+        return pyarrow.int64()
+    elif field_type is float:
+        return pyarrow.float64()
+    elif field_type is datetime:
+        return pyarrow.timestamp("us")
+    elif field_type is date:
+        return pyarrow.date32()
+
+    return pyarrow.string()
+
+
+async def _stream_parquet(
+    columns: List[str],
+    batches: AsyncIterator[List[Dict]],
+    model: Optional[Type[BaseModel]],
+) -> AsyncIterator[bytes]:
+    """
+    Every batch is written as a row group, which is sent as soon as it is written. Only the footer of the file has to
+    wait for the last batch.
+    """
+    fields = model.__fields__ if model is not None else {}
+    schema = pyarrow.schema([(c, _get_arrow_type(fields.get(c))) for c in columns])
+
+    def to_value(value: Any, arrow_type) -> Any:
+        value = _to_cell_value(value)
+        return (
+            str(value)
+            if arrow_type == pyarrow.string() and value is not None
+            else value
+        )
+
+    sink = _ChunkSink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema)
+    async for rows in batches:
+        table = pyarrow.Table.from_pydict(
+            {
+                f.name: [to_value(row.get(f.name), f.type) for row in rows]
+                for f in schema
+            },
+            schema=schema,
+        )
+        await run_in_threadpool(writer.write_table, table)
+        yield sink.drain()
+
+    await run_in_threadpool(writer.close)
+    yield sink.drain()
+
+
+async def _gzip(content: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    async for chunk in content:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+
+    yield compressor.flush()
+
+
+def create_export_response(
+    columns: List[str],
+    batches: AsyncIterator[List[Dict]],
+    export_format: Union[ExportFormat, BulkExportFormat],
+    filename: str,
+    compress: bool = False,
+    model: Optional[Type[BaseModel]] = None,
+) -> StreamingResponse:
+    """
+    :param columns: The columns of the file, in order. The cells of the columns missing from a row are left empty.
+    :param batches: The rows to export, e.g. from `stream_statement_rows`
+    :param export_format:
+    :param filename: Without the extension
+    :param compress: Whether to send the file gzipped, as a `.gz` file
+    :param model: The types of the parquet columns are taken from its fields. The columns it does not define are
+        exported as strings.
+    """
+    if export_format == "xlsx":
+        content = _stream_xlsx(columns, batches)
+    elif export_format == "ndjson":
+        content = _stream_ndjson(columns, batches)
+    elif export_format == "parquet":
+        content = _stream_parquet(columns, batches, model)
+    else:
+        content = _stream_csv(columns, batches)
+
+    media_type = _MEDIA_TYPES[export_format]
+    filename = f"{filename}.{export_format}"
+    if compress:
+        content = _gzip(content)
+        media_type = "application/gzip"
+        filename = f"{filename}.gz"
+
+    return StreamingResponse(
+        content,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -0,0 +1,67 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+import httpx
+
+from app.config.settings import get_settings
+
+_http_client: Optional[httpx.AsyncClient] = None
+_http_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def create_http_client() -> httpx.AsyncClient:
+    settings = get_settings()
+    return httpx.AsyncClient(
+        http2=settings.http_client_http2,
+        limits=httpx.Limits(
+            max_connections=settings.http_client_max_connections,
+            max_keepalive_connections=settings.http_client_max_keepalive_connections,
+            keepalive_expiry=settings.http_client_keepalive_expiry_seconds,
+        ),
+        timeout=httpx.Timeout(
+            settings.http_client_timeout_seconds,
+            connect=settings.http_client_connect_timeout_seconds,
+        ),
+    )
+
+
+async def open_http_client():
+    """
+    Opens the client shared by the whole application for outgoing requests, so that the connections (and their TLS
+    sessions) are reused between requests instead of being opened for every call.
+
+    Scoped to the lifespan of the application, which closes it on shutdown (see `close_http_client`).
+    """
+    global _http_client, _http_client_loop
+    await close_http_client()
+    _http_client = create_http_client()
+    _http_client_loop = asyncio.get_running_loop()
+
+
+@asynccontextmanager
+async def get_http_client() -> AsyncIterator[httpx.AsyncClient]:
+    """
+    The shared client opened by `open_http_client`.
+
+    The connections belong to the loop they were opened in: when the app runs without its lifespan (e.g. in the test
+    client), a client is opened for the caller and closed when it is done with it.
+    """
+    if (
+        _http_client is not None
+        and not _http_client.is_closed
+        and _http_client_loop is asyncio.get_running_loop()
+    ):
+        yield _http_client
+        return
+
+    async with create_http_client() as client:
+        yield client
+
+
+async def close_http_client():
+    global _http_client, _http_client_loop
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+        _http_client_loop = None
@@ -0,0 +1,133 @@
+import asyncio
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from structlog import get_logger
+
+from app import crud
+from app.database import AsyncSessionLocal
+from app.service.cache import ResponseCache, response_cache
+
+logger = get_logger(__name__)
+
+TRACKED_MATVIEWS = [
+    "msrp_deviation_matview",
+    "wholesale_deviation_matview",
+    "average_price_deviation_matview",
+    "price_changes_matview",
+    "retailer_pricing_overview_matview",
+    "retailer_product_including_unavailable_matview",
+    "retailer_product_per_week_matview",
+    "full_product_status_by_retailer_matview",
+    "rp_brand_fixed_matview",
+]
+
+
+class MatviewRefreshTracker:
+    """
+    Detects when the materialized views are refreshed and bumps their generation, which invalidates everything
+    computed from them (see `ResponseCache.invalidate`).
+
+    Refreshes are either detected by polling the Postgres catalog, or reported by the refresh job itself.
+    """
+
+    def __init__(self, cache: ResponseCache, matviews: List[str]):
+        self.cache = cache
+        self.matviews = matviews
+        self._lock = threading.Lock()
+        self._fingerprints: Dict[str, Tuple] = {}
+        self._last_refreshed_at: Dict[str, datetime] = {}
+        self.last_polled_at: Optional[datetime] = None
+
+    @staticmethod
+    def _fingerprint(state: Dict) -> Tuple:
+        return state["storage_id"], state["modified_rows"]
+
+    def get_generations(self, matviews: Iterable[str]) -> Dict[str, int]:
+        return self.cache.get_generations(matviews)
+
+    def mark_refreshed(self, matviews: List[str]) -> Dict[str, int]:
+        """
+        :param matviews: The names of the materialized views that have been refreshed
+        :return: The new generation of each view
+        """
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            for matview in matviews:
+                self._last_refreshed_at[matview] = now
+                # The new content of the view is not known until the next poll, so no ETag can be computed from it
+                self._fingerprints.pop(matview, None)
+                self.cache.record_matview_state(matview, None)
+
+        return self.cache.invalidate(matviews)
+
+    def update(self, states: List[Dict]) -> List[str]:
+        """
+        Compares the current state of the views with the one seen during the previous poll.
+
+        The first state seen for a view is only recorded: the view might not have changed since the last time this
+        instance (or another one sharing the cache) saw it.
+
+        :param states: As returned by `crud.get_materialized_views_state`
+        :return: The names of the views that have been refreshed since the previous poll
+        """
+        refreshed = []
+        with self._lock:
+            for state in states:
+                previous_fingerprint = self._fingerprints.get(state["name"])
+                if (
+                    previous_fingerprint is not None
+                    and previous_fingerprint != self._fingerprint(state)
+                ):
+                    refreshed.append(state["name"])
+
+        if refreshed:
+            self.mark_refreshed(refreshed)
+
+        with self._lock:
+            for state in states:
+                fingerprint = self._fingerprint(state)
+                self._fingerprints[state["name"]] = fingerprint
+                self.cache.record_matview_state(
+                    state["name"], ".".join(str(v) for v in fingerprint)
+                )
+
+            self.last_polled_at = datetime.now(timezone.utc)
+
+        return refreshed
+
+    async def poll(self):
+        async with AsyncSessionLocal() as db:
+            states = await db.run_sync(crud.get_materialized_views_state, self.matviews)
+
+        # Invalidating goes through the cache backend, which might wait on the network
+        refreshed = await run_in_threadpool(self.update, states)
+        if refreshed:
+            logger.info("Materialized views refreshed", matviews=refreshed)
+
+    async def poll_forever(self, interval_seconds: int):
+        while True:
+            try:
+                await self.poll()
+            except Exception as e:
+                # The cache still expires on its own, so a failed poll should never take the API down
+                logger.error("Failed to poll the materialized views state", error=e)
+
+            await asyncio.sleep(interval_seconds)
+
+    def status(self) -> List[Dict]:
+        generations = self.get_generations(self.matviews)
+        with self._lock:
+            return [
+                {
+                    "name": matview,
+                    "generation": generations[matview],
+                    "last_refreshed_at": self._last_refreshed_at.get(matview),
+                }
+                for matview in self.matviews
+            ]
+
+
+matview_refresh_tracker = MatviewRefreshTracker(response_cache, TRACKED_MATVIEWS)
@@ -0,0 +1,261 @@
+import functools
+import inspect
+import math
+import threading
+import time
+from types import ModuleType
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.database import get_pools_status
+from app.service.cache import lookup_caches, response_cache
+from app.service.screenshot import screenshot_index
+
+# In seconds, from a cached response to an export
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+
+    return (
+        "{"
+        + ",".join(
+            f'{name}="{_escape_label_value(str(value))}"'
+            for name, value in zip(names, values)
+        )
+        + "}"
+    )
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _render_family(
+    name: str,
+    metric_type: str,
+    documentation: str,
+    label_names: Sequence[str],
+    samples: Iterable[Tuple[Sequence[str], float]],
+) -> List[str]:
+    return [
+        f"# HELP {name} {documentation}",
+        f"# TYPE {name} {metric_type}",
+        *[
+            f"{name}{_format_labels(label_names, values)} {_format_value(value)}"
+            for values, value in samples
+        ],
+    ]
+
+
+class Histogram:
+    """
+    Distribution of durations, rendered as a Prometheus histogram so that the percentiles can be computed (and
+    aggregated across instances) with `histogram_quantile`.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str],
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = sorted(buckets)
+        self._lock = threading.Lock()
+        # For every set of labels, the number of observations in each bucket (not cumulated), the sum and the count
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, label_values: Tuple[str, ...], value: float):
+        bucket_index = next(
+            (i for i, bound in enumerate(self.buckets) if value <= bound),
+            len(self.buckets),
+        )
+        with self._lock:
+            counts, total = self._series.setdefault(
+                label_values, ([0] * (len(self.buckets) + 1), [0.0])
+            )
+            counts[bucket_index] += 1
+            total[0] += value
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        bucket_label_names = [*self.label_names, "le"]
+        with self._lock:
+            series = {k: (list(c), t[0]) for k, (c, t) in self._series.items()}
+
+        for label_values, (counts, total) in sorted(series.items()):
+            cumulated = 0
+            for bound, count in zip([*self.buckets, math.inf], counts):
+                cumulated += count
+                labels = _format_labels(
+                    bucket_label_names, [*label_values, _format_value(bound)]
+                )
+                lines.append(f"{self.name}_bucket{labels} {cumulated}")
+
+            labels = _format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulated}")
+
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self):
+        with self._lock:
+            self.value += 1
+
+    def dec(self):
+        with self._lock:
+            self.value -= 1
+
+    def render(self) -> List[str]:
+        return _render_family(
+            self.name, "gauge", self.documentation, [], [([], self.value)]
+        )
+
+
+request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Time until the response starts, by route template",
+    ["method", "route", "status"],
+)
+requests_in_flight = Gauge(
+    "http_requests_in_flight", "Requests being handled by this instance"
+)
+crud_duration = Histogram(
+    "crud_function_duration_seconds",
+    "Duration of the functions of the crud layer, including the processing of the rows",
+    ["function"],
+)
+
+
+def observe_request(
+    method: str, route_path: Optional[str], status_code: int, seconds: float
+):
+    # The unmatched paths are not used as labels, there would be no bound on their number
+    request_duration.observe(
+        (method, route_path or "unmatched", str(status_code)), seconds
+    )
+
+
+def _time_crud_function(function: Callable) -> Callable:
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            crud_duration.observe((function.__name__,), time.perf_counter() - start)
+
+    return wrapper
+
+
+def time_crud_functions(crud: ModuleType):
+    """
+    Records the duration of the functions of the crud layer that query the database (the ones taking a session as
+    first argument) when they are called through the `crud` package, as the routers do.
+    """
+    for name, function in list(vars(crud).items()):
+        if (
+            inspect.isfunction(function)
+            and function.__module__.startswith(crud.__name__)
+            and next(iter(inspect.signature(function).parameters), None) == "db"
+        ):
+            setattr(crud, name, _time_crud_function(function))
+
+
+def _render_pools() -> List[str]:
+    pools = get_pools_status()
+    metrics = [
+        ("db_pool_size", "gauge", "size", "Connections kept open by the pool"),
+        ("db_pool_checked_out", "gauge", "checked_out", "Connections in use"),
+        ("db_pool_overflow", "gauge", "overflow", "Connections above the pool size"),
+        (
+            "db_pool_checkouts_total",
+            "counter",
+            "checkouts_count",
+            "Connections taken out of the pool",
+        ),
+        (
+            "db_pool_wait_seconds_total",
+            "counter",
+            "total_wait_seconds",
+            "Time spent waiting for a connection",
+        ),
+    ]
+    lines = []
+    for name, metric_type, key, documentation in metrics:
+        lines += _render_family(
+            name,
+            metric_type,
+            documentation,
+            ["pool"],
+            [([pool], status[key]) for pool, status in pools.items()],
+        )
+
+    return lines
+
+
+def _render_caches() -> List[str]:
+    screenshots = screenshot_index.stats()
+    caches = {
+        "responses": response_cache.stats(),
+        "screenshots": {
+            "hits": screenshots["manifest_lookups"] + screenshots["cache_hits"],
+            "misses": screenshots["misses"],
+        },
+        **{cache.name: cache.stats() for cache in lookup_caches},
+    }
+    return [
+        *_render_family(
+            "cache_hits_total",
+            "counter",
+            "Lookups answered by the cache",
+            ["cache"],
+            [([name], stats["hits"]) for name, stats in caches.items()],
+        ),
+        *_render_family(
+            "cache_misses_total",
+            "counter",
+            "Lookups not answered by the cache",
+            ["cache"],
+            [([name], stats["misses"]) for name, stats in caches.items()],
+        ),
+    ]
+
+
+def render_metrics() -> str:
+    """
+    :return: All the metrics of this instance, in the Prometheus text format
+    """
+    lines = [
+        *request_duration.render(),
+        *requests_in_flight.render(),
+        *crud_duration.render(),
+        *_render_pools(),
+        *_render_caches(),
+    ]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,161 @@
+import asyncio
+import functools
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, Optional
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.routing import BaseRoute
+
+
+class RequestTimings:
+    """
+    Where the time of a request goes. The times are in seconds, measured from the start of the request.
+
+    The database time overlaps with the other phases: it is spent in the dependencies and in the endpoint.
+    """
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.endpoint_started_at: Optional[float] = None
+        self.endpoint_ended_at: Optional[float] = None
+        self.response_started_at: Optional[float] = None
+        self.db_seconds = 0.0
+        self.statements_count = 0
+        self.rows_count = 0
+
+    def record_statement(self, seconds: float, rows_count: int):
+        self.db_seconds += seconds
+        self.statements_count += 1
+        # The drivers report -1 when they do not know, e.g. for server side cursors
+        self.rows_count += max(rows_count, 0)
+
+    def get_phases(self) -> Dict[str, float]:
+        """
+        :return: The duration of each phase that has been reached, in seconds
+        """
+        ended_at = self.response_started_at or time.perf_counter()
+        phases = {"total": ended_at - self.started_at}
+        if self.endpoint_started_at is not None:
+            phases["dependencies"] = self.endpoint_started_at - self.started_at
+        if self.endpoint_ended_at is not None:
+            phases["endpoint"] = self.endpoint_ended_at - self.endpoint_started_at
+            # Validation of the response model and encoding of the body
+            phases["serialization"] = ended_at - self.endpoint_ended_at
+        phases["db"] = self.db_seconds
+        return phases
+
+    def as_log_fields(self) -> Dict:
+        return {
+            **{
+                f"{phase}_ms": round(seconds * 1000, 1)
+                for phase, seconds in self.get_phases().items()
+            },
+            "db_statements_count": self.statements_count,
+            "db_rows_count": self.rows_count,
+        }
+
+    def as_server_timing(self) -> str:
+        """
+        :return: The value of the `Server-Timing` header, displayed by the network tab of the browsers
+        """
+        return ", ".join(
+            f"{phase};dur={seconds * 1000:.1f}"
+            + (f';desc="{self.statements_count} statements"' if phase == "db" else "")
+            for phase, seconds in self.get_phases().items()
+        )
+
+
+# Shared with the threads and tasks started by the request: they get a copy of the context, which holds the same
+# `RequestTimings` instance
+current_request_timings: ContextVar[Optional[RequestTimings]] = ContextVar(
+    "current_request_timings", default=None
+)
+
+
+def start_request_timings() -> RequestTimings:
+    timings = RequestTimings()
+    current_request_timings.set(timings)
+    return timings
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("statement_started_at", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started_at = conn.info["statement_started_at"].pop()
+    timings = current_request_timings.get()
+    if timings is not None:
+        timings.record_statement(time.perf_counter() - started_at, cursor.rowcount)
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    # The statement never reaches `after_cursor_execute`
+    if exception_context.connection is None or exception_context.cursor is None:
+        return
+
+    started_at = exception_context.connection.info.get("statement_started_at")
+    if started_at:
+        started_at.pop()
+
+
+def _time_endpoint(endpoint: Callable) -> Callable:
+    def start():
+        timings = current_request_timings.get()
+        if timings is not None:
+            timings.endpoint_started_at = time.perf_counter()
+        return timings
+
+    def end(timings: Optional[RequestTimings]):
+        if timings is not None:
+            timings.endpoint_ended_at = time.perf_counter()
+
+    # FastAPI runs the functions in a thread or awaits them depending on their kind, which must be kept
+    if asyncio.iscoroutinefunction(endpoint):
+
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            timings = start()
+            result = await endpoint(*args, **kwargs)
+            end(timings)
+            return result
+
+    else:
+
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            timings = start()
+            result = endpoint(*args, **kwargs)
+            end(timings)
+            return result
+
+    return wrapper
+
+
+def time_endpoints(routes: Iterable[BaseRoute]):
+    """
+    Records when the endpoint functions start and end, to split the time of the requests between the dependencies,
+    the endpoint itself and the serialization of its result.
+
+    Must be called once all the routers are included.
+    """
+    for route in routes:
+        if isinstance(route, APIRoute):
+            route.dependant.call = _time_endpoint(route.dependant.call)
+
+
+def import_pyinstrument():
+    try:
+        import pyinstrument
+    except ImportError as e:
+        raise RuntimeError(
+            "Profiling requests requires the `pyinstrument` package to be installed"
+        ) from e
+
+    return pyinstrument
@@ -0,0 +1,84 @@
+import hashlib
+import json
+import random
+from typing import Any, Dict, Iterable, List, Optional
+
+from fastapi import Request
+
+from app.config.settings import get_settings
+
+# Never written to the logs, whatever the mode
+REDACTED_HEADERS = {"authorization", "x-api-key", "cookie"}
+FINGERPRINT_LENGTH = 16
+
+
+def get_route_path(request: Request) -> Optional[str]:
+    """
+    :return: The path of the route that handled the request, with its parameters unresolved (e.g.
+        `/products/brand/{brand_product_id}`). None if no route matched or if the request was not routed yet.
+    """
+    route = request.scope.get("route")
+    return getattr(route, "path", None)
+
+
+async def get_request_fingerprint(request: Request) -> str:
+    """
+    Identifies the filters of a request without logging them: the same query parameters and body always give the
+    same fingerprint.
+
+    The body is read as bytes, it is not parsed. Starlette keeps it for the endpoint, which reads it anyway.
+    """
+    digest = hashlib.sha256(request.url.query.encode())
+    if request.method in ("POST", "PUT"):
+        digest.update(b"\0")
+        digest.update(await request.body())
+
+    return digest.hexdigest()[:FINGERPRINT_LENGTH]
+
+
+async def get_full_request_fields(request: Request) -> Dict[str, Any]:
+    """
+    The headers and the parsed body of the request, for the `full` logging mode.
+    """
+    request_body_json = None
+    if request.method in ("POST", "PUT"):
+        try:
+            request_body_json = await request.json()
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            # No need to care if the request body format is incorrect
+            pass
+
+    return {
+        "http_request_headers": {
+            k: "[redacted]" if k in REDACTED_HEADERS else v
+            for k, v in request.headers.items()
+        },
+        "http_request_body": request_body_json,
+    }
+
+
+def should_log_request(route_path: Optional[str], status_code: int) -> bool:
+    """
+    Samples the requests according to the rate of their route. Failed requests are always logged.
+    """
+    if status_code >= 400:
+        return True
+
+    settings = get_settings()
+    sample_rate = settings.request_log_sample_rates.get(
+        route_path, settings.request_log_sample_rate
+    )
+    return sample_rate >= 1 or random.random() < sample_rate
+
+
+def get_unknown_sample_rate_routes(route_paths: Iterable[str]) -> List[str]:
+    """
+    :param route_paths: The paths of all the routes of the app
+    :return: The routes with a sample rate that match none of them, which are most likely mistyped
+    """
+    known_paths = set(route_paths)
+    return [
+        route_path
+        for route_path in get_settings().request_log_sample_rates
+        if route_path not in known_paths
+    ]
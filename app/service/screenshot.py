@@ -1,12 +1,18 @@
 import asyncio
 import hashlib
-from typing import List, TypeVar, Type, Union
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Set, TypeVar, Type
 
 import httpx
+from cachetools import TLRUCache
 from pydantic import BaseModel
 from structlog import get_logger
 
+from app.config.settings import get_settings
 from app.database import Base
+from app.service.http_client import get_http_client
 
 logger = get_logger(__name__)
 
@@ -14,47 +20,284 @@ logger = get_logger(__name__)
 TRetailerProductModel = TypeVar("TRetailerProductModel", bound=Base)
 TRetailerProductSchema = TypeVar("TRetailerProductSchema", bound=BaseModel)
 
+SCREENSHOTS_BUCKET = "b2b_shelf_analytics_images"
+SCREENSHOTS_PREFIX = "screenshots/"
+
+
+def get_screenshot_hash(product_url: Optional[str]) -> str:
+    return hashlib.md5(str(product_url).encode()).hexdigest()
+
+
+def get_screenshot_url(screenshot_hash: str) -> str:
+    return f"https://storage.googleapis.com/{SCREENSHOTS_BUCKET}/{SCREENSHOTS_PREFIX}{screenshot_hash}.jpg"
+
+
+class LatencyStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def record(self, seconds: float):
+        with self._lock:
+            self.count += 1
+            self.total_seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+
+    def as_dict(self) -> Dict:
+        with self._lock:
+            return {
+                "count": self.count,
+                "total_seconds": self.total_seconds,
+                "average_seconds": (
+                    self.total_seconds / self.count if self.count else 0.0
+                ),
+                "max_seconds": self.max_seconds,
+            }
+
+
+class ScreenshotIndex:
+    """
+    Knows which products have a screenshot, so that the screenshot URLs can be resolved without asking the bucket
+    for every product of every page.
+
+    The index is backed by a manifest of the bucket, listed periodically. Until the first listing succeeds (or if the
+    listing is disabled), the existence of the screenshots is checked with HEAD requests, whose results are kept in a
+    bounded LRU cache with a TTL. The screenshots missing from the manifest are also checked that way when their
+    product was fetched after the listing, since they might have been uploaded in the meantime.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: int, missing_ttl_seconds: int):
+        self._lock = threading.Lock()
+        # Screenshots are never deleted, so their existence can be cached for much longer than their absence
+        self._entries = TLRUCache(
+            maxsize=max_entries,
+            ttu=lambda _key, exists, now: now
+            + (ttl_seconds if exists else missing_ttl_seconds),
+        )
+        # Stored as raw digests: a 16 bytes `bytes` takes 49 bytes of memory, against 81 for the 32 characters `str`
+        self._manifest: Optional[Set[bytes]] = None
+        self.manifest_listed_at: Optional[datetime] = None
+        self.manifest_lookups = 0
+        self.cache_hits = 0
+        self.misses = 0
+        # How long it takes to resolve the screenshots of a list of products, and to check a single one with HEAD
+        self.lookup_latency = LatencyStats()
+        self.head_request_latency = LatencyStats()
+
+    def lookup(
+        self, screenshot_hash: str, fetched_at: Optional[datetime] = None
+    ) -> Optional[bool]:
+        """
+        :param fetched_at: When the product was last fetched, which is when its screenshot is taken
+        :return: Whether the screenshot exists, None if it is not known
+        """
+        with self._lock:
+            if self._manifest is not None:
+                self.manifest_lookups += 1
+                if bytes.fromhex(screenshot_hash) in self._manifest:
+                    return True
+                if not _is_after(fetched_at, self.manifest_listed_at):
+                    return False
+
+            exists = self._entries.get(screenshot_hash)
+            if exists is None:
+                self.misses += 1
+            else:
+                self.cache_hits += 1
+            return exists
+
+    def record(self, screenshot_hash: str, exists: bool):
+        with self._lock:
+            self._entries[screenshot_hash] = exists
+
+    def set_manifest(self, screenshot_hashes: Iterable[str], listed_at: datetime):
+        manifest = set()
+        skipped_names = []
+        for screenshot_hash in screenshot_hashes:
+            # Anything else in the bucket is not a screenshot of a product, see `get_screenshot_hash`
+            try:
+                screenshot_id = bytes.fromhex(screenshot_hash)
+            except ValueError:
+                screenshot_id = None
+
+            if screenshot_id is not None and len(screenshot_id) == 16:
+                manifest.add(screenshot_id)
+            else:
+                skipped_names.append(screenshot_hash)
+
+        if skipped_names:
+            logger.warn(
+                "Skipped the screenshots that are not named after a hash",
+                count=len(skipped_names),
+                examples=skipped_names[:5],
+            )
+
+        with self._lock:
+            self._manifest = manifest
+            self.manifest_listed_at = listed_at
+
+    async def refresh_manifest(self):
+        listed_at = datetime.now(timezone.utc)
+        screenshot_hashes = await asyncio.to_thread(_list_screenshot_hashes)
+        self.set_manifest(screenshot_hashes, listed_at)
+        logger.info("Screenshots manifest refreshed", count=len(self._manifest))
+
+    async def refresh_manifest_forever(self, interval_seconds: int):
+        while True:
+            try:
+                await self.refresh_manifest()
+            except Exception as e:
+                # Keep the previous manifest, or the HEAD requests if there is none yet
+                logger.error("Failed to list the screenshots", error=e)
+
+            await asyncio.sleep(interval_seconds)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "manifest_size": (
+                    len(self._manifest) if self._manifest is not None else None
+                ),
+                "manifest_listed_at": self.manifest_listed_at,
+                "cached_entries": len(self._entries),
+                "manifest_lookups": self.manifest_lookups,
+                "cache_hits": self.cache_hits,
+                "misses": self.misses,
+                "lookup_latency": self.lookup_latency.as_dict(),
+                "head_request_latency": self.head_request_latency.as_dict(),
+            }
 
-async def __retrieve_screenshot_url(
-    client: httpx.AsyncClient, product_url: str
-) -> Union[str, None]:
-    try:
-        url_hash = hashlib.md5(str(product_url).encode()).hexdigest()
-        tentative_screenshot_url = f"https://storage.googleapis.com/b2b_shelf_analytics_images/screenshots/{url_hash}.jpg"
 
-        head_response = await client.head(tentative_screenshot_url)
-        return tentative_screenshot_url if head_response.status_code == 200 else None
+def _is_after(fetched_at: Optional[datetime], listed_at: datetime) -> bool:
+    if fetched_at is None:
+        return False
+    # The database stores UTC timestamps without a time zone
+    if fetched_at.tzinfo is None:
+        fetched_at = fetched_at.replace(tzinfo=timezone.utc)
+
+    return fetched_at >= listed_at
+
+
+def _list_screenshot_hashes() -> List[str]:
+    # Only needed when the manifest is enabled, and slow to import
+    from google.cloud import storage
+
+    blobs = storage.Client().list_blobs(
+        SCREENSHOTS_BUCKET,
+        prefix=SCREENSHOTS_PREFIX,
+        fields="items(name),nextPageToken",
+    )
+    return [
+        blob.name[len(SCREENSHOTS_PREFIX) : -len(".jpg")]
+        for blob in blobs
+        if blob.name.endswith(".jpg")
+    ]
+
+
+def _create_screenshot_index() -> ScreenshotIndex:
+    settings = get_settings()
+    return ScreenshotIndex(
+        settings.screenshot_index_max_entries,
+        settings.screenshot_index_ttl_seconds,
+        settings.screenshot_index_missing_ttl_seconds,
+    )
+
+
+screenshot_index = _create_screenshot_index()
+
+
+async def __screenshot_exists(
+    client: httpx.AsyncClient, screenshot_hash: str
+) -> Optional[bool]:
+    """
+    :return: None if the bucket could not be reached
+    """
+    try:
+        head_response = await client.head(get_screenshot_url(screenshot_hash))
+        return head_response.status_code == 200
     except httpx.HTTPError as exc:
         logger.warn(
-            f"HTTP exception while checking for the screenshot for {product_url} - {exc}"
+            f"HTTP exception while checking for the screenshot {screenshot_hash} - {exc}"
         )
         return None
 
 
-async def assign_screenshot_url(
+async def resolve_screenshot_urls(
+    index: ScreenshotIndex,
     client: httpx.AsyncClient,
-    semaphore: asyncio.Semaphore,
-    product: TRetailerProductModel,
-    output_model_class: Type[TRetailerProductSchema],
-) -> TRetailerProductSchema:
-    async with semaphore:
-        result = output_model_class.from_orm(product)
-        result.screenshot_url = await __retrieve_screenshot_url(client, product.url)
-        return result
+    product_urls: List[Optional[str]],
+    concurrency: int,
+    fetched_at: Optional[List[Optional[datetime]]] = None,
+) -> List[Optional[str]]:
+    """
+    :param concurrency: The maximum number of HEAD requests in flight
+    :param fetched_at: When each product was last fetched, see `ScreenshotIndex.lookup`
+    :return: The URL of the screenshot of each product, None when there is none
+    """
+    start = time.perf_counter()
+    screenshot_hashes = [get_screenshot_hash(u) for u in product_urls]
+    # A product might be listed several times, its screenshot was last taken when it was last fetched
+    last_fetched_at: Dict[str, Optional[datetime]] = {}
+    for h, f in zip(screenshot_hashes, fetched_at or [None] * len(product_urls)):
+        previous = last_fetched_at.get(h)
+        last_fetched_at[h] = f if previous is None or (f and f > previous) else previous
+    existing = {h: index.lookup(h, f) for h, f in last_fetched_at.items()}
+
+    unknown_hashes = [h for h, exists in existing.items() if exists is None]
+    if unknown_hashes:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def check(screenshot_hash: str):
+            async with semaphore:
+                head_request_start = time.perf_counter()
+                exists = await __screenshot_exists(client, screenshot_hash)
+                index.head_request_latency.record(
+                    time.perf_counter() - head_request_start
+                )
+            if exists is not None:
+                index.record(screenshot_hash, exists)
+            existing[screenshot_hash] = exists
+
+        await asyncio.gather(*[check(h) for h in unknown_hashes])
+
+    index.lookup_latency.record(time.perf_counter() - start)
+    return [get_screenshot_url(h) if existing[h] else None for h in screenshot_hashes]
+
+
+async def retrieve_screenshot_urls(
+    product_urls: List[Optional[str]],
+    fetched_at: Optional[List[Optional[datetime]]] = None,
+) -> List[Optional[str]]:
+    """
+    Same as `add_screenshots_to_retailer_offers`, for rows that are not loaded as models (e.g. during an export).
+
+    :param fetched_at: When each product was last fetched, see `ScreenshotIndex.lookup`
+    :return: The URL of the screenshot of each product, None when there is none
+    """
+    async with get_http_client() as client:
+        return await resolve_screenshot_urls(
+            screenshot_index,
+            client,
+            product_urls,
+            get_settings().screenshot_lookup_concurrency,
+            fetched_at,
+        )
 
 
 async def add_screenshots_to_retailer_offers(
     products: List[TRetailerProductModel],
     output_model_class: Type[TRetailerProductSchema],
 ) -> List[TRetailerProductSchema]:
-    # Check for the screenshots in parallel
-    concurrency = 100
-    semaphore = asyncio.Semaphore(concurrency)
-    async with httpx.AsyncClient(
-        limits=httpx.Limits(max_connections=concurrency),
-    ) as client:
-        tasks = [
-            assign_screenshot_url(client, semaphore, p, output_model_class)
-            for p in products
-        ]
-        return list(await asyncio.gather(*tasks))
+    screenshot_urls = await retrieve_screenshot_urls(
+        [p.url for p in products], [getattr(p, "fetched_at", None) for p in products]
+    )
+
+    results = []
+    for product, screenshot_url in zip(products, screenshot_urls):
+        result = output_model_class.from_orm(product)
+        result.screenshot_url = screenshot_url
+        results.append(result)
+
+    return results
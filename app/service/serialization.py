@@ -0,0 +1,124 @@
+import functools
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Type
+
+import orjson
+from pydantic import BaseModel
+from starlette.responses import JSONResponse
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, BaseModel):
+        return value.dict()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    # The types orjson handles natively
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, Enum):
+        return value.value
+
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """
+    Serializes the content to JSON like FastAPI would after validating it, with orjson.
+
+    Unlike FastAPI, NaN and infinities are sent as `null` instead of failing the request.
+    """
+    return orjson.dumps(
+        content,
+        default=_default,
+        option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+    )
+
+
+class TrustedJSONResponse(JSONResponse):
+    """
+    Response for content that does not need to be validated: when an endpoint returns a response, FastAPI sends it as
+    is, without going through the response model, which is still used for the OpenAPI schema.
+
+    The content must already have the shape of the response model, see `to_trusted_dict` and `to_trusted_rows`.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def _to_float(value: Any) -> float:
+    return value if type(value) is float else float(value)
+
+
+def _to_int(value: Any) -> int:
+    return value if type(value) is int else int(value)
+
+
+def _to_date(value: Any) -> date:
+    return value.date() if isinstance(value, datetime) else value
+
+
+# The conversions pydantic does on the values of the database, by type of field
+_CONVERTERS: Dict[type, Callable[[Any], Any]] = {
+    float: _to_float,
+    int: _to_int,
+    date: _to_date,
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _get_trusted_fields(
+    model: Type[BaseModel],
+) -> List[Tuple[str, Any, Optional[Callable[[Any], Any]]]]:
+    """
+    :return: The name, the default value and the conversion of the values (if any) of each field
+    """
+    return [
+        (
+            name,
+            field.get_default(),
+            _CONVERTERS.get(field.type_) if not field.sub_fields else None,
+        )
+        for name, field in model.__fields__.items()
+    ]
+
+
+def _to_trusted_dict(row: Any, fields: List[Tuple[str, Any, Callable]]) -> Dict:
+    get_value = row.get if isinstance(row, dict) else functools.partial(getattr, row)
+    trusted_row = {}
+    for name, default, convert in fields:
+        value = get_value(name, default)
+        if convert is not None and value is not None:
+            value = convert(value)
+        trusted_row[name] = value
+
+    return trusted_row
+
+
+def to_trusted_dict(row: Any, model: Type[BaseModel]) -> Dict:
+    """
+    Turns a row returned by the crud layer into a dict with the fields of the model, in the order of the model, as
+    the response model would, but without validating it. Only the fields of the model itself are handled, the nested
+    values are sent as they are.
+
+    Like pydantic, the numbers and the dates are converted to the type of their field, e.g. the `Decimal` returned for
+    a `numeric` column of a `float` field, and the missing fields get their default value.
+
+    :param row: An entity, a pydantic model or a dict
+    """
+    return _to_trusted_dict(row, _get_trusted_fields(model))
+
+
+def to_trusted_rows(rows: Iterable[Any], model: Type[BaseModel]) -> List[Dict]:
+    """
+    Same as `to_trusted_dict`, for all the rows of a page.
+    """
+    fields = _get_trusted_fields(model)
+    return [_to_trusted_dict(row, fields) for row in rows]
@@ -8,5 +8,6 @@ TAG_CONTENT = "content"
 TAG_MATCHING = "matching"
 TAG_GROUPS = "groups"
 TAG_PRICE = "price"
+TAG_DIAGNOSTICS = "diagnostics"
 
 TAG_EXTERNAL = "external"
@@ -0,0 +1,132 @@
+from datetime import date, timedelta
+from typing import Dict, List, NamedTuple, Optional
+
+# Every read-only endpoint of the routers in `app/routers`. The endpoints that modify data (API keys, groups, matching
+# solutions, brand switching, matviews notifications) are left out, so the benchmark can be run against any database.
+
+
+class BenchmarkedEndpoint(NamedTuple):
+    method: str
+    path: str
+    # How the filter is sent: `global` as a GlobalFilter body, `page` as a PagedGlobalFilter body, `data_page` as a
+    # DataPageFilter body, `price_page` as a PagedPriceValuesFilter body, `categories` as the list of its categories.
+    # Endpoints without a body are only called once per run, with `params`.
+    body: Optional[str] = None
+    params: Optional[Dict] = None
+
+
+ENDPOINTS = [
+    # auth
+    BenchmarkedEndpoint("GET", "/authenticate/keys"),
+    # performance
+    BenchmarkedEndpoint("POST", "/performance", "global"),
+    BenchmarkedEndpoint("POST", "/performance/categories", "categories"),
+    BenchmarkedEndpoint("POST", "/performance/top_n", "global"),
+    BenchmarkedEndpoint(
+        "POST", "/performance/top_n/history/{retailer_category_id}", "global"
+    ),
+    BenchmarkedEndpoint("POST", "/performance/homepage", "global"),
+    BenchmarkedEndpoint("POST", "/performance/homepage/history", "global"),
+    # availability
+    BenchmarkedEndpoint("POST", "/availability/visible", "global"),
+    BenchmarkedEndpoint("POST", "/availability/visible/average", "global"),
+    BenchmarkedEndpoint("POST", "/availability/per_retailer", "global"),
+    # brand_products
+    BenchmarkedEndpoint("POST", "/products/brand", "page"),
+    BenchmarkedEndpoint("POST", "/products/brand/count", "data_page"),
+    BenchmarkedEndpoint("POST", "/products/brand/export", "page", {"format": "csv"}),
+    BenchmarkedEndpoint("GET", "/products/brand/{brand_product_id}"),
+    BenchmarkedEndpoint("POST", "/products/brand/{brand_product_id}/matches", "global"),
+    BenchmarkedEndpoint(
+        "POST", "/products/brand/{brand_product_id}/all_offers", "global"
+    ),
+    BenchmarkedEndpoint(
+        "POST", "/products/brand/{brand_product_id}/msrp_deviation", "global"
+    ),
+    BenchmarkedEndpoint("POST", "/products/brand/{brand_product_id}/prices", "global"),
+    BenchmarkedEndpoint("POST", "/products/brand/{brand_product_id}/msrp", "global"),
+    # retailer_offers
+    BenchmarkedEndpoint("POST", "/products/retailers", "price_page"),
+    BenchmarkedEndpoint(
+        "POST", "/products/retailers/export", "price_page", {"format": "csv"}
+    ),
+    # overview
+    BenchmarkedEndpoint("GET", "/countries"),
+    BenchmarkedEndpoint("GET", "/retailers"),
+    BenchmarkedEndpoint("GET", "/groups"),
+    BenchmarkedEndpoint("GET", "/categories"),
+    BenchmarkedEndpoint("GET", "/brands"),
+    BenchmarkedEndpoint("POST", "/stats", "global"),
+    BenchmarkedEndpoint("GET", "/currency"),
+    # content
+    BenchmarkedEndpoint("POST", "/content/score", "global"),
+    BenchmarkedEndpoint("POST", "/content/score/image", "global"),
+    BenchmarkedEndpoint("POST", "/content/score/text", "global"),
+    BenchmarkedEndpoint("POST", "/content/score/image/per_retailer", "global"),
+    BenchmarkedEndpoint("POST", "/content/score/text/per_retailer", "global"),
+    BenchmarkedEndpoint("POST", "/content/per_retailer", "global"),
+    # matching
+    BenchmarkedEndpoint("POST", "/matching/next", "global"),
+    # stock
+    BenchmarkedEndpoint("POST", "/stock", "global"),
+    # price
+    BenchmarkedEndpoint("POST", "/price/data", "price_page"),
+    BenchmarkedEndpoint("POST", "/price/msrp", "global"),
+    BenchmarkedEndpoint("POST", "/price/wholesale", "global"),
+    BenchmarkedEndpoint("POST", "/price/average_price_deviation", "global"),
+    BenchmarkedEndpoint("POST", "/price/changes", "global", {"sign": 1}),
+    BenchmarkedEndpoint("POST", "/price/retailer_overview", "global"),
+    BenchmarkedEndpoint("POST", "/price/{brand_product_id}/comparison", "global"),
+    # external_v2
+    BenchmarkedEndpoint("GET", "/v2/products/retailer_offers", params={"page": 0}),
+    BenchmarkedEndpoint("GET", "/v2.1/products/retailer_offers", params={"page": 0}),
+    BenchmarkedEndpoint("GET", "/v2.2/products/retailer_offers"),
+    BenchmarkedEndpoint(
+        "GET", "/v2.2/products/retailer_offers/export", params={"format": "ndjson"}
+    ),
+    # diagnostics
+    BenchmarkedEndpoint("GET", "/diagnostics/pool"),
+    BenchmarkedEndpoint("GET", "/diagnostics/matviews"),
+    BenchmarkedEndpoint("GET", "/diagnostics/screenshots"),
+]
+
+_EMPTY_DATA_GRID_FILTER = {"items": [], "operator": "and"}
+
+
+def build_body(endpoint: BenchmarkedEndpoint, global_filter: Dict, shift_days: int):
+    """
+    :param global_filter: One of `benchmark.filters.filters`
+    :param shift_days: Moves the start date back by this many days, so that the requests of a run do not hit the
+        response cache of the previous ones
+    """
+    if endpoint.body is None:
+        return None
+
+    start_date = date.fromisoformat(global_filter["start_date"]) - timedelta(
+        days=shift_days
+    )
+    global_filter = {**global_filter, "start_date": start_date.isoformat()}
+    if endpoint.body == "categories":
+        return global_filter["categories"]
+    elif endpoint.body == "data_page":
+        return {**global_filter, "data_grid_filter": _EMPTY_DATA_GRID_FILTER}
+    elif endpoint.body in ("page", "price_page"):
+        return {
+            **global_filter,
+            "data_grid_filter": _EMPTY_DATA_GRID_FILTER,
+            "page_number": 1,
+            "page_size": 50,
+        }
+
+    return global_filter
+
+
+def get_path_parameters(endpoints: List[BenchmarkedEndpoint]) -> List[str]:
+    return sorted(
+        {
+            part[1:-1]
+            for e in endpoints
+            for part in e.path.split("/")
+            if part.startswith("{")
+        }
+    )
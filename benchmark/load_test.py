@@ -0,0 +1,323 @@
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+import typer
+from structlog import get_logger
+
+from benchmark.config import BRAND_ID, get_auth_headers
+from benchmark.endpoints import (
+    ENDPOINTS,
+    BenchmarkedEndpoint,
+    build_body,
+    get_path_parameters,
+)
+from benchmark.filters import filters
+
+app = typer.Typer()
+logger = get_logger()
+
+SERVER_STARTUP_TIMEOUT_SECONDS = 60
+
+
+def _get_free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port: int, workers: int) -> subprocess.Popen:
+    """
+    Starts the API with the environment of the benchmark, e.g. `DB_HOST` pointing to a local database.
+    """
+    env = {
+        # Listing the screenshots bucket needs credentials, the index falls back on HEAD requests
+        "SCREENSHOT_MANIFEST_REFRESH_INTERVAL_SECONDS": "0",
+        "REQUEST_LOG_SAMPLE_RATE": "0",
+        **os.environ,
+    }
+    # fmt: off
+    command = [
+        sys.executable, "-m", "uvicorn", "app.main:app",
+        "--port", str(port), "--workers", str(workers), "--log-level", "warning",
+    ]
+    # fmt: on
+    return subprocess.Popen(command, env=env)
+
+
+def wait_for_server(base_url: str, server: subprocess.Popen):
+    deadline = time.monotonic() + SERVER_STARTUP_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"The API exited with code {server.returncode}")
+        try:
+            httpx.get(f"{base_url}/docs", timeout=1)
+            return
+        except httpx.TransportError:
+            time.sleep(0.5)
+
+    raise RuntimeError("The API did not start in time")
+
+
+async def discover_path_parameters(client: httpx.AsyncClient) -> Dict[str, str]:
+    """
+    Picks an entity of the brand for each parameter of the benchmarked paths. The endpoints whose parameters cannot
+    be found (e.g. when the brand has no products) are skipped.
+    """
+    parameters = {}
+    global_filter = filters["none"]
+    try:
+        response = await client.post(
+            "/products/brand",
+            json=build_body(
+                BenchmarkedEndpoint("POST", "/products/brand", "page"), global_filter, 0
+            ),
+        )
+        parameters["brand_product_id"] = response.json()["rows"][0]["id"]
+    except (httpx.HTTPError, KeyError, IndexError, ValueError) as e:
+        logger.warning("No brand product found", error=str(e))
+    try:
+        response = await client.post("/performance/top_n", json=global_filter)
+        parameters["retailer_category_id"] = response.json()["categories"][0][
+            "category_id"
+        ]
+    except (httpx.HTTPError, KeyError, IndexError, ValueError) as e:
+        logger.warning("No retailer category found", error=str(e))
+
+    return parameters
+
+
+async def _send(
+    client: httpx.AsyncClient,
+    endpoint: BenchmarkedEndpoint,
+    path: str,
+    body,
+) -> Optional[float]:
+    """
+    :return: The duration until the whole response is received, None if the request failed
+    """
+    start = time.perf_counter()
+    try:
+        response = await client.request(
+            endpoint.method, path, json=body, params=endpoint.params
+        )
+    except httpx.HTTPError as e:
+        logger.warning(f"{endpoint.method} {path} failed", error=str(e))
+        return None
+
+    duration = time.perf_counter() - start
+    if response.status_code >= 400:
+        logger.warning(
+            f"{endpoint.method} {path} failed", status_code=response.status_code
+        )
+        return None
+
+    return duration
+
+
+async def run_case(
+    client: httpx.AsyncClient,
+    endpoint: BenchmarkedEndpoint,
+    path: str,
+    filter_name: Optional[str],
+    requests_count: int,
+    concurrency: int,
+    cache_busting: bool,
+) -> Dict:
+    """
+    Sends `requests_count` requests to the endpoint, `concurrency` at a time.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(index: int) -> Optional[float]:
+        body = (
+            build_body(endpoint, filters[filter_name], index if cache_busting else 0)
+            if filter_name is not None
+            else None
+        )
+        async with semaphore:
+            return await _send(client, endpoint, path, body)
+
+    start = time.perf_counter()
+    durations = await asyncio.gather(*[send(i) for i in range(requests_count)])
+    elapsed = time.perf_counter() - start
+
+    succeeded = np.array([d for d in durations if d is not None]) * 1000
+    percentiles = (
+        np.percentile(succeeded, [50, 95, 99]).round(1).tolist()
+        if len(succeeded)
+        else [None, None, None]
+    )
+    return {
+        "endpoint": f"{endpoint.method} {endpoint.path}",
+        "filter": filter_name,
+        "requests": requests_count,
+        "errors": requests_count - len(succeeded),
+        "p50_ms": percentiles[0],
+        "p95_ms": percentiles[1],
+        "p99_ms": percentiles[2],
+        "throughput_rps": round(len(succeeded) / elapsed, 1),
+    }
+
+
+async def run_benchmark(
+    base_url: str,
+    brand_id: str,
+    requests_count: int,
+    concurrency: int,
+    filter_names: List[str],
+    endpoint_filter: Optional[str],
+    cache_busting: bool,
+) -> List[Dict]:
+    endpoints = [
+        e for e in ENDPOINTS if endpoint_filter is None or endpoint_filter in e.path
+    ]
+    async with httpx.AsyncClient(
+        base_url=base_url,
+        headers=get_auth_headers(brand_id),
+        timeout=300,
+        limits=httpx.Limits(max_connections=concurrency),
+    ) as client:
+        path_parameters = await discover_path_parameters(client)
+        missing_parameters = set(get_path_parameters(endpoints)) - set(path_parameters)
+
+        results = []
+        for endpoint in endpoints:
+            if any(f"{{{p}}}" in endpoint.path for p in missing_parameters):
+                logger.warning(f"Skipping {endpoint.path}, missing parameters")
+                continue
+
+            path = endpoint.path.format(**path_parameters)
+            # The endpoints without filters always get the same request
+            for filter_name in filter_names if endpoint.body else [None]:
+                result = await run_case(
+                    client,
+                    endpoint,
+                    path,
+                    filter_name,
+                    requests_count,
+                    concurrency,
+                    cache_busting,
+                )
+                logger.info("Benchmarked", **result)
+                results.append(result)
+
+    return results
+
+
+def find_regressions(
+    results: List[Dict], baseline: List[Dict], tolerance: float
+) -> List[str]:
+    """
+    :param tolerance: How much slower the p95 can get before it is a regression, e.g. 0.2 for 20%
+    """
+    baseline_p95 = {(r["endpoint"], r["filter"]): r["p95_ms"] for r in baseline}
+    regressions = []
+    for result in results:
+        previous = baseline_p95.get((result["endpoint"], result["filter"]))
+        if previous is None or result["p95_ms"] is None:
+            continue
+        if result["p95_ms"] > previous * (1 + tolerance):
+            regressions.append(
+                f"{result['endpoint']} ({result['filter'] or '-'}): p95 went from {previous}ms to {result['p95_ms']}ms"
+            )
+
+    return regressions
+
+
+def print_report(results: List[Dict]):
+    columns = ["p50_ms", "p95_ms", "p99_ms", "throughput_rps", "errors"]
+    print(f"{'endpoint':<60} {'filter':<16}" + "".join(f"{c:>15}" for c in columns))
+    for r in results:
+        print(
+            f"{r['endpoint']:<60} {r['filter'] or '-':<16}"
+            + "".join(f"{str(r[c]):>15}" for c in columns)
+        )
+
+
+@app.command()
+def run(
+    base_url: Optional[str] = typer.Option(
+        None,
+        help="The API to benchmark. By default the API is started locally, against the database configured in the "
+        "environment.",
+    ),
+    brand_id: str = typer.Option(BRAND_ID),
+    requests_count: int = typer.Option(20, help="The number of requests per case"),
+    concurrency: int = typer.Option(4, help="The number of requests in flight"),
+    filter_names: str = typer.Option(
+        ",".join(filters), help="The filters of `benchmark/filters.py` to use"
+    ),
+    endpoint_filter: Optional[str] = typer.Option(
+        None, help="Only benchmark the paths containing this string"
+    ),
+    cache_busting: bool = typer.Option(
+        True,
+        help="Send a different start date with every request, so that the queries are measured rather than the "
+        "response cache",
+    ),
+    server_workers: int = typer.Option(1),
+    output: Optional[str] = typer.Option(None, help="Where to save the results"),
+    baseline: Optional[str] = typer.Option(
+        None, help="The results of a previous run, to compare against"
+    ),
+    tolerance: float = typer.Option(0.2),
+):
+    """
+    Load tests every read-only endpoint of the API with the filters of `benchmark/filters.py`, and reports the p50,
+    p95 and p99 latencies and the throughput of each.
+
+    Exits with an error when the p95 of a case is more than `tolerance` slower than in the baseline.
+    """
+    unknown_filters = set(filter_names.split(",")) - set(filters)
+    if unknown_filters:
+        raise typer.BadParameter(f"Unknown filters: {', '.join(unknown_filters)}")
+
+    server = None
+    if base_url is None:
+        port = _get_free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        server = start_server(port, server_workers)
+
+    try:
+        if server is not None:
+            wait_for_server(base_url, server)
+        results = asyncio.run(
+            run_benchmark(
+                base_url,
+                brand_id,
+                requests_count,
+                concurrency,
+                filter_names.split(","),
+                endpoint_filter,
+                cache_busting,
+            )
+        )
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    print_report(results)
+    if output is not None:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if baseline is not None:
+        with open(baseline) as f:
+            regressions = find_regressions(results, json.load(f), tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            raise typer.Exit(code=1)
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,1259 @@
+import io
+import json
+import time
+import uuid
+from datetime import date, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import typer
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from structlog import get_logger
+
+from benchmark.config import BRAND_ID
+from benchmark.filters import filters
+
+# Fills a local database with synthetic data shaped like production, so that the queries and the caches can be
+# measured without a copy of the production database (see `benchmark/load_test.py`).
+#
+# The schema of the production database is managed outside of this repository, so the tables below only have the
+# columns the API reads, without foreign keys, and the materialized views are stand-ins computed from the generated
+# tables: they have the columns and roughly the cardinality of the real ones, not their exact definitions. The
+# endpoints reading relations that are not generated (the stock and visibility time series, the homepage and the split
+# of the categories, i.e. `/stock`, `/availability/visible*` and most of `/performance`) fail in the load test.
+
+app = typer.Typer()
+logger = get_logger()
+
+# Each country sells in a single currency: (language, currency)
+COUNTRIES = {
+    "SE": ("sv", "SEK"),
+    "DK": ("da", "DKK"),
+    "NO": ("no", "NOK"),
+    "FI": ("fi", "EUR"),
+    "DE": ("de", "EUR"),
+    "NL": ("nl", "EUR"),
+    "GB": ("en", "GBP"),
+}
+# Value of one unit in SEK, and the country used when converting into the currency
+CURRENCIES = {
+    "SEK": ("SE", 1.0),
+    "EUR": ("DE", 11.5),
+    "DKK": ("DK", 1.54),
+    "NOK": ("NO", 0.98),
+    "GBP": ("GB", 13.4),
+    "CHF": ("CH", 12.1),
+    "USD": ("US", 10.6),
+    "CAD": ("CA", 7.7),
+    "AUD": ("AU", 7.0),
+    "JPY": ("JP", 0.071),
+    "CNY": ("CN", 1.46),
+    "HKD": ("HK", 1.36),
+}
+AVAILABLE_STATUSES = (
+    "in_stock",
+    "in_store_only",
+    "online_only",
+    "limited_availability",
+    "discounted",
+)
+# Share of the matches with each certainty, the views only keep the ones above `auto_high_confidence`
+CERTAINTIES = {
+    "manual_input": 0.05,
+    "auto_high_confidence": 0.8,
+    "auto_low_confidence": 0.1,
+    "not_match": 0.05,
+}
+# Number of cells (offers x days) of the price matrices generated at once
+TIME_SERIES_CHUNK_SIZE = 2_000_000
+
+SCHEMA = """
+    CREATE TYPE availability_status AS ENUM (
+        'back_order', 'discounted', 'in_stock', 'in_store_only', 'limited_availability', 'online_only',
+        'out_of_stock', 'pre_order', 'pre_sale', 'sold_out'
+    );
+    -- Ordered by confidence, the crud layer compares the values, e.g. `certainty >= 'auto_high_confidence'`
+    CREATE TYPE matching_certainty_type AS ENUM (
+        'not_match', 'brand_mismatch', 'auto_low_confidence_skipped', 'auto_low_confidence', 'auto_high_confidence',
+        'manual_input'
+    );
+    CREATE TYPE matching_type AS ENUM ('gtin_join', 'gtin_search', 'image');
+    CREATE TYPE retailer_status AS ENUM ('error', 'warning', 'success');
+    CREATE TYPE image_type AS ENUM ('environmental', 'transparent');
+    CREATE TYPE image_type_model AS ENUM ('heuristics', 'automl', 'manual');
+
+    CREATE TABLE country_to_language (
+        country TEXT UNIQUE,
+        language TEXT,
+        PRIMARY KEY (country, language)
+    );
+    CREATE TABLE currency (
+        name TEXT PRIMARY KEY,
+        country TEXT,
+        to_sek DOUBLE PRECISION,
+        to_eur DOUBLE PRECISION
+    );
+    CREATE TABLE brand (
+        id UUID PRIMARY KEY,
+        name TEXT,
+        url TEXT,
+        default_currency TEXT
+    );
+    CREATE TABLE brand_category (
+        id UUID PRIMARY KEY,
+        brand_id UUID,
+        category_tree JSONB,
+        url TEXT
+    );
+    CREATE TABLE brand_product (
+        id UUID PRIMARY KEY,
+        brand_id UUID,
+        category_id UUID,
+        url TEXT,
+        name TEXT,
+        description TEXT,
+        specifications JSONB,
+        sku TEXT,
+        gtin TEXT,
+        active BOOLEAN NOT NULL DEFAULT TRUE,
+        availability availability_status,
+        created_at TIMESTAMP DEFAULT now(),
+        updated_at TIMESTAMP DEFAULT now()
+    );
+    CREATE TABLE brand_image (
+        id UUID PRIMARY KEY,
+        brand_product_id UUID,
+        url TEXT,
+        image_hash TEXT,
+        processed BOOLEAN,
+        priority INTEGER,
+        is_obsolete BOOLEAN,
+        temp_wrong BOOLEAN
+    );
+    CREATE TABLE brand_image_types (
+        image_id UUID,
+        prediction image_type,
+        model image_type_model,
+        version INTEGER,
+        confidence DOUBLE PRECISION,
+        PRIMARY KEY (image_id, model, version)
+    );
+    CREATE TABLE brand_keywords (
+        product_id UUID,
+        language TEXT,
+        title_keywords JSONB,
+        description_keywords JSONB,
+        specs_keywords JSONB,
+        PRIMARY KEY (product_id, language)
+    );
+    CREATE TABLE msrp (
+        brand_product_id UUID,
+        currency TEXT,
+        country TEXT,
+        price DOUBLE PRECISION,
+        PRIMARY KEY (brand_product_id, currency, country)
+    );
+    CREATE TABLE wholesale_price (
+        brand_product_id UUID,
+        currency TEXT,
+        country TEXT,
+        price DOUBLE PRECISION,
+        PRIMARY KEY (brand_product_id, currency, country)
+    );
+    CREATE TABLE product_group (
+        id UUID PRIMARY KEY,
+        name TEXT,
+        user_id TEXT,
+        brand_id UUID,
+        created_at TIMESTAMP DEFAULT now(),
+        updated_at TIMESTAMP DEFAULT now()
+    );
+    CREATE TABLE product_group_assignation (
+        product_id UUID,
+        product_group_id UUID,
+        PRIMARY KEY (product_id, product_group_id)
+    );
+    CREATE TABLE retailer (
+        id UUID PRIMARY KEY,
+        name TEXT,
+        url TEXT,
+        country TEXT,
+        status retailer_status,
+        retailer_specific_language TEXT,
+        category_page_size INTEGER
+    );
+    CREATE TABLE retailer_to_brand_mapping (
+        retailer_id UUID,
+        brand_id UUID,
+        shallow BOOLEAN DEFAULT FALSE,
+        PRIMARY KEY (retailer_id, brand_id)
+    );
+    -- JSON rather than JSONB, the queries read it with `json_array_elements_text`
+    CREATE TABLE retailer_category (
+        id UUID PRIMARY KEY,
+        retailer_id UUID,
+        category_tree JSON,
+        url TEXT
+    );
+    CREATE TABLE retailer_brand_page (
+        id UUID PRIMARY KEY,
+        retailer_id UUID,
+        brand_name TEXT,
+        url TEXT
+    );
+    CREATE TABLE retailer_product (
+        id UUID PRIMARY KEY,
+        retailer_id UUID,
+        url TEXT,
+        name TEXT,
+        description TEXT,
+        specifications JSONB,
+        sku TEXT,
+        gtin TEXT,
+        popularity_index INTEGER,
+        popularity_category_id UUID,
+        brand_page_id UUID,
+        availability availability_status,
+        price BIGINT,
+        currency TEXT,
+        reviews JSONB,
+        review_average DOUBLE PRECISION,
+        is_discounted BOOLEAN,
+        original_price BIGINT,
+        fetched_at TIMESTAMP,
+        created_at TIMESTAMP,
+        updated_at TIMESTAMP
+    );
+    CREATE TABLE retailer_image (
+        id UUID PRIMARY KEY,
+        retailer_product_id UUID,
+        url TEXT,
+        image_hash TEXT
+    );
+    CREATE TABLE retailer_image_types (
+        image_id UUID,
+        prediction image_type,
+        model image_type_model,
+        version INTEGER,
+        confidence DOUBLE PRECISION,
+        PRIMARY KEY (image_id, model, version)
+    );
+    CREATE TABLE retailer_product_category_mapping (
+        retailer_product_id UUID,
+        retailer_category_id UUID,
+        popularity_index INTEGER,
+        PRIMARY KEY (retailer_product_id, retailer_category_id)
+    );
+    CREATE TABLE retailer_product_time_series (
+        product_id UUID,
+        time TIMESTAMP,
+        price BIGINT,
+        currency TEXT,
+        availability availability_status,
+        PRIMARY KEY (product_id, time)
+    );
+    CREATE TABLE product_matching (
+        id UUID PRIMARY KEY,
+        brand_product_id UUID,
+        retailer_product_id UUID,
+        type matching_type,
+        image_score DOUBLE PRECISION,
+        title_score DOUBLE PRECISION,
+        description_score DOUBLE PRECISION,
+        specs_score DOUBLE PRECISION,
+        text_score DOUBLE PRECISION,
+        certainty matching_certainty_type,
+        temp_wrong BOOLEAN NOT NULL DEFAULT FALSE,
+        created_at TIMESTAMP DEFAULT now(),
+        updated_at TIMESTAMP DEFAULT now()
+    );
+    CREATE TABLE image_matching (
+        id UUID PRIMARY KEY,
+        product_matching_id UUID,
+        brand_image_id UUID,
+        retailer_image_id UUID,
+        distance DOUBLE PRECISION,
+        model_certainty DOUBLE PRECISION,
+        created_at TIMESTAMP DEFAULT now(),
+        updated_at TIMESTAMP DEFAULT now()
+    );
+    CREATE TABLE matching_task (
+        id UUID PRIMARY KEY,
+        brand_product_id UUID,
+        retailer_id UUID,
+        status TEXT,
+        skip_count INTEGER,
+        solutions UUID[],
+        llm_solution JSONB,
+        created_at TIMESTAMP DEFAULT now(),
+        updated_at TIMESTAMP DEFAULT now()
+    );
+    CREATE TABLE comparison_product (
+        id UUID PRIMARY KEY,
+        name TEXT,
+        brand_name TEXT,
+        image_url TEXT,
+        image_processed BOOLEAN
+    );
+    CREATE TABLE comparison_to_brand_product (
+        comparison_product_id UUID,
+        brand_product_id UUID,
+        PRIMARY KEY (comparison_product_id, brand_product_id)
+    );
+    CREATE TABLE comparison_product_matching (
+        comparison_product_id UUID,
+        retailer_product_id UUID,
+        certainty matching_certainty_type,
+        PRIMARY KEY (comparison_product_id, retailer_product_id)
+    );
+    CREATE TABLE api_key (
+        id UUID PRIMARY KEY,
+        client_id UUID,
+        name TEXT NOT NULL,
+        hashed_key BYTEA NOT NULL,
+        encrypted_key BYTEA NOT NULL,
+        masked_key TEXT NOT NULL,
+        created_at TIMESTAMP NOT NULL DEFAULT now(),
+        last_used_at TIMESTAMP NOT NULL DEFAULT now()
+    );
+"""
+
+# Created once the tables are loaded, COPY is faster without them
+INDEXES = """
+    CREATE INDEX ON brand_product (brand_id, category_id);
+    CREATE INDEX ON brand_product (gtin);
+    CREATE INDEX ON brand_image (brand_product_id);
+    CREATE INDEX ON product_group_assignation (product_group_id);
+    CREATE INDEX ON retailer_product (retailer_id);
+    CREATE INDEX ON retailer_product (popularity_category_id);
+    CREATE INDEX ON retailer_image (retailer_product_id);
+    CREATE INDEX ON retailer_product_category_mapping (retailer_category_id);
+    CREATE INDEX ON product_matching (brand_product_id);
+    CREATE INDEX ON product_matching (retailer_product_id);
+    CREATE INDEX ON image_matching (product_matching_id);
+    CREATE INDEX ON image_matching (retailer_image_id);
+    CREATE INDEX ON retailer_product_time_series (time);
+"""
+
+_AVAILABLE_STATUSES_SQL = "(" + ", ".join(f"'{s}'" for s in AVAILABLE_STATUSES) + ")"
+# The retailers fetch their whole catalog every week, the offers not fetched since last week are not available anymore
+_FETCHED_RECENTLY_SQL = "rp.fetched_at >= date_trunc('week', now()) - interval '1 week'"
+_MATCHED_OFFERS_SQL = """
+    retailer_product rp
+        JOIN retailer r ON r.id = rp.retailer_id
+        JOIN product_matching pm ON pm.retailer_product_id = rp.id AND pm.certainty >= 'auto_high_confidence'
+        JOIN brand_product bp ON bp.id = pm.brand_product_id
+"""
+_PREVIOUS_WEEK_PRICE_SQL = """
+    LEFT JOIN LATERAL (
+        SELECT price
+        FROM retailer_product_time_series rpts
+        WHERE rpts.product_id = rp.id
+            AND rpts.time <= rp.fetched_at - interval '7 days'
+            AND rpts.price > 0
+        ORDER BY rpts.time DESC
+        LIMIT 1
+    ) previous ON TRUE
+"""
+
+
+def _price_deviation_matview(name: str, reference_table: str) -> str:
+    return f"""
+        CREATE MATERIALIZED VIEW {name} AS
+        SELECT r.name || ' ' || r.country AS retailer,
+            r.id AS retailer_id,
+            r.country,
+            bp.brand_id,
+            bp.category_id,
+            bp.id AS brand_product_id,
+            date_trunc('week', rpts.time)::date AS time,
+            100.0 * (AVG(rpts.price) - reference.price) / reference.price AS price_deviation
+        FROM retailer_product_time_series rpts
+            JOIN ({_MATCHED_OFFERS_SQL}) ON rp.id = rpts.product_id
+            JOIN {reference_table} reference ON reference.brand_product_id = bp.id
+                AND reference.country = r.country
+                AND reference.currency = rpts.currency
+        WHERE rpts.price > 0
+            AND rpts.availability <> 'out_of_stock'
+            AND reference.price > 0
+        GROUP BY r.id, bp.id, date_trunc('week', rpts.time), reference.price;
+    """
+
+
+MATVIEWS = {
+    "retailer_product_including_unavailable_matview": f"""
+        CREATE MATERIALIZED VIEW retailer_product_including_unavailable_matview AS
+        SELECT rp.id, rp.url, rp.name, rp.description, rp.specifications, rp.sku, rp.gtin,
+            rp.retailer_id,
+            r.name AS retailer_name,
+            r.country,
+            rp.popularity_index,
+            rp.availability,
+            rp.price / 100.0 AS retailer_price,
+            rp.currency,
+            rp.is_discounted,
+            rp.original_price,
+            rp.original_price / 100.0 AS retailer_original_price,
+            rp.review_average,
+            (rp.reviews ->> 'reviewCount')::int AS number_of_reviews,
+            COALESCE(ri.images_count, 0) AS retailer_images_count,
+            COALESCE(bi.images_count, 0) AS brand_images_count,
+            pm.title_score, pm.description_score, pm.specs_score, pm.text_score, pm.image_score,
+            CASE
+                WHEN pm.text_score IS NULL THEN pm.image_score
+                WHEN pm.image_score IS NULL THEN pm.text_score
+                ELSE (pm.image_score + pm.text_score) / 2
+            END AS content_score,
+            0 AS transparent_images_count,
+            0 AS obsolete_images_count,
+            0 AS environmental_images_count,
+            wp.price / 100.0 AS wholesale_price,
+            wp.currency AS wholesale_currency,
+            rp.price / NULLIF(wp.price, 0) AS markup_factor,
+            rp.availability IN {_AVAILABLE_STATUSES_SQL} AS in_stock,
+            bp.id AS matched_brand_product_id,
+            bp.brand_id,
+            bp.category_id AS brand_category_id,
+            COALESCE(bp.availability = 'in_stock', TRUE) AS brand_in_stock,
+            {_FETCHED_RECENTLY_SQL} AS available_at_retailer,
+            (SELECT string_agg(value ->> 'name', ' > ') FROM json_array_elements(rc.category_tree))
+                AS retailer_category_name,
+            rp.fetched_at,
+            rp.created_at,
+            bp.sku AS brand_sku,
+            m.price / 100.0 AS msrp,
+            m.currency AS msrp_currency,
+            100.0 * (rp.price - m.price) / NULLIF(m.price, 0) AS price_deviation,
+            CEIL(rp.popularity_index / r.category_page_size::float)::int AS category_page_number,
+            CEIL(rcc.products_count / r.category_page_size::float)::int AS category_pages_count,
+            rcc.products_count AS category_products_count,
+            CASE
+                WHEN NOT {_FETCHED_RECENTLY_SQL} THEN 'Removed'
+                WHEN rp.availability IN {_AVAILABLE_STATUSES_SQL} THEN 'In stock'
+                ELSE 'Out of stock'
+            END AS product_retailer_status
+        FROM {_MATCHED_OFFERS_SQL}
+            LEFT JOIN retailer_category rc ON rc.id = rp.popularity_category_id
+            LEFT JOIN msrp m ON m.brand_product_id = bp.id AND m.country = r.country
+            LEFT JOIN wholesale_price wp ON wp.brand_product_id = bp.id AND wp.country = r.country
+            LEFT JOIN (
+                SELECT retailer_product_id, COUNT(DISTINCT image_hash) AS images_count
+                FROM retailer_image
+                GROUP BY retailer_product_id
+            ) ri ON ri.retailer_product_id = rp.id
+            LEFT JOIN (
+                SELECT brand_product_id, COUNT(*) FILTER (WHERE image_hash IS NOT NULL) AS images_count
+                FROM brand_image
+                GROUP BY brand_product_id
+            ) bi ON bi.brand_product_id = bp.id
+            LEFT JOIN (
+                SELECT retailer_category_id, COUNT(*) AS products_count
+                FROM retailer_product_category_mapping
+                GROUP BY retailer_category_id
+            ) rcc ON rcc.retailer_category_id = rc.id;
+        CREATE UNIQUE INDEX ON retailer_product_including_unavailable_matview (id);
+        CREATE INDEX ON retailer_product_including_unavailable_matview (brand_id, matched_brand_product_id);
+    """,
+    "msrp_deviation_matview": f"""
+        {_price_deviation_matview("msrp_deviation_matview", "msrp")}
+        CREATE INDEX ON msrp_deviation_matview (brand_id, time);
+    """,
+    "wholesale_deviation_matview": f"""
+        {_price_deviation_matview("wholesale_deviation_matview", "wholesale_price")}
+        CREATE INDEX ON wholesale_deviation_matview (brand_id, time);
+    """,
+    "average_price_deviation_matview": f"""
+        CREATE MATERIALIZED VIEW average_price_deviation_matview AS
+        WITH weekly_price AS (
+            SELECT r.name || ' ' || r.country AS retailer,
+                r.id AS retailer_id,
+                r.country,
+                bp.brand_id,
+                bp.category_id,
+                bp.id AS brand_product_id,
+                date_trunc('week', rpts.time)::date AS time,
+                AVG(rpts.price) AS price
+            FROM retailer_product_time_series rpts
+                JOIN ({_MATCHED_OFFERS_SQL}) ON rp.id = rpts.product_id
+            WHERE rpts.price > 0 AND rpts.availability <> 'out_of_stock'
+            GROUP BY r.id, bp.id, date_trunc('week', rpts.time)
+        )
+        SELECT retailer, retailer_id, country, brand_id, category_id, brand_product_id, time,
+            100.0 * (price - AVG(price) OVER market) / AVG(price) OVER market AS price_deviation
+        FROM weekly_price
+        WINDOW market AS (PARTITION BY brand_product_id, country, time);
+        CREATE INDEX ON average_price_deviation_matview (brand_id, time);
+    """,
+    "price_changes_matview": f"""
+        CREATE MATERIALIZED VIEW price_changes_matview AS
+        SELECT r.id AS retailer_id,
+            r.name AS retailer_name,
+            bp.name AS product_name,
+            bp.id AS brand_product_id,
+            bp.sku,
+            bp.brand_id,
+            bp.category_id AS brand_category_id,
+            (rp.price - previous.price)::float / previous.price AS price_diff
+        FROM {_MATCHED_OFFERS_SQL}
+            {_PREVIOUS_WEEK_PRICE_SQL}
+        WHERE rp.price > 0
+            AND previous.price IS NOT NULL
+            AND {_FETCHED_RECENTLY_SQL};
+        CREATE INDEX ON price_changes_matview (brand_id);
+    """,
+    "retailer_pricing_overview_matview": f"""
+        CREATE MATERIALIZED VIEW retailer_pricing_overview_matview AS
+        SELECT rp.id,
+            rp.retailer_id,
+            bp.brand_id,
+            bp.id AS matched_brand_product_id,
+            rp.price,
+            rp.currency,
+            COALESCE(previous.price <> rp.price, FALSE) AS price_changed
+        FROM {_MATCHED_OFFERS_SQL}
+            {_PREVIOUS_WEEK_PRICE_SQL}
+        WHERE {_FETCHED_RECENTLY_SQL};
+        CREATE INDEX ON retailer_pricing_overview_matview (brand_id);
+    """,
+    "retailer_product_per_week_matview": f"""
+        CREATE MATERIALIZED VIEW retailer_product_per_week_matview AS
+        SELECT bp.brand_id,
+            bp.category_id AS brand_category_id,
+            r.id AS retailer_id,
+            r.name AS retailer_name,
+            r.country AS retailer_country,
+            bp.id AS brand_product_id,
+            date_trunc('week', rpts.time)::date AS time,
+            pm.image_score,
+            pm.text_score
+        FROM retailer_product_time_series rpts
+            JOIN ({_MATCHED_OFFERS_SQL}) ON rp.id = rpts.product_id
+            JOIN retailer_to_brand_mapping rtbm ON rtbm.retailer_id = r.id AND rtbm.brand_id = bp.brand_id
+        WHERE NOT rtbm.shallow
+        GROUP BY rp.id, r.id, bp.id, pm.id, date_trunc('week', rpts.time);
+        CREATE INDEX ON retailer_product_per_week_matview (brand_id, time);
+    """,
+    "full_product_status_by_retailer_matview": f"""
+        CREATE MATERIALIZED VIEW full_product_status_by_retailer_matview AS
+        SELECT bp.brand_id,
+            bp.category_id AS brand_category_id,
+            rtbm.retailer_id,
+            bp.id AS brand_product_id,
+            CASE
+                WHEN offer.in_stock IS NULL THEN 'Not found'
+                WHEN offer.in_stock THEN 'In stock'
+                ELSE 'Out of stock'
+            END AS status
+        FROM brand_product bp
+            JOIN retailer_to_brand_mapping rtbm ON rtbm.brand_id = bp.brand_id AND NOT rtbm.shallow
+            LEFT JOIN (
+                SELECT bp.id AS brand_product_id,
+                    rp.retailer_id,
+                    bool_or(rp.availability IN {_AVAILABLE_STATUSES_SQL}) AS in_stock
+                FROM {_MATCHED_OFFERS_SQL}
+                WHERE {_FETCHED_RECENTLY_SQL}
+                GROUP BY bp.id, rp.retailer_id
+            ) offer ON offer.brand_product_id = bp.id AND offer.retailer_id = rtbm.retailer_id
+        WHERE bp.active;
+        CREATE INDEX ON full_product_status_by_retailer_matview (brand_id);
+    """,
+    "rp_brand_fixed_matview": f"""
+        CREATE MATERIALIZED VIEW rp_brand_fixed_matview AS
+        SELECT rp.id,
+            bp.brand_id,
+            bp.category_id AS brand_category_id,
+            bp.id AS brand_product_id
+        FROM {_MATCHED_OFFERS_SQL};
+        CREATE INDEX ON rp_brand_fixed_matview (id);
+        CREATE INDEX ON rp_brand_fixed_matview (brand_id);
+    """,
+}
+
+# A plain view in production too, read by the price table
+BRAND_PRODUCT_MSRP_VIEW = f"""
+    CREATE VIEW brand_product_msrp_view AS
+    SELECT bp.id AS brand_product_id, bp.name, bp.gtin, bp.sku, bp.category_id, bp.brand_id,
+        m.price / 100.0 AS msrp_standard,
+        m.currency AS msrp_currency,
+        m.country AS msrp_country,
+        bi.id AS image_id,
+        bi.url AS image_url,
+        COALESCE(offers.offers, ARRAY[]::jsonb[]) AS offers
+    FROM brand_product bp
+        JOIN msrp m ON m.brand_product_id = bp.id
+        LEFT JOIN LATERAL (
+            SELECT id, url
+            FROM brand_image
+            WHERE brand_product_id = bp.id
+            ORDER BY priority ASC
+            LIMIT 1
+        ) bi ON TRUE
+        LEFT JOIN LATERAL (
+            SELECT array_agg(jsonb_build_object(
+                'retailer_id', r.id,
+                'product_name', rp.name,
+                'retailer_name', r.name,
+                'price', rp.price / 100.0,
+                'currency', rp.currency,
+                'price_msrp_currency', rp.price / 100.0,
+                'price_deviation', 100.0 * (rp.price - m.price) / NULLIF(m.price, 0),
+                'url', rp.url,
+                'in_stock', rp.availability IN {_AVAILABLE_STATUSES_SQL}
+            )) AS offers
+            FROM {_MATCHED_OFFERS_SQL}
+            WHERE pm.brand_product_id = bp.id
+                AND r.country = m.country
+                AND rp.price > 0
+                AND {_FETCHED_RECENTLY_SQL}
+        ) offers ON TRUE
+    WHERE bp.active;
+"""
+
+_TABLES = [
+    "country_to_language",
+    "currency",
+    "brand",
+    "brand_category",
+    "brand_product",
+    "brand_image",
+    "brand_image_types",
+    "brand_keywords",
+    "msrp",
+    "wholesale_price",
+    "product_group",
+    "product_group_assignation",
+    "retailer",
+    "retailer_to_brand_mapping",
+    "retailer_category",
+    "retailer_brand_page",
+    "retailer_product",
+    "retailer_image",
+    "retailer_image_types",
+    "retailer_product_category_mapping",
+    "retailer_product_time_series",
+    "product_matching",
+    "image_matching",
+    "matching_task",
+    "comparison_product",
+    "comparison_to_brand_product",
+    "comparison_product_matching",
+    "api_key",
+]
+_TYPES = [
+    "availability_status",
+    "matching_certainty_type",
+    "matching_type",
+    "retailer_status",
+    "image_type",
+    "image_type_model",
+]
+
+
+def _uuids(rng: np.random.Generator, count: int) -> np.ndarray:
+    raw = rng.bytes(16 * count)
+    return np.array(
+        [
+            str(uuid.UUID(bytes=raw[i * 16 : (i + 1) * 16], version=4))
+            for i in range(count)
+        ],
+        dtype=object,
+    )
+
+
+def _fixed_uuids(
+    rng: np.random.Generator, count: int, known_ids: List[str]
+) -> np.ndarray:
+    """
+    Random ids, starting with the known ones, so that the filters of `benchmark/filters.py` select generated data.
+    """
+    ids = _uuids(rng, count)
+    known_ids = known_ids[:count]
+    ids[: len(known_ids)] = known_ids
+    return ids
+
+
+def _category_tree(*names: str) -> str:
+    return json.dumps([{"name": name} for name in names])
+
+
+def generate_reference_frames(
+    rng: np.random.Generator, brands_count: int, retailers_count: int
+) -> Dict[str, pd.DataFrame]:
+    """
+    The tables shared by all the brands: the currencies, the retailers and their categories, and the brands.
+    """
+    frames = {
+        "country_to_language": pd.DataFrame(
+            [(c, language) for c, (language, _) in COUNTRIES.items()],
+            columns=["country", "language"],
+        ),
+        "currency": pd.DataFrame(
+            [
+                (name, country, to_sek, to_sek / CURRENCIES["EUR"][1])
+                for name, (country, to_sek) in CURRENCIES.items()
+            ],
+            columns=["name", "country", "to_sek", "to_eur"],
+        ),
+    }
+
+    countries = list(COUNTRIES)
+    retailer_ids = _fixed_uuids(rng, retailers_count, filters["retailers"]["retailers"])
+    frames["retailer"] = pd.DataFrame(
+        {
+            "id": retailer_ids,
+            "name": [f"Retailer {i}" for i in range(retailers_count)],
+            "url": [
+                f"https://retailer-{i}.example.com" for i in range(retailers_count)
+            ],
+            "country": [countries[i % len(countries)] for i in range(retailers_count)],
+            "status": rng.choice(
+                ["success", "warning", "error"], retailers_count, p=[0.9, 0.08, 0.02]
+            ),
+            "retailer_specific_language": None,
+            "category_page_size": rng.choice([24, 36, 48], retailers_count),
+        }
+    )
+
+    brand_ids = _fixed_uuids(rng, brands_count, [BRAND_ID])
+    frames["brand"] = pd.DataFrame(
+        {
+            "id": brand_ids,
+            "name": [f"Brand {i}" for i in range(brands_count)],
+            "url": [f"https://brand-{i}.example.com" for i in range(brands_count)],
+            "default_currency": rng.choice(["SEK", "EUR", "DKK"], brands_count),
+        }
+    )
+    frames["retailer_to_brand_mapping"] = pd.DataFrame(
+        {
+            "retailer_id": np.repeat(retailer_ids, brands_count),
+            "brand_id": np.tile(brand_ids, retailers_count),
+            # Some retailers are only indexed through their search pages
+            "shallow": np.repeat(np.arange(retailers_count) % 5 == 4, brands_count),
+        }
+    )
+    frames["retailer_brand_page"] = pd.DataFrame(
+        columns=["id", "retailer_id", "brand_name", "url"]
+    )
+
+    return frames
+
+
+def generate_retailer_categories(
+    rng: np.random.Generator, retailers: pd.DataFrame, categories_count: int
+) -> pd.DataFrame:
+    retailers_count = len(retailers)
+    return pd.DataFrame(
+        {
+            "id": _uuids(rng, retailers_count * categories_count),
+            "retailer_id": np.repeat(retailers["id"].values, categories_count),
+            "category_tree": [
+                _category_tree("Home", f"Category {c}")
+                for _ in range(retailers_count)
+                for c in range(categories_count)
+            ],
+            "url": [
+                f"{url}/category-{c}"
+                for url in retailers["url"]
+                for c in range(categories_count)
+            ],
+        }
+    )
+
+
+def generate_brand_catalog(
+    rng: np.random.Generator,
+    brand_index: int,
+    brand_id: str,
+    products_count: int,
+    categories_count: int,
+    groups_count: int,
+) -> Dict[str, pd.DataFrame]:
+    """
+    The products of a brand, with their images, their groups and their recommended prices in every country.
+    """
+    is_benchmarked_brand = brand_id == BRAND_ID
+    category_ids = _fixed_uuids(
+        rng,
+        categories_count,
+        filters["categories"]["categories"] if is_benchmarked_brand else [],
+    )
+    group_ids = _fixed_uuids(
+        rng, groups_count, filters["groups"]["groups"] if is_benchmarked_brand else []
+    )
+    product_ids = _uuids(rng, products_count)
+    product_categories = rng.integers(0, categories_count, products_count)
+
+    frames = {
+        "brand_category": pd.DataFrame(
+            {
+                "id": category_ids,
+                "brand_id": brand_id,
+                "category_tree": [
+                    _category_tree("Home", f"Brand {brand_index} category {c}")
+                    for c in range(categories_count)
+                ],
+                "url": None,
+            }
+        ),
+        "brand_product": pd.DataFrame(
+            {
+                "id": product_ids,
+                "brand_id": brand_id,
+                "category_id": category_ids[product_categories],
+                "url": [
+                    f"https://brand-{brand_index}.example.com/products/{i}"
+                    for i in range(products_count)
+                ],
+                "name": [
+                    f"Product {i} of brand {brand_index}" for i in range(products_count)
+                ],
+                "description": "A product generated for the benchmarks",
+                "specifications": "[]",
+                "sku": [f"B{brand_index:03d}-{i:07d}" for i in range(products_count)],
+                "gtin": [f"{brand_index:04d}{i:09d}" for i in range(products_count)],
+                "active": rng.random(products_count) < 0.95,
+                "availability": rng.choice(
+                    ["in_stock", "out_of_stock"], products_count, p=[0.9, 0.1]
+                ),
+            }
+        ),
+        "product_group": pd.DataFrame(
+            {
+                "id": group_ids,
+                "name": [f"Group {g}" for g in range(groups_count)],
+                "user_id": "benchmark",
+                "brand_id": brand_id,
+            }
+        ),
+    }
+
+    in_group = rng.random((products_count, groups_count)) < 0.05
+    product_indexes, group_indexes = np.nonzero(in_group)
+    frames["product_group_assignation"] = pd.DataFrame(
+        {
+            "product_id": product_ids[product_indexes],
+            "product_group_id": group_ids[group_indexes],
+        }
+    )
+
+    images_count = rng.integers(1, 6, products_count)
+    image_products = np.repeat(np.arange(products_count), images_count)
+    image_ids = _uuids(rng, len(image_products))
+    processed = rng.random(len(image_products)) < 0.9
+    frames["brand_image"] = pd.DataFrame(
+        {
+            "id": image_ids,
+            "brand_product_id": product_ids[image_products],
+            "url": [f"https://images.example.com/{i}.jpg" for i in image_ids],
+            "image_hash": np.where(
+                processed, [i.replace("-", "")[:16] for i in image_ids], None
+            ),
+            "processed": processed,
+            "priority": np.concatenate([np.arange(c) for c in images_count]),
+            "is_obsolete": False,
+            "temp_wrong": False,
+        }
+    )
+    frames["brand_image_types"] = generate_image_types(rng, image_ids)
+
+    # The recommended price of each product in every country, in minor units of the local currency
+    base_price_eur = np.round(rng.lognormal(np.log(300), 0.9, products_count))
+    msrp_rows = []
+    for country, (_, currency) in COUNTRIES.items():
+        rate = CURRENCIES["EUR"][1] / CURRENCIES[currency][1]
+        msrp_rows.append(
+            pd.DataFrame(
+                {
+                    "brand_product_id": product_ids,
+                    "currency": currency,
+                    "country": country,
+                    "price": np.round(base_price_eur * rate) * 100,
+                }
+            )
+        )
+    frames["msrp"] = pd.concat(msrp_rows, ignore_index=True)
+    frames["wholesale_price"] = frames["msrp"].assign(
+        price=np.round(frames["msrp"]["price"] * 0.5)
+    )
+
+    return frames
+
+
+def generate_offers(
+    rng: np.random.Generator,
+    catalog: Dict[str, pd.DataFrame],
+    retailers: pd.DataFrame,
+    retailer_categories: pd.DataFrame,
+    coverage: float,
+    dates: np.ndarray,
+) -> Iterator[Dict[str, pd.DataFrame]]:
+    """
+    The offers of the retailers for the products of a brand, with their matches and their daily prices, in chunks
+    small enough to be held in memory.
+
+    :param coverage: The share of the retailers selling each product
+    :param dates: The days of the time series, in ascending order
+    """
+    products = catalog["brand_product"]
+    main_images = catalog["brand_image"].groupby("brand_product_id")["id"].first()
+    msrp = catalog["msrp"].set_index(["brand_product_id", "country"])["price"]
+    categories_by_retailer = (
+        retailer_categories.groupby("retailer_id", sort=False)["id"]
+        .apply(lambda ids: ids.values)
+        .to_dict()
+    )
+
+    carried = rng.random((len(products), len(retailers))) < coverage
+    product_indexes, retailer_indexes = np.nonzero(carried)
+    days_count = len(dates)
+    chunk_size = max(1, TIME_SERIES_CHUNK_SIZE // days_count)
+
+    for start in range(0, len(product_indexes), chunk_size):
+        chunk_products = products.iloc[product_indexes[start : start + chunk_size]]
+        chunk_retailers = retailers.iloc[retailer_indexes[start : start + chunk_size]]
+        count = len(chunk_products)
+        offer_ids = _uuids(rng, count)
+        countries = chunk_retailers["country"].values
+        currencies = np.array([COUNTRIES[c][1] for c in countries], dtype=object)
+
+        # Most offers are listed for the whole period, some appear later and some are removed before the end
+        first_days = np.where(
+            rng.random(count) < 0.7, 0, rng.integers(0, days_count // 2 + 1, count)
+        )
+        last_days = np.where(
+            rng.random(count) < 0.85,
+            days_count - 1,
+            rng.integers(first_days, days_count),
+        )
+        days = np.arange(days_count)
+        listed = (days >= first_days[:, None]) & (days <= last_days[:, None])
+
+        # The prices change a few times a month, around the recommended price
+        reference_prices = msrp.reindex(
+            pd.MultiIndex.from_arrays([chunk_products["id"].values, countries])
+        ).values
+        changes = np.where(
+            rng.random((count, days_count)) < 0.03,
+            rng.choice([0.8, 0.9, 0.95, 1.05, 1.1], (count, days_count)),
+            1.0,
+        )
+        prices = np.clip(
+            reference_prices[:, None]
+            * rng.uniform(0.85, 1.05, count)[:, None]
+            * np.cumprod(changes, axis=1),
+            0.5 * reference_prices[:, None],
+            1.5 * reference_prices[:, None],
+        )
+        prices = (np.round(prices / 100) * 100).astype(np.int64)
+        out_of_stock = np.repeat(
+            rng.random((count, days_count // 7 + 1)) < 0.07, 7, axis=1
+        )[:, :days_count]
+        availability = np.where(out_of_stock, "out_of_stock", "in_stock")
+
+        rows, columns = np.nonzero(listed)
+        frames = {
+            "retailer_product_time_series": pd.DataFrame(
+                {
+                    "product_id": offer_ids[rows],
+                    "time": dates[columns],
+                    "price": prices[rows, columns],
+                    "currency": currencies[rows],
+                    "availability": availability[rows, columns],
+                }
+            )
+        }
+
+        current = np.arange(count), last_days
+        is_discounted = rng.random(count) < 0.1
+        category_ids = np.array(
+            [
+                categories[i % len(categories)]
+                for categories, i in zip(
+                    chunk_retailers["id"].map(categories_by_retailer),
+                    rng.integers(0, 1000, count),
+                )
+            ],
+            dtype=object,
+        )
+        popularity_indexes = rng.integers(1, 300, count)
+        reviews_count = rng.poisson(5, count)
+        frames["retailer_product"] = pd.DataFrame(
+            {
+                "id": offer_ids,
+                "retailer_id": chunk_retailers["id"].values,
+                "url": [
+                    f"{url}/p/{i}" for url, i in zip(chunk_retailers["url"], offer_ids)
+                ],
+                "name": chunk_products["name"].values,
+                "description": chunk_products["description"].values,
+                "specifications": "[]",
+                "sku": [i[:8] for i in offer_ids],
+                "gtin": np.where(
+                    rng.random(count) < 0.8, chunk_products["gtin"].values, None
+                ),
+                "popularity_index": popularity_indexes,
+                "popularity_category_id": category_ids,
+                "brand_page_id": None,
+                "availability": availability[current],
+                "price": prices[current],
+                "currency": currencies,
+                "reviews": [json.dumps({"reviewCount": int(c)}) for c in reviews_count],
+                "review_average": np.where(
+                    reviews_count > 0, np.round(rng.uniform(2.5, 5, count), 1), np.nan
+                ),
+                "is_discounted": is_discounted,
+                "original_price": np.where(
+                    is_discounted,
+                    (np.round(prices[current] * 1.2 / 100) * 100).astype(np.int64),
+                    prices[current],
+                ),
+                "fetched_at": dates[last_days],
+                "created_at": dates[first_days],
+                "updated_at": dates[last_days],
+            }
+        )
+        frames["retailer_product_category_mapping"] = pd.DataFrame(
+            {
+                "retailer_product_id": offer_ids,
+                "retailer_category_id": category_ids,
+                "popularity_index": popularity_indexes,
+            }
+        )
+
+        scores = np.round(rng.uniform(0.3, 1, (count, 5)), 3)
+        frames["product_matching"] = pd.DataFrame(
+            {
+                "id": _uuids(rng, count),
+                "brand_product_id": chunk_products["id"].values,
+                "retailer_product_id": offer_ids,
+                "type": rng.choice(["gtin_join", "gtin_search", "image"], count),
+                "image_score": scores[:, 0],
+                "title_score": scores[:, 1],
+                "description_score": scores[:, 2],
+                "specs_score": scores[:, 3],
+                "text_score": scores[:, 4],
+                "certainty": rng.choice(
+                    list(CERTAINTIES), count, p=list(CERTAINTIES.values())
+                ),
+            }
+        )
+
+        images_count = rng.integers(0, 5, count)
+        image_offers = np.repeat(np.arange(count), images_count)
+        image_ids = _uuids(rng, len(image_offers))
+        frames["retailer_image"] = pd.DataFrame(
+            {
+                "id": image_ids,
+                "retailer_product_id": offer_ids[image_offers],
+                "url": [f"https://images.example.com/{i}.jpg" for i in image_ids],
+                "image_hash": [i.replace("-", "")[:16] for i in image_ids],
+            }
+        )
+        frames["retailer_image_types"] = generate_image_types(rng, image_ids)
+
+        # Most images are matched to the main image of the brand product
+        matched = rng.random(len(image_ids)) < 0.6
+        matched_offers = image_offers[matched]
+        frames["image_matching"] = pd.DataFrame(
+            {
+                "id": _uuids(rng, len(matched_offers)),
+                "product_matching_id": frames["product_matching"]["id"].values[
+                    matched_offers
+                ],
+                "brand_image_id": main_images.reindex(
+                    chunk_products["id"].values[matched_offers]
+                ).values,
+                "retailer_image_id": image_ids[matched],
+                "distance": np.round(rng.uniform(0, 0.3, len(matched_offers)), 3),
+                "model_certainty": np.round(
+                    rng.uniform(0.5, 1, len(matched_offers)), 3
+                ),
+            }
+        )
+
+        yield frames
+
+
+def generate_image_types(
+    rng: np.random.Generator, image_ids: np.ndarray
+) -> pd.DataFrame:
+    """
+    The type predictions of the images: most of them are classified by the model, some by the heuristics as well.
+    """
+    frames = []
+    for model, share in [("automl", 0.9), ("heuristics", 0.4)]:
+        predicted_ids = image_ids[rng.random(len(image_ids)) < share]
+        frames.append(
+            pd.DataFrame(
+                {
+                    "image_id": predicted_ids,
+                    "prediction": rng.choice(
+                        ["environmental", "transparent"], len(predicted_ids)
+                    ),
+                    "model": model,
+                    "version": 1,
+                    "confidence": np.round(rng.uniform(0.5, 1, len(predicted_ids)), 3),
+                }
+            )
+        )
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def copy_frame(cursor, table: str, frame: pd.DataFrame):
+    if frame.empty:
+        return
+
+    buffer = io.StringIO()
+    frame.to_csv(buffer, index=False, header=False, na_rep=r"\N")
+    buffer.seek(0)
+    cursor.copy_expert(
+        f"COPY {table} ({', '.join(frame.columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+        buffer,
+    )
+
+
+def _check_local_database(database_url: str):
+    # Unix sockets have no host
+    host = make_url(database_url).host
+    if host not in (None, "localhost", "127.0.0.1", "::1"):
+        raise typer.BadParameter(
+            f"The database on {host} does not look local, use --allow-remote if it really is a throwaway database"
+        )
+
+
+def reset_schema(cursor):
+    cursor.execute("DROP VIEW IF EXISTS brand_product_msrp_view CASCADE;")
+    for matview in MATVIEWS:
+        cursor.execute(f"DROP MATERIALIZED VIEW IF EXISTS {matview} CASCADE;")
+    for table in _TABLES:
+        cursor.execute(f"DROP TABLE IF EXISTS {table} CASCADE;")
+    for type_name in _TYPES:
+        cursor.execute(f"DROP TYPE IF EXISTS {type_name} CASCADE;")
+
+
+def _get_dates(end_date: date, days_count: int) -> np.ndarray:
+    return np.arange(
+        np.datetime64(end_date - timedelta(days=days_count - 1)),
+        np.datetime64(end_date + timedelta(days=1)),
+        dtype="datetime64[D]",
+    )
+
+
+@app.command()
+def seed(
+    brands: int = typer.Option(5, help="The number of brands"),
+    products_per_brand: int = typer.Option(2000),
+    retailers: int = typer.Option(20),
+    days: int = typer.Option(365, help="The length of the price history"),
+    coverage: float = typer.Option(
+        0.3, help="The share of the retailers selling each product"
+    ),
+    categories_per_brand: int = typer.Option(20),
+    categories_per_retailer: int = typer.Option(10),
+    groups_per_brand: int = typer.Option(5),
+    end_date: Optional[str] = typer.Option(
+        None, help="The last day of the price history, today by default"
+    ),
+    random_seed: int = typer.Option(0, help="The same seed always gives the same data"),
+    database_url: Optional[str] = typer.Option(
+        None,
+        help="By default, the database configured in the environment of the API (`DB_HOST`, `DB_NAME`, ...)",
+    ),
+    reset: bool = typer.Option(
+        False, help="Drop the generated tables and views first, if they exist"
+    ),
+    allow_remote: bool = typer.Option(False),
+):
+    """
+    Creates the tables read by the API and fills them with synthetic data, e.g. for the scale of production:
+
+        python -m benchmark.seed --brands 50 --products-per-brand 20000 --days 730
+
+    The first brand is `BENCHMARK_BRAND_ID` and has the retailers, categories and groups of `benchmark/filters.py`,
+    so that the load test can be run against the generated database as is.
+    """
+    if database_url is None:
+        from app.database import SQLALCHEMY_DATABASE_URL
+
+        database_url = SQLALCHEMY_DATABASE_URL
+    if not allow_remote:
+        _check_local_database(database_url)
+
+    rng = np.random.default_rng(random_seed)
+    dates = _get_dates(date.fromisoformat(end_date) if end_date else date.today(), days)
+    connection = create_engine(database_url).raw_connection()
+    try:
+        cursor = connection.cursor()
+        if reset:
+            reset_schema(cursor)
+        else:
+            cursor.execute("SELECT to_regclass('brand') IS NOT NULL;")
+            if cursor.fetchone()[0]:
+                raise typer.BadParameter(
+                    "The database already has a brand table, use --reset to replace the generated data"
+                )
+        cursor.execute(SCHEMA)
+
+        reference = generate_reference_frames(rng, brands, retailers)
+        reference["retailer_category"] = generate_retailer_categories(
+            rng, reference["retailer"], categories_per_retailer
+        )
+        for table, frame in reference.items():
+            copy_frame(cursor, table, frame)
+        connection.commit()
+
+        for brand_index, brand_id in enumerate(reference["brand"]["id"]):
+            start = time.perf_counter()
+            catalog = generate_brand_catalog(
+                rng,
+                brand_index,
+                brand_id,
+                products_per_brand,
+                categories_per_brand,
+                groups_per_brand,
+            )
+            for table, frame in catalog.items():
+                copy_frame(cursor, table, frame)
+
+            offers_count = 0
+            for chunk in generate_offers(
+                rng,
+                catalog,
+                reference["retailer"],
+                reference["retailer_category"],
+                coverage,
+                dates,
+            ):
+                for table, frame in chunk.items():
+                    copy_frame(cursor, table, frame)
+                offers_count += len(chunk["retailer_product"])
+            connection.commit()
+            logger.info(
+                "Brand generated",
+                brand_id=brand_id,
+                products_count=products_per_brand,
+                offers_count=offers_count,
+                seconds=round(time.perf_counter() - start, 1),
+            )
+
+        start = time.perf_counter()
+        cursor.execute(INDEXES)
+        for matview, statement in MATVIEWS.items():
+            cursor.execute(statement)
+            logger.info(f"{matview} created")
+        cursor.execute(BRAND_PRODUCT_MSRP_VIEW)
+        connection.commit()
+        logger.info("Views created", seconds=round(time.perf_counter() - start, 1))
+
+        # The planner needs the statistics of the new tables to pick the same plans as in production
+        cursor.execute("ANALYZE;")
+        connection.commit()
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    app()
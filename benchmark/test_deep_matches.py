@@ -0,0 +1,55 @@
+import pytest
+import requests
+
+from .config import BASE_URL, AUTH_HEADERS
+from .endpoints import BenchmarkedEndpoint, build_body
+from .filters import filters
+
+# `/products/brand/{id}/matches` on the products sold by the most retailers, the ones for which the page of a product
+# is the slowest to load. A generated database has such products with e.g.:
+#
+#     python -m benchmark.seed --brands 1 --products-per-brand 300 --retailers 48 --coverage 0.75 --days 30
+MIN_RETAILERS_COUNT = 30
+
+
+@pytest.fixture(scope="module")
+def widely_matched_product_ids():
+    body = {
+        **build_body(
+            BenchmarkedEndpoint("POST", "/products/brand", "page"), filters["none"], 0
+        ),
+        "page_size": 5,
+        "sorting": {"column": "retailers_count", "direction": "desc"},
+    }
+    response = requests.post(
+        f"{BASE_URL}/products/brand", headers=AUTH_HEADERS, json=body
+    )
+    assert response.status_code in range(200, 300)
+
+    product_ids = [
+        row["id"]
+        for row in response.json()["rows"]
+        if row["retailers_count"] >= MIN_RETAILERS_COUNT
+    ]
+    if not product_ids:
+        pytest.skip(
+            f"No product of the brand is sold by {MIN_RETAILERS_COUNT} retailers"
+        )
+
+    return product_ids
+
+
+@pytest.mark.parametrize("payload", filters.values())
+def test_post_deep_matches(benchmark, widely_matched_product_ids, payload):
+    def get_matches():
+        return [
+            requests.post(
+                f"{BASE_URL}/products/brand/{product_id}/matches",
+                headers=AUTH_HEADERS,
+                json=payload,
+            )
+            for product_id in widely_matched_product_ids
+        ]
+
+    responses = benchmark(get_matches)
+    assert all(r.status_code in range(200, 300) for r in responses)
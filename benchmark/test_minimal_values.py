@@ -0,0 +1,28 @@
+import random
+
+import pytest
+
+from app.crud.utils import extract_minimal_values
+from tests.crud.test_crud_utils import (
+    generate_retailers,
+    previous_extract_minimal_values,
+)
+
+# Unlike the other benchmarks, no API is needed: the area under the price chart of `/products/brand/{id}/prices` is
+# computed for a product sold by many retailers, over a multi-year daily history.
+
+
+@pytest.fixture(scope="module")
+def retailers():
+    return generate_retailers(
+        random.Random(0), 60, 3 * 365, same_start=True, null_probability=0.02
+    )
+
+
+@pytest.mark.parametrize(
+    "implementation",
+    [extract_minimal_values, previous_extract_minimal_values],
+    ids=["grid", "previous"],
+)
+def test_extract_minimal_values(benchmark, retailers, implementation):
+    benchmark(implementation, retailers)
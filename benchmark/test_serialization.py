@@ -0,0 +1,106 @@
+import asyncio
+import random
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+# The relationships of the entities can only be resolved once all of them are imported
+import app.models.groups  # noqa: F401
+from app.models.retailer import MockRetailerProductGridItem as RetailerProductGridItem
+from app.schemas.product import (
+    MockRetailerProductGridItem,
+    MockRetailerProductGridItemV21,
+    RetailerOffersPage,
+)
+from app.service.serialization import TrustedJSONResponse, to_trusted_rows
+
+# Unlike the other benchmarks, no API is needed: a page of 500 rows of `/products/retailers` is turned into a
+# response, validated by the response model as FastAPI does or trusted.
+
+
+@pytest.fixture(scope="module")
+def products():
+    rng = random.Random(0)
+    now = datetime(2024, 6, 1, 12)
+    return [
+        RetailerProductGridItem(
+            id=uuid.uuid4(),
+            url=f"https://retailer.example/products/{i}",
+            name=f"Product {i}",
+            description="A description " * 20,
+            sku=f"SKU-{i}",
+            gtin=str(7350000000000 + i),
+            retailer_name="Retailer",
+            country="SE",
+            popularity_index=rng.randint(1, 100),
+            retailer_price=rng.uniform(100, 10000),
+            currency="SEK",
+            is_discounted=rng.random() < 0.2,
+            review_average=rng.uniform(1, 5),
+            number_of_reviews=rng.randint(0, 500),
+            retailer_images_count=rng.randint(0, 10),
+            brand_images_count=rng.randint(0, 10),
+            title_score=rng.random(),
+            description_score=rng.random(),
+            specs_score=rng.random(),
+            text_score=rng.random(),
+            image_score=rng.random(),
+            content_score=rng.random(),
+            transparent_images_count=rng.randint(0, 3),
+            obsolete_images_count=rng.randint(0, 3),
+            environmental_images_count=rng.randint(0, 3),
+            in_stock=True,
+            matched_brand_product_id=uuid.uuid4(),
+            brand_in_stock=True,
+            available_at_retailer=True,
+            retailer_category_name="Furniture > Chairs",
+            fetched_at=now,
+            created_at=now - timedelta(days=rng.randint(0, 700)),
+            msrp=rng.uniform(100, 10000),
+            msrp_currency="SEK",
+            price_deviation=rng.uniform(-0.5, 0.5),
+            category_page_number=rng.randint(1, 10),
+        )
+        for i in range(500)
+    ]
+
+
+def _page(rows):
+    return {
+        "rows": rows,
+        "count": len(rows),
+        "offset": 0,
+        "total_count": 10000,
+        "total_count_is_estimated": False,
+        "next_cursor": None,
+    }
+
+
+def validated_response(products) -> bytes:
+    # What the endpoint did: pydantic models for the screenshots, then the response model and its encoding
+    rows = [MockRetailerProductGridItem.from_orm(p) for p in products]
+    content = asyncio.run(
+        serialize_response(
+            field=create_response_field("Response", RetailerOffersPage),
+            response_content=_page(rows),
+        )
+    )
+    return JSONResponse(content).body
+
+
+def trusted_response(products) -> bytes:
+    rows = to_trusted_rows(products, MockRetailerProductGridItemV21)
+    return TrustedJSONResponse(_page(rows)).body
+
+
+@pytest.mark.parametrize(
+    "build_response",
+    [trusted_response, validated_response],
+    ids=["trusted", "validated"],
+)
+def test_retailer_offers_page(benchmark, products, build_response):
+    benchmark(build_response, products)
@@ -1,6 +1,16 @@
+import random
 import unittest
-from unittest.mock import MagicMock, patch
-from app.crud.utils import get_currency_exchange_rates
+from datetime import date, datetime, timedelta
+from unittest.mock import MagicMock
+from app.crud.utils import (
+    create_history_columns,
+    extract_minimal_values,
+    extract_minimal_values_from_history,
+    get_currency_exchange_rates,
+    process_historical_value_per_retailer,
+    process_historical_value_per_retailer_in_columns,
+    split_total_count,
+)
 
 class TestCurrencyFunctions(unittest.TestCase):
     def setUp(self):
@@ -10,13 +20,9 @@ class TestCurrencyFunctions(unittest.TestCase):
             [{'name': 'USD', 'conversion_rate': 1.0}, {'name': 'EUR', 'conversion_rate': 0.85}]  # Different rate for different call
         ]
 
-    @patch('app.crud.utils.TTLCache')
-    def test_cache_hit(self, MockTTLCache):
-        # Mock the TTLCache instance
-        mock_cache = MockTTLCache.return_value
-        mock_cache.get = MagicMock(side_effect=lambda key: None)  # Simulate cache miss initially
-        mock_cache.__setitem__ = MagicMock()  # Simulate setting cache
-        
+        get_currency_exchange_rates.cache.clear()
+
+    def test_cache_hit(self):
         # Call the function once (cache miss)
         result1 = get_currency_exchange_rates(self.db, 'USD')
         
@@ -28,13 +34,17 @@ class TestCurrencyFunctions(unittest.TestCase):
         # Check that results are the same
         self.assertEqual(result1, result2)
 
-    @patch('app.crud.utils.TTLCache')
-    def test_cache_miss(self, MockTTLCache):
-        # Mock the TTLCache instance
-        mock_cache = MockTTLCache.return_value
-        mock_cache.get = MagicMock(side_effect=lambda key: None)  # Simulate cache miss
-        mock_cache.__setitem__ = MagicMock()  # Simulate setting cache
+    def test_cache_hit_with_another_session(self):
+        result1 = get_currency_exchange_rates(self.db, 'USD')
+
+        # Every request has its own session, the rates must still be shared
+        other_db = MagicMock()
+        result2 = get_currency_exchange_rates(other_db, 'USD')
 
+        other_db.execute.assert_not_called()
+        self.assertEqual(result1, result2)
+
+    def test_cache_miss(self):
         # Call the function with different parameters
         result1 = get_currency_exchange_rates(self.db, 'USD')
         result2 = get_currency_exchange_rates(self.db, 'EUR')
@@ -45,5 +55,323 @@ class TestCurrencyFunctions(unittest.TestCase):
         # Check if the results are different for different queries
         self.assertNotEqual(result1, result2)
 
+
+class TestTotalCount(unittest.TestCase):
+    def test_total_count_is_read_from_the_rows(self):
+        count_datapool = MagicMock()
+
+        entities, total_count = split_total_count([("a", 12), ("b", 12)], count_datapool)
+
+        self.assertEqual(entities, ["a", "b"])
+        self.assertEqual(total_count, 12)
+        count_datapool.assert_not_called()
+
+    def test_empty_page_falls_back_on_counting(self):
+        count_datapool = MagicMock(return_value=12)
+
+        self.assertEqual(split_total_count([], count_datapool), ([], 12))
+
+
+def generate_retailers(
+    rng: random.Random,
+    retailers_count: int,
+    days_count: int,
+    same_start: bool = False,
+    null_probability: float = 0.1,
+):
+    """
+    Random price lines, shaped like the ones of `/products/brand/{id}/prices`: sorted dates with gaps, some null values
+    (interruptions), retailers starting and ending at different dates, some with a single point.
+    """
+    start = date(2022, 1, 1)
+    retailers = []
+    for i in range(retailers_count):
+        first_day = 0 if same_start else rng.randrange(days_count)
+        days = [
+            d
+            for d in range(first_day + 1, days_count)
+            if rng.random() < rng.choice([0.1, 0.5, 1])
+        ]
+        data = [
+            {
+                "x": start + timedelta(days=d),
+                "y": None
+                if rng.random() < null_probability
+                else rng.choice([rng.randint(100, 120), rng.randint(1, 1000)]),
+            }
+            for d in [first_day, *days]
+        ]
+        retailers.append({"id": f"Retailer {i}", "data": data})
+
+    return retailers
+
+
+def reference_minimal_values(retailers):
+    """
+    The semantics of `extract_minimal_values`, computed naively: the minimum over the retailers of their last value at
+    every date but the last one, which only closes the area (unless there is no value before).
+    """
+    dates = sorted({p["x"] for r in retailers for p in r["data"]})
+    minimal_values = []
+    for d in dates:
+        if d == dates[-1] and minimal_values:
+            break
+        values = []
+        for r in retailers:
+            previous_points = [p for p in r["data"] if p["x"] <= d]
+            if previous_points and previous_points[-1]["y"] is not None:
+                values.append(previous_points[-1]["y"])
+        if values and (not minimal_values or minimal_values[-1]["y"] != min(values)):
+            minimal_values.append({"x": d, "y": min(values)})
+
+    if minimal_values and minimal_values[-1]["x"] != dates[-1]:
+        minimal_values.append({"x": dates[-1], "y": minimal_values[-1]["y"]})
+
+    return minimal_values
+
+
+def previous_extract_minimal_values(retailers):
+    """
+    The implementation `extract_minimal_values` replaced, kept to check that the results did not change and to
+    measure the speedup (see `benchmark/test_minimal_values.py`). It fails when all the retailers have a single point
+    and ignores the first date of the retailers starting after the others.
+    """
+    indexes_for_retailers = [0] * len(retailers)
+    minimal_values = []
+
+    next_max_date = min([r["data"][0]["x"] for r in retailers])
+    while not all(
+        [i == len(r["data"]) - 1 for i, r in zip(indexes_for_retailers, retailers)]
+    ):
+        next_value_by_retailer = [
+            r["data"][indexes_for_retailers[i]]["y"]
+            for i, r in enumerate(retailers)
+            if (
+                indexes_for_retailers[i] < len(r["data"])
+                and r["data"][indexes_for_retailers[i]]["x"] <= next_max_date
+                and r["data"][indexes_for_retailers[i]]["y"] is not None
+            )
+        ]
+        min_value = (
+            min(next_value_by_retailer)
+            if next_value_by_retailer
+            else minimal_values[-1]["y"]
+        )
+        if (
+            not minimal_values
+            or minimal_values[len(minimal_values) - 1]["y"] != min_value
+        ):
+            minimal_values.append({"x": next_max_date, "y": min_value})
+
+        next_max_date = min(
+            [
+                r["data"][indexes_for_retailers[i] + 1]["x"]
+                for i, r in enumerate(retailers)
+                if indexes_for_retailers[i] + 1 < len(r["data"])
+            ]
+        )
+        for i, r in enumerate(retailers):
+            if (
+                indexes_for_retailers[i] + 1 < len(r["data"])
+                and r["data"][indexes_for_retailers[i] + 1]["x"] == next_max_date
+            ):
+                indexes_for_retailers[i] += 1
+
+    minimal_values.append(
+        {"x": next_max_date, "y": minimal_values[len(minimal_values) - 1]["y"]}
+    )
+
+    return minimal_values
+
+
+def _line(retailer_id, *points):
+    return {
+        "id": retailer_id,
+        "data": [{"x": date(2024, 1, day), "y": y} for day, y in points],
+    }
+
+
+class TestExtractMinimalValues(unittest.TestCase):
+    def test_matches_the_reference_on_random_lines(self):
+        rng = random.Random(0)
+        for case in range(300):
+            retailers = generate_retailers(
+                rng, rng.randint(1, 8), rng.randint(1, 40), same_start=case % 2 == 0
+            )
+            with self.subTest(case=case):
+                self.assertEqual(
+                    extract_minimal_values(retailers),
+                    reference_minimal_values(retailers),
+                )
+
+    def test_from_the_history_of_all_the_retailers(self):
+        rng = random.Random(2)
+        for case in range(100):
+            retailers = generate_retailers(rng, rng.randint(1, 8), rng.randint(1, 40))
+            # Like the rows of a crud history, sorted by date rather than grouped by retailer
+            points = sorted(
+                [(r["id"], p["x"], p["y"]) for r in retailers for p in r["data"]],
+                key=lambda p: p[1],
+            )
+            with self.subTest(case=case):
+                self.assertEqual(
+                    extract_minimal_values_from_history(*zip(*points)),
+                    reference_minimal_values(retailers),
+                )
+
+    def test_matches_the_previous_implementation(self):
+        # Where the previous implementation was correct: the retailers start at the same date, with a value, and
+        # have more than one point
+        rng = random.Random(1)
+        for case in range(300):
+            retailers = generate_retailers(
+                rng, rng.randint(1, 8), rng.randint(2, 40), same_start=True
+            )
+            for r in retailers:
+                r["data"][0]["y"] = r["data"][0]["y"] or 1
+            if any(len(r["data"]) < 2 for r in retailers):
+                continue
+            with self.subTest(case=case):
+                self.assertEqual(
+                    extract_minimal_values(retailers),
+                    previous_extract_minimal_values(retailers),
+                )
+
+    def test_steps_and_interruptions(self):
+        retailers = [
+            _line("A", (1, 100), (3, None), (5, 90), (6, 90)),
+            _line("B", (1, 120), (2, 80), (4, 110)),
+        ]
+
+        self.assertEqual(
+            extract_minimal_values(retailers),
+            [
+                {"x": date(2024, 1, 1), "y": 100},
+                {"x": date(2024, 1, 2), "y": 80},
+                {"x": date(2024, 1, 4), "y": 110},
+                {"x": date(2024, 1, 5), "y": 90},
+                {"x": date(2024, 1, 6), "y": 90},
+            ],
+        )
+
+    def test_gap_for_all_retailers_keeps_the_last_value(self):
+        retailers = [_line("A", (1, 100), (2, None), (3, None), (4, 95))]
+
+        self.assertEqual(
+            extract_minimal_values(retailers),
+            [{"x": date(2024, 1, 1), "y": 100}, {"x": date(2024, 1, 4), "y": 100}],
+        )
+
+    def test_retailers_with_single_points(self):
+        retailers = [_line("A", (1, 100)), _line("B", (3, 90))]
+
+        self.assertEqual(
+            extract_minimal_values(retailers),
+            [{"x": date(2024, 1, 1), "y": 100}, {"x": date(2024, 1, 3), "y": 100}],
+        )
+        self.assertEqual(
+            extract_minimal_values([_line("A", (1, 100))]),
+            [{"x": date(2024, 1, 1), "y": 100}],
+        )
+
+    def test_late_retailer_is_taken_into_account_from_its_first_date(self):
+        retailers = [_line("A", (1, 100), (5, 100)), _line("B", (2, 80))]
+
+        self.assertEqual(
+            extract_minimal_values(retailers),
+            [
+                {"x": date(2024, 1, 1), "y": 100},
+                {"x": date(2024, 1, 2), "y": 80},
+                {"x": date(2024, 1, 5), "y": 80},
+            ],
+        )
+
+    def test_only_null_values(self):
+        self.assertEqual(
+            extract_minimal_values([_line("A", (1, None), (2, None))]), []
+        )
+
+
+class TestHistoryColumns(unittest.TestCase):
+    def test_same_values_as_the_points(self):
+        rng = random.Random(2)
+        for case in range(50):
+            history = [
+                {"retailer": r["id"], "time": point["x"], "score": point["y"]}
+                for r in generate_retailers(rng, rng.randint(1, 6), rng.randint(1, 30))
+                for point in r["data"]
+            ]
+            rng.shuffle(history)
+
+            points = process_historical_value_per_retailer(history)
+            columns = process_historical_value_per_retailer_in_columns(history)
+
+            with self.subTest(case=case):
+                self.assertEqual(columns["x"], sorted(set(columns["x"])))
+                self.assertEqual(
+                    [r["id"] for r in columns["retailers"]],
+                    [r["id"] for r in points["retailers"]],
+                )
+                for points_retailer, columns_retailer in zip(
+                    points["retailers"], columns["retailers"]
+                ):
+                    # The values at the dates of the points, None at the other dates
+                    expected = {p["x"]: p["y"] for p in points_retailer["data"]}
+                    self.assertEqual(
+                        columns_retailer["y"], [expected.get(x) for x in columns["x"]]
+                    )
+                self.assertEqual(columns["max_value"], points["max_value"])
+                self.assertEqual(columns["min_value"], points["min_value"])
+
+    def test_missing_values_are_none(self):
+        columns = create_history_columns(
+            ["B", "A", "A", "B"],
+            [date(2024, 1, 8), date(2024, 1, 1), date(2024, 1, 15), date(2024, 1, 15)],
+            [90.5, 100, None, 80],
+            force_two_points=False,
+        )
+
+        self.assertEqual(
+            columns,
+            {
+                "x": [date(2024, 1, 1), date(2024, 1, 8), date(2024, 1, 15)],
+                "retailers": [
+                    {"id": "B", "y": [None, 90.5, 80]},
+                    {"id": "A", "y": [100, None, None]},
+                ],
+            },
+        )
+
+    def test_single_points_are_duplicated_a_week_before(self):
+        columns = create_history_columns(
+            ["A", "B", "B"],
+            [date(2024, 1, 15), date(2024, 1, 1), date(2024, 1, 15)],
+            [100, 90, 80],
+        )
+
+        self.assertEqual(
+            columns["x"], [date(2024, 1, 1), date(2024, 1, 8), date(2024, 1, 15)]
+        )
+        self.assertEqual(columns["retailers"][0], {"id": "A", "y": [None, 100, 100]})
+
+    def test_datetimes_are_returned_as_dates(self):
+        columns = create_history_columns(
+            ["A", "A", "B"],
+            [datetime(2024, 1, 1), datetime(2024, 1, 8), datetime(2024, 1, 8)],
+            [100, 90, 80],
+            force_two_points=False,
+        )
+
+        self.assertEqual(columns["x"], [date(2024, 1, 1), date(2024, 1, 8)])
+        self.assertTrue(all(type(x) is date for x in columns["x"]))
+        self.assertEqual(columns["retailers"][1], {"id": "B", "y": [None, 80]})
+
+    def test_empty_history(self):
+        self.assertEqual(
+            process_historical_value_per_retailer_in_columns([]),
+            {"x": [], "retailers": [], "max_value": 0, "min_value": 0},
+        )
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from app.crud.security import check_api_key, verified_api_keys
+
+
+class TestCheckApiKey(unittest.TestCase):
+    def setUp(self):
+        verified_api_keys.clear()
+        self.api_key_entry = MagicMock(id="key-id", client_id="client-id")
+        self.db = MagicMock()
+        self.db.query.return_value.filter_by.return_value.first.return_value = (
+            self.api_key_entry
+        )
+
+    @patch("app.crud.security.hash_api_key", return_value=b"hashed")
+    def test_verified_key_is_not_hashed_again(self, hash_api_key):
+        self.assertIs(check_api_key(self.db, "loupe_key"), self.api_key_entry)
+        # Every request has its own session
+        other_db = MagicMock()
+        self.assertIs(check_api_key(other_db, "loupe_key"), self.api_key_entry)
+
+        hash_api_key.assert_called_once()
+        other_db.query.assert_not_called()
+        self.db.commit.assert_not_called()
+
+    @patch("app.crud.security.hash_api_key", return_value=b"hashed")
+    def test_unknown_key_is_not_cached(self, hash_api_key):
+        self.db.query.return_value.filter_by.return_value.first.return_value = None
+
+        self.assertIsNone(check_api_key(self.db, "loupe_key"))
+        self.assertIsNone(check_api_key(self.db, "loupe_key"))
+
+        self.assertEqual(hash_api_key.call_count, 2)
+
+    @patch("app.crud.security.hash_api_key", return_value=b"hashed")
+    def test_keys_do_not_share_entries(self, hash_api_key):
+        check_api_key(self.db, "loupe_key")
+        check_api_key(self.db, "loupe_other_key")
+
+        self.assertEqual(hash_api_key.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
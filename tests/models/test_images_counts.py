@@ -0,0 +1,54 @@
+import unittest
+
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import undefer_group
+
+# The relationships of the entities can only be resolved once all of them are imported
+import app.models.groups  # noqa: F401
+from app.models.brand import BrandProduct
+from app.models.mixins import IMAGES_COUNTS
+from app.models.retailer import RetailerProduct
+
+
+def _compile(statement) -> str:
+    return str(
+        statement.compile(
+            dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+        )
+    )
+
+
+class TestImagesCounts(unittest.TestCase):
+    def test_counts_are_deferred(self):
+        statement = _compile(select(RetailerProduct))
+
+        self.assertNotIn("retailer_image", statement)
+
+    def test_counts_are_loaded_together(self):
+        statement = _compile(
+            select(RetailerProduct).options(undefer_group(IMAGES_COUNTS))
+        )
+
+        self.assertIn("count(DISTINCT retailer_image.image_hash)", statement)
+        self.assertEqual(statement.count("retailer_image_types.prediction"), 2)
+        self.assertIn(
+            "ORDER BY retailer_image_types.confidence DESC NULLS LAST", statement
+        )
+        self.assertIn("= 'environmental'", statement)
+        self.assertIn("= 'transparent'", statement)
+
+    def test_brand_counts_skip_wrong_images(self):
+        statement = _compile(
+            select(BrandProduct.environmental_images_count).where(
+                BrandProduct.id == "31ef6c6c-be2d-4478-a948-10a66dad1d2a"
+            )
+        )
+
+        self.assertIn("brand_image.image_hash IS NOT NULL", statement)
+        self.assertIn("brand_image.temp_wrong IS NOT true", statement)
+        self.assertIn("brand_image.brand_product_id = brand_product.id", statement)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,12 @@
+import json
 import random
-from tests.routers.external_v2.helpers import get_retailer_offers_no_filters_in_test
+from benchmark.config import BASE_URL
+from tests.routers.external_v2.helpers import (
+    SANDBOX_API_KEY,
+    check_http_status,
+    client,
+    get_retailer_offers_no_filters_in_test,
+)
 
 # We want to test the iteration of pages in the API
 # Therefore we will randomly select a number of pages to test
@@ -28,3 +35,40 @@ def test_get_retailer_offers_no_filters_v21(page=None):
     else:
         test_get_retailer_offers_no_filters_v21(
             page=response["page"] + 1)
+
+def test_get_retailer_offers_no_filters_v22():
+    seen_ids = set()
+    cursor = None
+    for _ in range(MAX_PAGES):
+        params = {"cursor": cursor} if cursor else {}
+        response = client.get(
+            f"{BASE_URL}/v2.2/products/retailer_offers",
+            headers={"x-api-key": SANDBOX_API_KEY, "Accept": "application/json"},
+            params=params,
+        )
+        check_http_status(response)
+        data = response.json()
+        assert data["count"] == len(data["rows"])
+
+        page_ids = [row["id"] for row in data["rows"]]
+        # Pages never overlap
+        assert seen_ids.isdisjoint(page_ids)
+        seen_ids.update(page_ids)
+
+        cursor = data["next_cursor"]
+        if cursor is None:
+            return
+
+def test_export_retailer_offers_v22():
+    response = client.get(
+        f"{BASE_URL}/v2.2/products/retailer_offers/export",
+        headers={"x-api-key": SANDBOX_API_KEY},
+        params={"format": "ndjson"},
+    )
+    check_http_status(response)
+    rows = [json.loads(line) for line in response.text.splitlines()]
+
+    ids = [row["id"] for row in rows]
+    # Every offer is exported once, sorted by id
+    assert ids == sorted(set(ids))
+    assert all(row["available_at_retailer"] for row in rows)
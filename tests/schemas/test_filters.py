@@ -0,0 +1,125 @@
+import unittest
+from datetime import datetime
+from types import SimpleNamespace
+
+from app.schemas.filters import (
+    DataGridFilterItem,
+    DataGridSorting,
+    KeysetCursor,
+    PagedGlobalFilter,
+    PagedPriceValuesFilter,
+    PagedRetailerOffersFilter,
+)
+
+
+class TestDataGridFilterItemValues(unittest.TestCase):
+    def test_boolean_values_are_parsed(self):
+        item = DataGridFilterItem(
+            column="available_at_retailer", operator="is", value="true"
+        )
+        self.assertIs(item.get_safe_postgres_value(), True)
+
+    def test_select_values_are_kept_as_strings(self):
+        item = DataGridFilterItem(
+            column="availability", operator="is", value="in_stock"
+        )
+        self.assertEqual(item.get_safe_postgres_value(), "in_stock")
+
+    def test_date_values_are_parsed(self):
+        item = DataGridFilterItem(
+            column="fetched_at", operator="onOrAfter", value="2023-01-17"
+        )
+        self.assertEqual(item.get_safe_postgres_value(), datetime(2023, 1, 17))
+
+    def test_date_values_of_equality_operators_are_parsed(self):
+        for operator in ["is", "not"]:
+            item = DataGridFilterItem(
+                column="fetched_at", operator=operator, value="2023-01-17T10:30:00"
+            )
+            self.assertEqual(
+                item.get_safe_postgres_value(), datetime(2023, 1, 17, 10, 30)
+            )
+
+    def test_numeric_values_are_parsed(self):
+        self.assertEqual(
+            DataGridFilterItem(
+                column="popularity_index", operator=">", value="12"
+            ).get_safe_postgres_value(),
+            12,
+        )
+        self.assertEqual(
+            DataGridFilterItem(
+                column="retailer_price", operator="<=", value="12.5"
+            ).get_safe_postgres_value(),
+            12.5,
+        )
+
+    def test_text_operators_are_untouched(self):
+        item = DataGridFilterItem(column="name", operator="contains", value="Chair")
+        self.assertEqual(item.get_safe_postgres_value(), "chair")
+
+
+class TestKeysetCursor(unittest.TestCase):
+    def setUp(self):
+        self.filter_values = {
+            "page_number": 1,
+            "start_date": "2022-01-01",
+            "countries": [],
+            "retailers": [],
+            "categories": [],
+            "groups": [],
+            "data_grid_filter": {"items": [], "operator": "or"},
+        }
+
+    def test_encoded_cursor_can_be_decoded(self):
+        row = SimpleNamespace(id="8a4f", fetched_at=datetime(2023, 1, 17, 10, 30))
+        cursor = KeysetCursor.after_row(
+            row, DataGridSorting(column="fetched_at", direction="desc")
+        )
+
+        decoded = KeysetCursor.decode(cursor.encode())
+
+        self.assertEqual(decoded, cursor)
+        self.assertEqual(decoded.value, datetime(2023, 1, 17, 10, 30))
+
+    def test_invalid_cursor_is_rejected(self):
+        with self.assertRaises(ValueError):
+            PagedRetailerOffersFilter(**self.filter_values, cursor="not a cursor")
+
+    def test_cursor_must_match_the_sorting(self):
+        cursor = KeysetCursor(column="name", direction="asc", value="Chair", id="8a4f")
+
+        with self.assertRaises(ValueError):
+            PagedRetailerOffersFilter(
+                **self.filter_values,
+                cursor=cursor.encode(),
+                sorting={"column": "retailer_price", "direction": "asc"},
+            )
+
+        page_filter = PagedRetailerOffersFilter(
+            **self.filter_values,
+            cursor=cursor.encode(),
+            sorting={"column": "name", "direction": "asc"},
+        )
+        self.assertEqual(page_filter.get_keyset_cursor(), cursor)
+
+    def test_total_count_is_estimated_after_the_first_page(self):
+        cursor = KeysetCursor(column="name", direction="asc", value="Chair", id="8a4f")
+
+        self.assertFalse(
+            PagedRetailerOffersFilter(**self.filter_values).is_total_count_estimated()
+        )
+        self.assertTrue(
+            PagedRetailerOffersFilter(
+                **self.filter_values, cursor=cursor.encode()
+            ).is_total_count_estimated()
+        )
+
+    def test_only_the_retailer_offers_are_paged_by_cursor(self):
+        # The other grids are paged by offset, they must not advertise a cursor they would ignore
+        self.assertNotIn("cursor", PagedGlobalFilter.__fields__)
+        self.assertNotIn("cursor", PagedPriceValuesFilter.__fields__)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,373 @@
+import asyncio
+import threading
+import unittest
+from datetime import datetime
+from typing import Any
+from unittest.mock import MagicMock, patch
+
+from app.schemas.filters import GlobalFilter
+from app.service import cache
+from app.service.cache import (
+    InMemoryCacheBackend,
+    LookupCache,
+    ResponseCache,
+    cached_lookup,
+    canonical_request_fingerprint,
+    is_not_modified,
+)
+
+
+def _global_filter(**kwargs):
+    return GlobalFilter(
+        **{
+            "start_date": "2022-09-01",
+            "countries": ["SE", "NO"],
+            "retailers": [],
+            "categories": ["c2", "c1"],
+            "groups": [],
+            **kwargs,
+        }
+    )
+
+
+class TestCanonicalRequestFingerprint(unittest.TestCase):
+    def test_order_of_filter_values_is_ignored(self):
+        reordered = _global_filter(countries=["NO", "SE"], categories=["c1", "c2"])
+        self.assertEqual(
+            canonical_request_fingerprint({"global_filter": _global_filter()}),
+            canonical_request_fingerprint({"global_filter": reordered}),
+        )
+
+    def test_order_of_filter_values_is_kept_if_it_matters(self):
+        retailers = {"global_filter": _global_filter(retailers=["A", "B"])}
+        reordered = {"global_filter": _global_filter(retailers=["B", "A"])}
+
+        self.assertNotEqual(
+            canonical_request_fingerprint(retailers, sort_lists=False),
+            canonical_request_fingerprint(reordered, sort_lists=False),
+        )
+
+    def test_date_is_normalized(self):
+        as_datetime = _global_filter(start_date=datetime(2022, 9, 1))
+        self.assertEqual(
+            canonical_request_fingerprint({"global_filter": _global_filter()}),
+            canonical_request_fingerprint({"global_filter": as_datetime}),
+        )
+
+    def test_different_filters_have_different_fingerprints(self):
+        self.assertNotEqual(
+            canonical_request_fingerprint({"global_filter": _global_filter()}),
+            canonical_request_fingerprint(
+                {"global_filter": _global_filter(countries=["SE"])}
+            ),
+        )
+        self.assertNotEqual(
+            canonical_request_fingerprint(
+                {"global_filter": _global_filter(), "sign": 1}
+            ),
+            canonical_request_fingerprint(
+                {"global_filter": _global_filter(), "sign": -1}
+            ),
+        )
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = ResponseCache(InMemoryCacheBackend(max_entries=10), ttl_seconds=60)
+        self.arguments = {"global_filter": _global_filter()}
+
+    def test_hit_after_set(self):
+        key = self.cache.build_key("price/msrp", "brand", self.arguments)
+        self.assertIsNone(self.cache.get(key))
+
+        self.cache.set(key, {"start_date": datetime(2022, 9, 1)})
+
+        self.assertEqual(self.cache.get(key), {"start_date": "2022-09-01T00:00:00"})
+        self.assertEqual(self.cache.stats(), {"hits": 1, "misses": 1})
+
+    def test_brands_do_not_share_entries(self):
+        self.assertNotEqual(
+            self.cache.build_key("price/msrp", "brand", self.arguments),
+            self.cache.build_key("price/msrp", "other_brand", self.arguments),
+        )
+
+    def test_invalidation_only_affects_dependent_entries(self):
+        msrp_key = self.cache.build_key(
+            "price/msrp", "brand", self.arguments, ["msrp_deviation_matview"]
+        )
+        changes_key = self.cache.build_key(
+            "price/changes", "brand", self.arguments, ["price_changes_matview"]
+        )
+        self.cache.set(msrp_key, {"value": 1})
+        self.cache.set(changes_key, {"value": 2})
+
+        self.cache.invalidate(["msrp_deviation_matview"])
+
+        self.assertIsNone(
+            self.cache.get(
+                self.cache.build_key(
+                    "price/msrp", "brand", self.arguments, ["msrp_deviation_matview"]
+                )
+            )
+        )
+        self.assertEqual(
+            self.cache.get(
+                self.cache.build_key(
+                    "price/changes", "brand", self.arguments, ["price_changes_matview"]
+                )
+            ),
+            {"value": 2},
+        )
+
+
+class _ThreadRecordingBackend(InMemoryCacheBackend):
+    """
+    Stands for a backend waiting on the network, records the threads it is called from
+    """
+
+    blocking = True
+
+    def __init__(self):
+        super().__init__(max_entries=10)
+        self.threads = set()
+
+    def get_many(self, keys):
+        self.threads.add(threading.get_ident())
+        return super().get_many(keys)
+
+    def get(self, key):
+        self.threads.add(threading.get_ident())
+        return super().get(key)
+
+    def set(self, key, value, ttl_seconds):
+        self.threads.add(threading.get_ident())
+        super().set(key, value, ttl_seconds)
+
+
+class TestCachedResponse(unittest.TestCase):
+    def setUp(self):
+        patcher = patch.object(
+            cache,
+            "response_cache",
+            ResponseCache(InMemoryCacheBackend(max_entries=10), ttl_seconds=60),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.calls = 0
+
+    def _first_retailer(self, global_filter: GlobalFilter, user: Any):
+        self.calls += 1
+        return global_filter.retailers[0]
+
+    @staticmethod
+    def _call(endpoint, retailers):
+        return endpoint(
+            global_filter=_global_filter(retailers=retailers),
+            user=MagicMock(client="brand"),
+            __request=MagicMock(headers={}),
+            __response=MagicMock(headers={}),
+        )
+
+    def test_reordered_filters_share_entries(self):
+        endpoint = cache.cached_response("price/msrp")(self._first_retailer)
+
+        self.assertEqual(self._call(endpoint, ["A", "B"]), "A")
+        self.assertEqual(self._call(endpoint, ["B", "A"]), "A")
+        self.assertEqual(self.calls, 1)
+
+    def test_blocking_backend_is_not_called_from_the_event_loop(self):
+        backend = _ThreadRecordingBackend()
+        cache.response_cache.backend = backend
+
+        async def endpoint(global_filter: GlobalFilter, user: Any):
+            return {"loop_thread": threading.get_ident()}
+
+        cached_endpoint = cache.cached_response(
+            "price/msrp", depends_on=["msrp_deviation_matview"]
+        )(endpoint)
+        first = asyncio.run(self._call(cached_endpoint, ["A"]))
+        second = asyncio.run(self._call(cached_endpoint, ["A"]))
+
+        self.assertEqual(first, second)
+        self.assertTrue(backend.threads)
+        self.assertNotIn(first["loop_thread"], backend.threads)
+
+    def test_ordered_filters_do_not_share_entries(self):
+        # Like `/performance/top_n`, which only reads the first selected retailer
+        endpoint = cache.cached_response("performance/top_n", ordered_filters=True)(
+            self._first_retailer
+        )
+
+        self.assertEqual(self._call(endpoint, ["A", "B"]), "A")
+        self.assertEqual(self._call(endpoint, ["B", "A"]), "B")
+        self.assertEqual(self._call(endpoint, ["A", "B"]), "A")
+        self.assertEqual(self.calls, 2)
+
+    def test_live_responses_expire_sooner(self):
+        backend = MagicMock(wraps=InMemoryCacheBackend(max_entries=10), blocking=False)
+        cache.response_cache.backend = backend
+        cache.response_cache.live_ttl_seconds = 5
+
+        self._call(
+            cache.cached_response("stock", live=True)(self._first_retailer), ["A"]
+        )
+        self._call(cache.cached_response("price/msrp")(self._first_retailer), ["A"])
+
+        self.assertEqual(
+            [c.args[2] for c in backend.set.call_args_list],
+            [5, 60],
+        )
+
+
+class TestGenerations(unittest.TestCase):
+    def test_fetched_at_once(self):
+        backend = InMemoryCacheBackend(max_entries=10)
+        backend.get = MagicMock(wraps=backend.get)
+        backend.get_many = MagicMock(wraps=backend.get_many)
+        response_cache = ResponseCache(backend, ttl_seconds=60)
+        response_cache.invalidate(["msrp_deviation_matview"])
+        backend.get.reset_mock()
+
+        response_cache.build_key(
+            "price/msrp",
+            "brand",
+            {"global_filter": _global_filter()},
+            ["msrp_deviation_matview", "price_changes_matview"],
+        )
+
+        backend.get_many.assert_called_once_with(
+            ["generation:msrp_deviation_matview", "generation:price_changes_matview"]
+        )
+        self.assertEqual(
+            response_cache.get_generations(
+                ["msrp_deviation_matview", "price_changes_matview"]
+            ),
+            {"msrp_deviation_matview": 1, "price_changes_matview": 0},
+        )
+
+    def test_redis_uses_a_single_command(self):
+        try:
+            from app.service.cache import RedisCacheBackend
+
+            backend = RedisCacheBackend("redis://localhost:6379/0")
+        except RuntimeError:
+            self.skipTest("redis is not installed")
+        backend._client = MagicMock()
+        backend._client.mget.return_value = [b"2", None]
+
+        self.assertEqual(backend.get_many(["a", "b"]), ["2", None])
+        backend._client.mget.assert_called_once_with(["a", "b"])
+        backend._client.get.assert_not_called()
+
+    def test_group_edits_only_invalidate_the_group_filtered_responses_of_the_brand(
+        self,
+    ):
+        response_cache = ResponseCache(
+            InMemoryCacheBackend(max_entries=10), ttl_seconds=60
+        )
+
+        def build_key(brand_id, global_filter):
+            return response_cache.build_key(
+                "content/overview",
+                brand_id,
+                {"global_filter": global_filter},
+                ["brand_product_retailer_product_content_matview"],
+            )
+
+        grouped_filter = _global_filter(groups=["g1"])
+        grouped_key = build_key("brand", grouped_filter)
+        other_brand_key = build_key("other", grouped_filter)
+        ungrouped_key = build_key("brand", _global_filter())
+
+        response_cache.invalidate_groups("brand")
+
+        self.assertNotEqual(grouped_key, build_key("brand", grouped_filter))
+        self.assertEqual(other_brand_key, build_key("other", grouped_filter))
+        self.assertEqual(ungrouped_key, build_key("brand", _global_filter()))
+
+
+class TestLookupCache(unittest.TestCase):
+    def setUp(self):
+        self.lookup = MagicMock(side_effect=lambda db, key: key.upper() or None)
+        self.cache = LookupCache("test", max_entries=2, ttl_seconds=60)
+
+    def test_keyed_on_the_key_only(self):
+        cached = cached_lookup(self.cache, key=lambda db, key: key)(self.lookup)
+
+        self.assertEqual(cached(MagicMock(), "a"), "A")
+        self.assertEqual(cached(MagicMock(), "a"), "A")
+
+        self.lookup.assert_called_once()
+        self.assertEqual(self.cache.stats(), {"entries": 1, "hits": 1, "misses": 1})
+
+    def test_bounded(self):
+        cached = cached_lookup(self.cache, key=lambda db, key: key)(self.lookup)
+
+        for key in ["a", "b", "c"]:
+            cached(None, key)
+
+        self.assertEqual(self.cache.stats()["entries"], 2)
+
+    def test_none_is_not_cached_if_disabled(self):
+        cached = cached_lookup(self.cache, key=lambda db, key: key, cache_none=False)(
+            self.lookup
+        )
+
+        self.assertIsNone(cached(None, ""))
+        self.assertIsNone(cached(None, ""))
+
+        self.assertEqual(self.lookup.call_count, 2)
+
+
+class TestETag(unittest.TestCase):
+    def setUp(self):
+        self.cache = ResponseCache(InMemoryCacheBackend(max_entries=10), ttl_seconds=60)
+        self.arguments = {"page": 0}
+        self.depends_on = ["retailer_product_including_unavailable_matview"]
+
+    def _etag(self):
+        return self.cache.build_etag(
+            "v2/products/retailer_offers", "brand", self.arguments, self.depends_on
+        )
+
+    def test_no_etag_while_the_state_of_the_views_is_unknown(self):
+        self.assertIsNone(self._etag())
+
+    def test_etag_changes_with_the_state_of_the_views(self):
+        self.cache.record_matview_state(self.depends_on[0], "1.10")
+        etag = self._etag()
+        self.assertEqual(etag, self._etag())
+
+        self.cache.record_matview_state(self.depends_on[0], "2.10")
+        self.assertNotEqual(etag, self._etag())
+
+        self.cache.record_matview_state(self.depends_on[0], None)
+        self.assertIsNone(self._etag())
+
+    def test_etag_changes_when_the_ttl_runs_out(self):
+        self.cache.record_matview_state(self.depends_on[0], "1.10")
+
+        with patch.object(cache.time, "time", return_value=125):
+            etag = self._etag()
+        with patch.object(cache.time, "time", return_value=179):
+            self.assertEqual(etag, self._etag())
+        with patch.object(cache.time, "time", return_value=180):
+            self.assertNotEqual(etag, self._etag())
+
+    def test_etag_changes_when_the_groups_of_the_brand_change(self):
+        self.cache.record_matview_state(self.depends_on[0], "1.10")
+        self.arguments = {"global_filter": _global_filter(groups=["g1"])}
+        etag = self._etag()
+
+        self.cache.invalidate_groups("brand")
+        self.assertNotEqual(etag, self._etag())
+
+    def test_if_none_match(self):
+        request = MagicMock()
+        request.headers = {"if-none-match": 'W/"abc", "def"'}
+
+        self.assertTrue(is_not_modified(request, '"abc"'))
+        self.assertTrue(is_not_modified(request, '"def"'))
+        self.assertFalse(is_not_modified(request, '"ghi"'))
+        self.assertFalse(is_not_modified(request, None))
@@ -0,0 +1,77 @@
+import unittest
+
+from app.schemas.product import MockRetailerProductGridItem
+from app.service.currency import add_user_currency_to_retailer_offer_rows, _get_fields
+
+EXCHANGE_RATES = {"SEK": 1, "EUR": 0.0875, "NOK": 1.0034}
+
+
+class TestAddUserCurrencyToRetailerOfferRows(unittest.TestCase):
+    def test_converts_the_prices(self):
+        rows = [
+            {"id": "1", "retailer_price": 100.0, "currency": "EUR"},
+            {"id": "2", "retailer_price": 1000, "currency": "SEK"},
+            {"id": "3", "retailer_price": 1234.5, "currency": "NOK"},
+        ]
+
+        converted = add_user_currency_to_retailer_offer_rows(
+            rows, "SEK", EXCHANGE_RATES
+        )
+
+        self.assertEqual(
+            [r["retailer_price_in_user_currency"] for r in converted],
+            [round(100.0 / 0.0875, 1), 1000.0, round(1234.5 / 1.0034, 1)],
+        )
+        self.assertTrue(all(r["user_currency"] == "SEK" for r in converted))
+        self.assertEqual([r["id"] for r in converted], ["1", "2", "3"])
+
+    def test_half_way_prices_are_rounded_after_scaling(self):
+        prices = [0.35, 2.675, 1.25, 1000.05, 0.45]
+        rows = [
+            {"id": str(i), "retailer_price": price, "currency": "SEK"}
+            for i, price in enumerate(prices)
+        ]
+
+        converted = add_user_currency_to_retailer_offer_rows(
+            rows, "SEK", EXCHANGE_RATES
+        )
+
+        self.assertEqual(
+            [r["retailer_price_in_user_currency"] for r in converted],
+            [0.4, 2.7, 1.2, 1000.0, 0.4],
+        )
+        # The builtin `round` gives 0.3 and 0.5 for the first and the last one, never more than 0.1 away
+        for price, r in zip(prices, converted):
+            self.assertLessEqual(
+                abs(r["retailer_price_in_user_currency"] - round(price, 1)), 0.1 + 1e-9
+            )
+
+    def test_drops_the_rows_that_cannot_be_converted(self):
+        rows = [
+            {"id": "no price", "retailer_price": None, "currency": "EUR"},
+            {"id": "unknown currency", "retailer_price": 100.0, "currency": "USD"},
+            {"id": "no currency", "retailer_price": 100.0, "currency": None},
+            {"id": "ok", "retailer_price": 100.0, "currency": "SEK"},
+        ]
+
+        converted = add_user_currency_to_retailer_offer_rows(
+            rows, "SEK", EXCHANGE_RATES
+        )
+
+        self.assertEqual([r["id"] for r in converted], ["ok"])
+
+    def test_keeps_the_fields_of_serialized_products(self):
+        product = MockRetailerProductGridItem.construct(
+            id="1",
+            retailer_price=100.0,
+            currency="SEK",
+            screenshot_url="https://storage.googleapis.com/screenshot.jpg",
+        )
+
+        [converted] = add_user_currency_to_retailer_offer_rows(
+            [_get_fields(product)], "SEK", EXCHANGE_RATES
+        )
+
+        self.assertEqual(
+            converted["screenshot_url"], "https://storage.googleapis.com/screenshot.jpg"
+        )
@@ -0,0 +1,143 @@
+import asyncio
+import csv
+import gzip
+import io
+import json
+import unittest
+import uuid
+import zipfile
+from datetime import datetime
+from decimal import Decimal
+from typing import Optional
+
+import pyarrow.parquet
+from pydantic import BaseModel
+
+from app.service.export import create_export_response
+
+COLUMNS = ["id", "name", "price", "fetched_at", "specifications"]
+
+
+class _Product(BaseModel):
+    id: str
+    name: Optional[str]
+    price: Optional[float]
+    fetched_at: Optional[datetime]
+
+
+async def _batches():
+    yield [
+        {
+            "id": uuid.UUID("31ef6c6c-be2d-4478-a948-10a66dad1d2a"),
+            "name": "Matstol Comfort",
+            "price": Decimal("3201.5"),
+            "fetched_at": datetime(2023, 1, 17, 10, 30),
+            "specifications": {"color": "black"},
+            "not_exported": "ignored",
+        }
+    ]
+    yield [{"id": "second", "name": None, "price": 10}]
+
+
+def _read_response(response) -> bytes:
+    async def read():
+        return b"".join([chunk async for chunk in response.body_iterator])
+
+    return asyncio.run(read())
+
+
+class TestCreateExportResponse(unittest.TestCase):
+    def test_csv(self):
+        response = create_export_response(COLUMNS, _batches(), "csv", "products")
+
+        self.assertEqual(response.media_type, "text/csv; charset=utf-8")
+        self.assertEqual(
+            response.headers["content-disposition"],
+            'attachment; filename="products.csv"',
+        )
+        rows = list(csv.reader(io.StringIO(_read_response(response).decode())))
+        self.assertEqual(
+            rows,
+            [
+                COLUMNS,
+                [
+                    "31ef6c6c-be2d-4478-a948-10a66dad1d2a",
+                    "Matstol Comfort",
+                    "3201.5",
+                    "2023-01-17 10:30:00",
+                    '{"color": "black"}',
+                ],
+                ["second", "", "10", "", ""],
+            ],
+        )
+
+    def test_xlsx(self):
+        response = create_export_response(COLUMNS, _batches(), "xlsx", "products")
+
+        self.assertEqual(
+            response.media_type,
+            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        )
+        workbook = zipfile.ZipFile(io.BytesIO(_read_response(response)))
+        sheet = workbook.read("xl/worksheets/sheet1.xml").decode()
+        # In constant memory mode the strings are written inline, in the sheet itself
+        for value in ["fetched_at", "Matstol Comfort", "second", "3201.5"]:
+            self.assertIn(value, sheet)
+        self.assertNotIn("ignored", sheet)
+        self.assertEqual(sheet.count("<row "), 3)
+
+    def test_ndjson(self):
+        response = create_export_response(COLUMNS, _batches(), "ndjson", "products")
+
+        self.assertEqual(response.media_type, "application/x-ndjson")
+        lines = _read_response(response).decode().splitlines()
+        self.assertEqual(
+            [json.loads(line) for line in lines],
+            [
+                {
+                    "id": "31ef6c6c-be2d-4478-a948-10a66dad1d2a",
+                    "name": "Matstol Comfort",
+                    "price": 3201.5,
+                    "fetched_at": "2023-01-17T10:30:00",
+                    "specifications": {"color": "black"},
+                },
+                {
+                    "id": "second",
+                    "name": None,
+                    "price": 10,
+                    "fetched_at": None,
+                    "specifications": None,
+                },
+            ],
+        )
+
+    def test_gzip(self):
+        response = create_export_response(
+            COLUMNS, _batches(), "ndjson", "products", compress=True
+        )
+
+        self.assertEqual(response.media_type, "application/gzip")
+        self.assertEqual(
+            response.headers["content-disposition"],
+            'attachment; filename="products.ndjson.gz"',
+        )
+        content = gzip.decompress(_read_response(response)).decode()
+        self.assertEqual(len(content.splitlines()), 2)
+
+    def test_parquet(self):
+        response = create_export_response(
+            COLUMNS, _batches(), "parquet", "products", model=_Product
+        )
+
+        table = pyarrow.parquet.read_table(io.BytesIO(_read_response(response)))
+        self.assertEqual(table.column_names, COLUMNS)
+        self.assertEqual(str(table.schema.field("price").type), "double")
+        self.assertEqual(
+            table.column("id").to_pylist(),
+            ["31ef6c6c-be2d-4478-a948-10a66dad1d2a", "second"],
+        )
+        self.assertEqual(
+            table.column("fetched_at").to_pylist(),
+            [datetime(2023, 1, 17, 10, 30), None],
+        )
+        self.assertEqual(table.num_rows, 2)
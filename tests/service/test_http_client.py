@@ -0,0 +1,61 @@
+import asyncio
+import unittest
+
+from app.service import http_client
+from app.service.http_client import (
+    close_http_client,
+    get_http_client,
+    open_http_client,
+)
+
+
+class TestGetHttpClient(unittest.TestCase):
+    def test_shared_during_the_lifespan(self):
+        async def lifespan():
+            await open_http_client()
+            async with get_http_client() as first:
+                pass
+            async with get_http_client() as second:
+                pass
+            await close_http_client()
+            return first, second
+
+        first, second = asyncio.run(lifespan())
+
+        self.assertIs(first, second)
+        self.assertTrue(first.is_closed)
+        self.assertIsNone(http_client._http_client)
+
+    def test_closed_after_use_without_the_lifespan(self):
+        async def request():
+            async with get_http_client() as client:
+                self.assertFalse(client.is_closed)
+            return client
+
+        first = asyncio.run(request())
+        second = asyncio.run(request())
+
+        self.assertIsNot(first, second)
+        self.assertTrue(first.is_closed)
+        self.assertTrue(second.is_closed)
+
+    def test_not_shared_with_another_loop(self):
+        async def lifespan():
+            await open_http_client()
+            return http_client._http_client
+
+        async def request():
+            async with get_http_client() as client:
+                return client
+
+        shared = asyncio.run(lifespan())
+        try:
+            self.assertIsNot(asyncio.run(request()), shared)
+        finally:
+            asyncio.run(shared.aclose())
+            http_client._http_client = None
+            http_client._http_client_loop = None
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+
+from app.service.cache import InMemoryCacheBackend, ResponseCache
+from app.service.matviews import MatviewRefreshTracker
+
+
+def _state(name, storage_id, modified_rows):
+    return {"name": name, "storage_id": storage_id, "modified_rows": modified_rows}
+
+
+class TestMatviewRefreshTracker(unittest.TestCase):
+    def setUp(self):
+        self.cache = ResponseCache(InMemoryCacheBackend(max_entries=10), ttl_seconds=60)
+        self.tracker = MatviewRefreshTracker(
+            self.cache, ["msrp_deviation_matview", "price_changes_matview"]
+        )
+
+    def test_first_poll_does_not_invalidate(self):
+        refreshed = self.tracker.update(
+            [
+                _state("msrp_deviation_matview", 1, 10),
+                _state("price_changes_matview", 2, 10),
+            ]
+        )
+
+        self.assertEqual(refreshed, [])
+        self.assertEqual(
+            self.tracker.get_generations(self.tracker.matviews),
+            {"msrp_deviation_matview": 0, "price_changes_matview": 0},
+        )
+
+    def test_refreshes_are_detected(self):
+        self.tracker.update(
+            [
+                _state("msrp_deviation_matview", 1, 10),
+                _state("price_changes_matview", 2, 10),
+            ]
+        )
+
+        # Plain refresh of the first view, concurrent refresh of the second one
+        self.tracker.update(
+            [
+                _state("msrp_deviation_matview", 3, 10),
+                _state("price_changes_matview", 2, 10),
+            ]
+        )
+        refreshed = self.tracker.update(
+            [
+                _state("msrp_deviation_matview", 3, 10),
+                _state("price_changes_matview", 2, 25),
+            ]
+        )
+
+        self.assertEqual(refreshed, ["price_changes_matview"])
+        self.assertEqual(
+            self.tracker.get_generations(self.tracker.matviews),
+            {"msrp_deviation_matview": 1, "price_changes_matview": 1},
+        )
+
+    def test_notified_refresh_invalidates_cached_responses(self):
+        arguments = {"sign": 1}
+        key = self.cache.build_key(
+            "price/changes", "brand", arguments, ["price_changes_matview"]
+        )
+        self.cache.set(key, {"changes": []})
+
+        self.tracker.mark_refreshed(["price_changes_matview"])
+
+        key = self.cache.build_key(
+            "price/changes", "brand", arguments, ["price_changes_matview"]
+        )
+        self.assertIsNone(self.cache.get(key))
+        self.assertIsNotNone(self.tracker.status()[1]["last_refreshed_at"])
@@ -0,0 +1,121 @@
+import types
+import unittest
+from unittest.mock import MagicMock, patch
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# Registers the lookup caches
+import app.crud
+from app.routers import metrics
+from app.service.metrics import Histogram, crud_duration, time_crud_functions
+
+
+class TestHistogram(unittest.TestCase):
+    def test_buckets_are_cumulated(self):
+        histogram = Histogram("duration_seconds", "Duration", ["route"], [0.1, 1])
+
+        for value in [0.05, 0.5, 0.5, 5]:
+            histogram.observe(("/products",), value)
+
+        self.assertEqual(
+            histogram.render(),
+            [
+                "# HELP duration_seconds Duration",
+                "# TYPE duration_seconds histogram",
+                'duration_seconds_bucket{route="/products",le="0.1"} 1',
+                'duration_seconds_bucket{route="/products",le="1"} 3',
+                'duration_seconds_bucket{route="/products",le="+Inf"} 4',
+                'duration_seconds_sum{route="/products"} 6.05',
+                'duration_seconds_count{route="/products"} 4',
+            ],
+        )
+
+    def test_label_values_are_escaped(self):
+        histogram = Histogram("duration_seconds", "Duration", ["route"], [1])
+
+        histogram.observe(('/"quoted"',), 0.5)
+
+        self.assertIn(
+            'duration_seconds_count{route="/\\"quoted\\""} 1', histogram.render()
+        )
+
+
+def get_rows(db, brand_id):
+    return [brand_id]
+
+
+def format_rows(rows):
+    return rows
+
+
+class TestTimeCrudFunctions(unittest.TestCase):
+    def test_only_the_query_functions_are_timed(self):
+        crud = types.ModuleType(__name__)
+        crud.get_rows = get_rows
+        crud.format_rows = format_rows
+
+        time_crud_functions(crud)
+
+        self.assertEqual(crud.get_rows(None, "brand"), ["brand"])
+        self.assertIs(crud.format_rows, format_rows)
+        self.assertIn(
+            'crud_function_duration_seconds_count{function="get_rows"} 1',
+            crud_duration.render(),
+        )
+
+
+class TestMetricsEndpoint(unittest.TestCase):
+    def setUp(self):
+        app = FastAPI()
+        app.include_router(metrics.router)
+        self.client = TestClient(app)
+
+    @patch(
+        "app.routers.metrics.get_settings",
+        return_value=MagicMock(metrics_token=None, panprices_environment="local"),
+    )
+    def test_all_families_are_rendered(self, get_settings):
+        response = self.client.get("/metrics")
+
+        self.assertEqual(response.status_code, 200)
+        for name in [
+            "http_request_duration_seconds",
+            "http_requests_in_flight",
+            "db_pool_checked_out",
+            "cache_hits_total",
+        ]:
+            self.assertIn(f"# TYPE {name} ", response.text)
+        self.assertIn(
+            'cache_hits_total{cache="currency_exchange_rates"}', response.text
+        )
+
+    @patch(
+        "app.routers.metrics.get_settings",
+        return_value=MagicMock(metrics_token="secret"),
+    )
+    def test_token(self, get_settings):
+        self.assertEqual(self.client.get("/metrics").status_code, 401)
+        self.assertEqual(
+            self.client.get(
+                "/metrics", headers={"Authorization": "Bearer secret"}
+            ).status_code,
+            200,
+        )
+
+    @patch(
+        "app.routers.metrics.get_settings",
+        return_value=MagicMock(metrics_token=None, panprices_environment="production"),
+    )
+    def test_no_token_outside_local(self, get_settings):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        self.assertEqual(
+            self.client.get(
+                "/metrics", headers={"Authorization": "Bearer None"}
+            ).status_code,
+            403,
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
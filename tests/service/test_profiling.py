@@ -0,0 +1,65 @@
+import unittest
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from app.service.profiling import (
+    RequestTimings,
+    start_request_timings,
+    time_endpoints,
+)
+
+
+def _create_app(engine) -> FastAPI:
+    app = FastAPI()
+    recorded = []
+
+    @app.get("/rows")
+    def get_rows():
+        with engine.connect() as connection:
+            return [dict(r._mapping) for r in connection.execute(text("SELECT 1 AS a"))]
+
+    @app.middleware("http")
+    async def record_timings(request: Request, call_next):
+        timings = start_request_timings()
+        response = await call_next(request)
+        response.headers["Server-Timing"] = timings.as_server_timing()
+        recorded.append(timings)
+        return response
+
+    time_endpoints(app.routes)
+    app.state.recorded = recorded
+    return app
+
+
+class TestRequestTimings(unittest.TestCase):
+    def test_statements_are_recorded(self):
+        app = _create_app(create_engine("sqlite://"))
+
+        response = TestClient(app).get("/rows")
+
+        self.assertEqual(response.json(), [{"a": 1}])
+        timings = app.state.recorded[0]
+        self.assertEqual(timings.statements_count, 1)
+        self.assertEqual(
+            set(timings.get_phases()),
+            {"total", "dependencies", "endpoint", "serialization", "db"},
+        )
+        self.assertIn("db;dur=", response.headers["Server-Timing"])
+
+    def test_statements_outside_of_requests_are_ignored(self):
+        with create_engine("sqlite://").connect() as connection:
+            connection.execute(text("SELECT 1"))
+
+    def test_phases_not_reached_are_omitted(self):
+        timings = RequestTimings()
+        timings.record_statement(0.01, -1)
+
+        self.assertEqual(set(timings.get_phases()), {"total", "db"})
+        self.assertEqual(timings.as_log_fields()["db_rows_count"], 0)
+        self.assertIn('db;dur=10.0;desc="1 statements"', timings.as_server_timing())
+
+
+if __name__ == "__main__":
+    unittest.main()
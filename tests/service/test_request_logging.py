@@ -0,0 +1,100 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.service.request_logging import (
+    get_full_request_fields,
+    get_request_fingerprint,
+    get_route_path,
+    get_unknown_sample_rate_routes,
+    should_log_request,
+)
+
+
+def _create_app(full: bool) -> FastAPI:
+    app = FastAPI()
+    app.state.logged = []
+
+    @app.post("/products/{product_id}")
+    async def post_product(product_id: str, body: dict):
+        return body
+
+    @app.middleware("http")
+    async def log(request: Request, call_next):
+        fields = (
+            await get_full_request_fields(request)
+            if full
+            else {"fingerprint": await get_request_fingerprint(request)}
+        )
+        response = await call_next(request)
+        app.state.logged.append({"route": get_route_path(request), **fields})
+        return response
+
+    return app
+
+
+class TestRequestFields(unittest.TestCase):
+    def test_fingerprint_depends_on_the_filters(self):
+        app = _create_app(full=False)
+        client = TestClient(app)
+
+        client.post("/products/a?page=1", json={"countries": ["SE"]})
+        client.post("/products/b?page=1", json={"countries": ["SE"]})
+        client.post("/products/a?page=1", json={"countries": ["NO"]})
+        client.post("/products/a?page=2", json={"countries": ["SE"]})
+
+        fingerprints = [entry["fingerprint"] for entry in app.state.logged]
+        self.assertEqual(fingerprints[0], fingerprints[1])
+        self.assertEqual(len(set(fingerprints)), 3)
+        self.assertEqual(app.state.logged[0]["route"], "/products/{product_id}")
+
+    def test_the_body_is_still_read_by_the_endpoint(self):
+        client = TestClient(_create_app(full=False))
+
+        response = client.post("/products/a", json={"countries": ["SE"]})
+
+        self.assertEqual(response.json(), {"countries": ["SE"]})
+
+    def test_credentials_are_redacted(self):
+        app = _create_app(full=True)
+
+        TestClient(app).post(
+            "/products/a", json={"countries": ["SE"]}, headers={"X-API-Key": "key"}
+        )
+
+        logged = app.state.logged[0]
+        self.assertEqual(logged["http_request_headers"]["x-api-key"], "[redacted]")
+        self.assertEqual(logged["http_request_body"], {"countries": ["SE"]})
+
+
+class TestShouldLogRequest(unittest.TestCase):
+    def setUp(self):
+        settings = MagicMock(
+            request_log_sample_rate=1.0,
+            request_log_sample_rates={"/products/retailers": 0.0},
+        )
+        patcher = patch(
+            "app.service.request_logging.get_settings", return_value=settings
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_sample_rate_of_the_route(self):
+        self.assertTrue(should_log_request("/products/brand", 200))
+        self.assertFalse(should_log_request("/products/retailers", 200))
+
+    def test_failures_are_always_logged(self):
+        self.assertTrue(should_log_request("/products/retailers", 500))
+
+    def test_unknown_routes(self):
+        self.assertEqual(get_unknown_sample_rate_routes(["/products/retailers"]), [])
+        self.assertEqual(
+            get_unknown_sample_rate_routes(["/products/retailers/export"]),
+            ["/products/retailers"],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
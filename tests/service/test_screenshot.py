@@ -0,0 +1,114 @@
+import asyncio
+import unittest
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+from app.service.screenshot import (
+    ScreenshotIndex,
+    get_screenshot_hash,
+    get_screenshot_url,
+    resolve_screenshot_urls,
+)
+
+WITH_SCREENSHOT = "https://www.retailer.se/product-with-screenshot"
+WITHOUT_SCREENSHOT = "https://www.retailer.se/product-without-screenshot"
+
+
+class TestResolveScreenshotUrls(unittest.TestCase):
+    def setUp(self):
+        self.index = ScreenshotIndex(
+            max_entries=10, ttl_seconds=60, missing_ttl_seconds=60
+        )
+        self.head_requests = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            self.head_requests.append(str(request.url))
+            exists = str(request.url) == get_screenshot_url(
+                get_screenshot_hash(WITH_SCREENSHOT)
+            )
+            return httpx.Response(200 if exists else 404)
+
+        self.transport = httpx.MockTransport(handler)
+
+    def _resolve(self, product_urls, fetched_at=None):
+        async def resolve():
+            async with httpx.AsyncClient(transport=self.transport) as client:
+                return await resolve_screenshot_urls(
+                    self.index,
+                    client,
+                    product_urls,
+                    concurrency=10,
+                    fetched_at=fetched_at,
+                )
+
+        return asyncio.run(resolve())
+
+    def test_unknown_screenshots_are_checked_once(self):
+        product_urls = [WITH_SCREENSHOT, WITHOUT_SCREENSHOT, WITH_SCREENSHOT]
+        expected = [
+            get_screenshot_url(get_screenshot_hash(WITH_SCREENSHOT)),
+            None,
+            get_screenshot_url(get_screenshot_hash(WITH_SCREENSHOT)),
+        ]
+
+        self.assertEqual(self._resolve(product_urls), expected)
+        self.assertEqual(len(self.head_requests), 2)
+
+        self.assertEqual(self._resolve(product_urls), expected)
+        self.assertEqual(len(self.head_requests), 2)
+        self.assertEqual(self.index.stats()["cache_hits"], 2)
+        self.assertEqual(self.index.stats()["head_request_latency"]["count"], 2)
+        self.assertEqual(self.index.stats()["lookup_latency"]["count"], 2)
+
+    def test_manifest_replaces_head_requests(self):
+        self.index.set_manifest(
+            [get_screenshot_hash(WITH_SCREENSHOT)], datetime.now(timezone.utc)
+        )
+
+        self.assertEqual(
+            self._resolve([WITH_SCREENSHOT, WITHOUT_SCREENSHOT]),
+            [get_screenshot_url(get_screenshot_hash(WITH_SCREENSHOT)), None],
+        )
+        self.assertEqual(self.head_requests, [])
+        self.assertEqual(self.index.stats()["manifest_size"], 1)
+
+    def test_products_fetched_after_the_listing_are_checked(self):
+        listed_at = datetime(2023, 1, 17, 10, 0, tzinfo=timezone.utc)
+        self.index.set_manifest([], listed_at)
+        product_urls = [WITH_SCREENSHOT, WITHOUT_SCREENSHOT]
+        # Naive, like the timestamps read from the database
+        fetched_at = [datetime(2023, 1, 17, 10, 30), listed_at - timedelta(days=1)]
+
+        for _ in range(2):
+            self.assertEqual(
+                self._resolve(product_urls, fetched_at),
+                [get_screenshot_url(get_screenshot_hash(WITH_SCREENSHOT)), None],
+            )
+        self.assertEqual(
+            self.head_requests,
+            [get_screenshot_url(get_screenshot_hash(WITH_SCREENSHOT))],
+        )
+
+    def test_invalid_names_are_skipped(self):
+        self.index.set_manifest(
+            [
+                get_screenshot_hash(WITH_SCREENSHOT),
+                "not-a-hash",
+                "abc",
+                get_screenshot_hash(WITH_SCREENSHOT) + "-thumbnail",
+            ],
+            datetime.now(timezone.utc),
+        )
+
+        self.assertEqual(self.index.stats()["manifest_size"], 1)
+        self.assertTrue(self.index.lookup(get_screenshot_hash(WITH_SCREENSHOT)))
+
+    def test_failed_checks_are_not_cached(self):
+        def handler(request: httpx.Request) -> httpx.Response:
+            raise httpx.ConnectError("Unreachable", request=request)
+
+        self.transport = httpx.MockTransport(handler)
+
+        self.assertEqual(self._resolve([WITH_SCREENSHOT]), [None])
+        self.assertIsNone(self.index.lookup(get_screenshot_hash(WITH_SCREENSHOT)))
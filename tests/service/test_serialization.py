@@ -0,0 +1,120 @@
+import json
+import unittest
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from types import SimpleNamespace
+from typing import List, Optional, Union
+
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel, Field
+
+from app.service.serialization import dumps, to_trusted_dict, to_trusted_rows
+
+
+class _Availability(Enum):
+    in_stock = "in_stock"
+
+
+class _Row(BaseModel):
+    id: Union[str, uuid.UUID]
+    name: str
+    price: Optional[float]
+    reviews_count: Optional[int]
+    in_stock: Optional[bool] = Field(default=True)
+    fetched_at: Optional[date]
+    tags: List[str] = []
+
+    class Config:
+        orm_mode = True
+
+
+_ROWS = [
+    SimpleNamespace(
+        id=uuid.UUID("31ef6c6c-be2d-4478-a948-10a66dad1d2a"),
+        name="Matstol Comfort",
+        price=3201,
+        reviews_count=Decimal("19"),
+        fetched_at=datetime(2023, 1, 17, 10, 30),
+        tags=["chair"],
+        not_in_the_model="ignored",
+    ),
+    {
+        "id": "second",
+        "name": "Matgrupp Copenhagen",
+        "price": Decimal("3201.5"),
+        "reviews_count": None,
+        "in_stock": None,
+        "fetched_at": date(2023, 1, 18),
+    },
+]
+
+
+def _validated(rows) -> list:
+    """
+    What FastAPI sends for the rows through the response model
+    """
+    return json.loads(
+        json.dumps(
+            jsonable_encoder(
+                [
+                    _Row.parse_obj(r) if isinstance(r, dict) else _Row.from_orm(r)
+                    for r in rows
+                ]
+            )
+        )
+    )
+
+
+class TestTrustedRows(unittest.TestCase):
+    def test_same_json_as_the_response_model(self):
+        trusted = json.loads(dumps(to_trusted_rows(_ROWS, _Row)))
+
+        self.assertEqual(trusted, _validated(_ROWS))
+        # The order of the fields is kept as well
+        self.assertEqual(list(trusted[0]), list(_Row.__fields__))
+
+    def test_values_are_converted_like_pydantic(self):
+        row = to_trusted_dict(_ROWS[0], _Row)
+
+        self.assertIs(type(row["price"]), float)
+        self.assertIs(type(row["reviews_count"]), int)
+        self.assertEqual(row["fetched_at"], date(2023, 1, 17))
+        self.assertIs(row["in_stock"], True)
+        self.assertNotIn("not_in_the_model", row)
+
+
+class TestDumps(unittest.TestCase):
+    CONTENT = {
+        "id": uuid.UUID("31ef6c6c-be2d-4478-a948-10a66dad1d2a"),
+        "price": Decimal("3201.5"),
+        "fetched_at": datetime(2023, 1, 17, 10, 30, 5, 120),
+        "date": date(2023, 1, 17),
+        "availability": _Availability.in_stock,
+        "name": "Möbler > Matgrupper",
+        "row": _Row(id="a", name="b", price=1.5, reviews_count=None, fetched_at=None),
+    }
+
+    def test_same_json_as_fastapi(self):
+        self.assertEqual(
+            json.loads(dumps(self.CONTENT)),
+            json.loads(json.dumps(jsonable_encoder(self.CONTENT))),
+        )
+
+    def test_numpy_and_nan(self):
+        self.assertEqual(
+            json.loads(
+                dumps({"count": np.int64(3), "values": np.array([1.5, np.nan, np.inf])})
+            ),
+            {"count": 3, "values": [1.5, None, None]},
+        )
+
+    def test_unknown_type(self):
+        with self.assertRaises(TypeError):
+            dumps({"value": object()})
+
+
+if __name__ == "__main__":
+    unittest.main()